@@ -0,0 +1,78 @@
+# Compares the streaming CSRF token extractor against the full soup parse.
+#
+#   python -m benchmarks.bench_csrf [--size-kb 500] [--number 20]
+import argparse
+import re
+import timeit
+
+from tabulate import tabulate
+
+from src.kt.ktistec_handler import (
+    _CHUNK_SIZE,
+    extract_csrf_token,
+    parse_csrf_token,
+)
+
+RESOURCE = "tests/resources/ktistec_handler/dummy_sessions_response_body"
+
+POST = (
+    '<div class="event"><div class="label"><img src="/avatar.png"></div>'
+    '<div class="content"><div class="summary"><a href="/actors/foo">foo'
+    '</a></div><div class="extra text"><p>Lorem ipsum dolor sit amet, '
+    '<a href="https://example.com/">https://example.com/</a></p></div>'
+    "</div></div>\n"
+)
+
+
+def build_pages(size_kb: int) -> dict[str, str]:
+    base = open(RESOURCE).read()
+    timeline = POST * (size_kb * 1024 // len(POST))
+    body = base.replace("<h1>Sign In</h1>", timeline + "<h1>Sign In</h1>")
+
+    return {
+        # home page as served by ktistec, token also in <head>
+        "token in head": body,
+        # worst case, only the form input at the very end
+        "token at end": re.sub(r"csrf: '[^']+'", "csrf: ''", body),
+    }
+
+
+def chunked(page: str) -> list[str]:
+    return [page[i : i + _CHUNK_SIZE] for i in range(0, len(page), _CHUNK_SIZE)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-kb", type=int, default=500)
+    parser.add_argument("--number", type=int, default=20)
+    args = parser.parse_args()
+
+    rows = []
+    for name, page in build_pages(args.size_kb).items():
+        chunks = chunked(page)
+        assert extract_csrf_token(chunks) == parse_csrf_token(page)
+
+        soup = timeit.timeit(lambda: parse_csrf_token(page), number=args.number)
+        stream = timeit.timeit(
+            lambda: extract_csrf_token(chunks), number=args.number
+        )
+        rows.append(
+            [
+                name,
+                f"{len(page) / 1024:.0f}",
+                f"{soup / args.number * 1000:.2f}",
+                f"{stream / args.number * 1000:.2f}",
+                f"{soup / stream:.1f}x",
+            ]
+        )
+
+    print(
+        tabulate(
+            rows,
+            ["Page", "Size (KB)", "Soup (ms)", "Streaming (ms)", "Speedup"],
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+# End-to-end posting benchmark against a local stand-in ktistec server.
+#
+#   python -m benchmarks.bench_e2e                   # compare with baseline
+#   python -m benchmarks.bench_e2e --save-baseline   # record a new baseline
+import argparse
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from contextlib import redirect_stdout
+
+import click
+from tabulate import tabulate
+
+from src.kt.batch import BatchPoster
+from src.kt.fanout import FanoutPoster
+from src.kt.ktistec_handler import KtistecHandler
+from src.kt.ledger import Ledger
+from src.kt.profile import ProfileConfig
+
+from .fake_server import FakeKtistecServer
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def percentile(latencies: list[float], p: int) -> float:
+    if len(latencies) < 2:
+        return latencies[0]
+    return statistics.quantiles(latencies, n=100, method="inclusive")[p - 1]
+
+
+def profile_config(server: FakeKtistecServer, user_name: str) -> ProfileConfig:
+    return ProfileConfig(
+        server_url=server.url, user_name=user_name, password="bench"
+    )
+
+
+def bench_single(server: FakeKtistecServer, posts: int) -> list[float]:
+    # one handler per post, as separate `kt -p` runs would do
+    latencies = []
+    profile = profile_config(server, "single")
+    for i in range(posts):
+        start = time.perf_counter()
+        Ledger(profile).post(KtistecHandler(ctx(), profile), f"single {i}")
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def bench_batch(server: FakeKtistecServer, posts: int) -> list[float]:
+    latencies = []
+    profile = profile_config(server, "batch")
+    handler = KtistecHandler(ctx(), profile)
+    post = handler.post
+
+    def timed_post(message: str) -> None:
+        start = time.perf_counter()
+        post(message)
+        latencies.append(time.perf_counter() - start)
+
+    handler.post = timed_post  # type: ignore
+    records = io.StringIO("".join(f'"batch {i}"\n' for i in range(posts)))
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        BatchPoster(handler, Ledger(profile)).run(records)
+    return latencies
+
+
+def bench_parallel(server: FakeKtistecServer, posts: int) -> list[float]:
+    profiles = {
+        f"p{i}": profile_config(server, f"parallel{i}") for i in range(posts)
+    }
+    results = FanoutPoster(ctx(), profiles, max_workers=8).run("parallel")
+    return [r.elapsed for r in results]
+
+
+def ctx() -> click.Context:
+    return click.Context(command=click.Command("bench"))
+
+
+SCENARIOS: dict[str, Callable[[FakeKtistecServer, int], list[float]]] = {
+    "single": bench_single,
+    "batch": bench_batch,
+    "parallel": bench_parallel,
+}
+
+
+def run(posts: int, page_size: int, latency: float) -> dict[str, dict]:
+    results = {}
+    for name, scenario in SCENARIOS.items():
+        with FakeKtistecServer(page_size=page_size, latency=latency) as server:
+            start = time.perf_counter()
+            latencies = scenario(server, posts)
+            wall = time.perf_counter() - start
+            assert len(server.posts) == posts, name
+
+        results[name] = {
+            "posts_per_sec": posts / wall,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+        }
+    return results
+
+
+def compare(
+    results: dict[str, dict], baseline: dict[str, dict], tolerance: float
+) -> list[list]:
+    rows = []
+    for name, res in results.items():
+        base = baseline.get(name, {})
+        for metric, value in res.items():
+            before = base.get(metric)
+            change = ""
+            regressed = False
+            if before:
+                ratio = value / before
+                change = f"{(ratio - 1) * 100:+.1f}%"
+                # throughput regresses downwards, latency upwards
+                if metric == "posts_per_sec":
+                    regressed = ratio < 1 - tolerance
+                else:
+                    regressed = ratio > 1 + tolerance
+            rows.append(
+                [
+                    name,
+                    metric,
+                    f"{value:.4f}",
+                    f"{before:.4f}" if before else "",
+                    change,
+                    "REGRESSION" if regressed else "",
+                ]
+            )
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--posts", type=int, default=50)
+    parser.add_argument("--page-size", type=int, default=256 * 1024)
+    parser.add_argument("--latency", type=float, default=0.005)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+
+    # keep the session cache of the benchmark away from the real one
+    os.environ["HOME"] = tempfile.mkdtemp()
+
+    results = run(args.posts, args.page_size, args.latency)
+    params = {
+        "posts": args.posts,
+        "page_size": args.page_size,
+        "latency": args.latency,
+    }
+
+    if args.save_baseline:
+        with open(BASELINE, "w") as f:
+            json.dump({"params": params, "results": results}, f, indent=2)
+            f.write("\n")
+
+    baseline: dict = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE) as f:
+            baseline = json.load(f)
+        if baseline.get("params") != params:
+            # numbers from other parameters tell nothing about regressions
+            print(
+                "Baseline was recorded with other parameters, not compared. "
+                "Use --save-baseline to record one for these."
+            )
+            baseline = {}
+
+    rows = compare(results, baseline.get("results", {}), args.tolerance)
+    print(
+        tabulate(
+            rows,
+            ["Scenario", "Metric", "Current", "Baseline", "Change", ""],
+        )
+    )
+
+    if any(row[-1] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+# A stand-in ktistec server on the stdlib HTTP server, good enough to drive
+# KtistecHandler through login and posting over real sockets.
+import secrets
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+TOKEN = "beb886633614303dd2c5774a25a347ee"
+
+PAGE = """<!DOCTYPE html>
+<html lang='en'>
+<head>
+<meta charset='utf-8'>
+<title>ktistec</title>
+<script>
+  window.Ktistec = {{
+    csrf: '{token}'
+  }}
+</script>
+</head>
+<body>
+{timeline}
+<form class="ui form" action="{action}" method="POST">
+<input type="hidden" name="authenticity_token" value="{token}">
+{fields}
+</form>
+</body>
+</html>
+"""
+
+LOGIN_FIELDS = (
+    '<input type="text" name="username" value="">'
+    '<input type="password" name="password" value="">'
+)
+
+POST = (
+    '<div class="event"><div class="content"><div class="summary">'
+    '<a href="/actors/foo">foo</a></div><div class="extra text"><p>Lorem '
+    'ipsum dolor sit amet, <a href="https://example.com/">'
+    "https://example.com/</a></p></div></div></div>\n"
+)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address) -> None:
+        # clients hang up early once they have the CSRF token
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class FakeKtistecServer:
+    def __init__(self, page_size: int = 64 * 1024, latency: float = 0.0):
+        self.page_size = page_size
+        self.latency = latency
+        self.posts: list[dict[str, list[str]]] = []
+        self._sessions: set[str] = set()
+        self._lock = threading.Lock()
+        self._httpd = _Server(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever, daemon=True
+        )
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "FakeKtistecServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def home_page(self) -> bytes:
+        timeline = POST * (self.page_size // len(POST))
+        return PAGE.format(
+            token=TOKEN, timeline=timeline, action="/outbox", fields=""
+        ).encode()
+
+    def login_page(self) -> bytes:
+        return PAGE.format(
+            token=TOKEN, timeline="", action="/sessions", fields=LOGIN_FIELDS
+        ).encode()
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args) -> None:
+                pass
+
+            def _logged_in(self) -> bool:
+                cookie = self.headers.get("Cookie", "")
+                return any(
+                    c.strip().removeprefix("AuthToken=") in server._sessions
+                    for c in cookie.split(";")
+                    if c.strip().startswith("AuthToken=")
+                )
+
+            def _form(self) -> dict[str, list[str]]:
+                length = int(self.headers.get("Content-Length", 0))
+                return parse_qs(self.rfile.read(length).decode())
+
+            def _respond(
+                self,
+                status: int,
+                body: bytes = b"",
+                headers: dict[str, str] | None = None,
+                send_body: bool = True,
+            ) -> None:
+                if server.latency:
+                    time.sleep(server.latency)
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                if send_body:
+                    self.wfile.write(body)
+
+            def _get(self, send_body: bool) -> None:
+                if self.path == "/sessions":
+                    self._respond(200, server.login_page(), None, send_body)
+                elif self.path == "/settings":
+                    if self._logged_in():
+                        self._respond(200, b"settings", None, send_body)
+                    else:
+                        self._respond(401, b"", None, send_body)
+                elif self.path == "/":
+                    self._respond(200, server.home_page(), None, send_body)
+                else:
+                    self._respond(404, b"", None, send_body)
+
+            def do_GET(self) -> None:
+                self._get(True)
+
+            def do_HEAD(self) -> None:
+                self._get(False)
+
+            def do_POST(self) -> None:
+                form = self._form()
+                if self.path == "/sessions":
+                    session = secrets.token_hex(16)
+                    with server._lock:
+                        server._sessions.add(session)
+                    self._respond(
+                        302,
+                        headers={
+                            "Location": "/",
+                            "Set-Cookie": f"AuthToken={session}; Path=/",
+                        },
+                    )
+                elif self.path.endswith("/outbox"):
+                    if not self._logged_in():
+                        self._respond(401)
+                    elif form.get("authenticity_token") != [TOKEN]:
+                        self._respond(403)
+                    else:
+                        with server._lock:
+                            server.posts.append(form)
+                        self._respond(302, headers={"Location": "/"})
+                else:
+                    self._respond(404)
+
+        return Handler
@@ -0,0 +1,147 @@
+import asyncio
+import codecs
+
+import aiohttp
+
+from .ktistec_handler import CsrfTokenParser, parse_csrf_token
+from .profile import ProfileConfig
+from .util import Logger
+
+logger = Logger().get_logger()
+
+_CHUNK_SIZE = 8192
+
+
+# Handlers of several profiles can share one connection pool by passing the
+# same connector, while each of them keeps its own cookie jar.
+class AsyncKtistecHandler:
+    def __init__(
+        self,
+        profile: ProfileConfig,
+        connector: aiohttp.BaseConnector | None = None,
+    ) -> None:
+        self._profile = profile
+        self._connector = connector
+        self._session: aiohttp.ClientSession | None = None
+        self._headers = {
+            "accept": "text/html",
+            "Content-Type": "application/x-www-form-urlencoded",
+        }
+        self._sessions_url = self._profile.server_url + "/sessions"
+        self._logged_in = False
+        self._login_lock = asyncio.Lock()
+
+    async def __aenter__(self) -> "AsyncKtistecHandler":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=self._connector,
+                connector_owner=self._connector is None,
+                # allow cookies of servers addressed by IP
+                cookie_jar=aiohttp.CookieJar(unsafe=True),
+                # aiohttp bounds whole requests, not posts, with the deadline
+                timeout=aiohttp.ClientTimeout(
+                    total=self._profile.timeouts.deadline,
+                    sock_connect=self._profile.timeouts.connect,
+                    sock_read=self._profile.timeouts.read,
+                ),
+            )
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _get_csrf_token(self, url: str) -> str:
+        received: list[str] = []
+        async with self.session.get(url, headers=self._headers) as res:
+            logger.debug(res.status)
+            res.raise_for_status()
+            parser = CsrfTokenParser()
+            decoder = codecs.getincrementaldecoder(res.charset or "utf-8")(
+                "replace"
+            )
+            async for chunk in res.content.iter_chunked(_CHUNK_SIZE):
+                text = decoder.decode(chunk)
+                received.append(text)
+                parser.feed(text)
+                if parser.token:
+                    return parser.token
+
+        return parse_csrf_token("".join(received))
+
+    async def _login(self) -> None:
+        token = await self._get_csrf_token(self._sessions_url)
+        async with self.session.post(
+            self._sessions_url,
+            headers=self._headers,
+            data={
+                "username": self._profile.user_name,
+                "password": self._profile.password,
+                "authenticity_token": token,
+            },
+        ) as res:
+            logger.debug(res.status)
+            res.raise_for_status()
+
+    async def _ensure_login(self) -> None:
+        # concurrent posts from one handler must not log in twice
+        async with self._login_lock:
+            if not self._logged_in:
+                await self._login()
+                self._logged_in = True
+
+    async def post(self, message: str) -> None:
+        await self._ensure_login()
+        token = await self._get_csrf_token(self._profile.server_url)
+
+        async with self.session.post(
+            f"{self._profile.server_url}/actors/{self._profile.user_name}/outbox",
+            headers=self._headers,
+            data={
+                "type": "Publish",
+                "public": "True",
+                "content": f"<div>{message}</div>",
+                "authenticity_token": token,
+            },
+        ) as res:
+            logger.debug(res.status)
+            res.raise_for_status()
+
+
+async def post_all(
+    profiles: dict[str, ProfileConfig],
+    message: str,
+    limit: int = 100,
+) -> dict[str, Exception | None]:
+    connector = aiohttp.TCPConnector(limit=limit)
+    handlers = {
+        name: AsyncKtistecHandler(profile, connector)
+        for name, profile in profiles.items()
+    }
+
+    try:
+        results = await asyncio.gather(
+            *[handler.post(message) for handler in handlers.values()],
+            return_exceptions=True,
+        )
+    finally:
+        for handler in handlers.values():
+            await handler.close()
+        await connector.close()
+
+    for res in results:
+        if isinstance(res, BaseException) and not isinstance(res, Exception):
+            raise res
+
+    return {
+        name: res if isinstance(res, Exception) else None
+        for name, res in zip(handlers.keys(), results)
+    }
@@ -0,0 +1,101 @@
+import json
+from collections.abc import Iterator
+from dataclasses import dataclass
+from typing import TextIO
+
+import click
+
+from .ktistec_handler import KtistecHandler
+from .ledger import Ledger, part_key
+from .splitter import build_parts
+from .util import Logger
+
+logger = Logger().get_logger()
+
+
+class BatchRecordException(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class BatchResult:
+    succeeded: int
+    failed: int
+    skipped: int = 0
+
+
+def parse_keyed_record(line: str) -> tuple[str, str | None]:
+    # returns the message and the record's idempotency key, if any
+    try:
+        record = json.loads(line)
+    except ValueError:
+        raise BatchRecordException("Bad json record.")
+
+    if isinstance(record, str):
+        message = record
+    elif isinstance(record, dict) and isinstance(record.get("message"), str):
+        message = record["message"]
+    else:
+        raise BatchRecordException("Record has no `message` string.")
+
+    if len(message) <= 0:
+        raise BatchRecordException("Empty message.")
+
+    key = record.get("idempotency_key") if isinstance(record, dict) else None
+    if key is not None and not isinstance(key, str):
+        raise BatchRecordException("Record has a non-string `idempotency_key`.")
+
+    return message, key
+
+
+def iter_records(f: TextIO) -> Iterator[tuple[int, str]]:
+    for line_no, line in enumerate(f, start=1):
+        if line.strip():
+            yield line_no, line
+
+
+class BatchPoster:
+    def __init__(
+        self,
+        handler: KtistecHandler,
+        ledger: Ledger | None = None,
+        force: bool = False,
+    ) -> None:
+        self._handler = handler
+        self._ledger = ledger
+        self._force = force
+
+    def run(self, f: TextIO, stop_on_error: bool = False) -> BatchResult:
+        succeeded = 0
+        failed = 0
+        skipped = 0
+
+        for line_no, line in iter_records(f):
+            try:
+                message, key = parse_keyed_record(line)
+                # long records go out in parts, each recorded on its own
+                posted = False
+                parts = build_parts(message, self._handler.profile)
+                for i, part in enumerate(parts):
+                    if self._ledger is None:
+                        posted = True
+                        self._handler.post(part)
+                    else:
+                        posted |= self._ledger.post(
+                            self._handler, part, part_key(key, i), self._force
+                        )
+            except Exception as e:
+                logger.debug(e, exc_info=True)
+                failed += 1
+                click.echo(f"line {line_no}: failed: {e}", err=True)
+                if stop_on_error:
+                    break
+            else:
+                if posted:
+                    succeeded += 1
+                    click.echo(f"line {line_no}: ok")
+                else:
+                    skipped += 1
+                    click.echo(f"line {line_no}: skipped, already posted")
+
+        return BatchResult(succeeded=succeeded, failed=failed, skipped=skipped)
@@ -1,12 +1,30 @@
+import io
+import itertools
 import os
+import sys
 import tempfile
+import textwrap
+import threading
+import time
+from collections.abc import Iterator
+from dataclasses import replace
 from subprocess import call
+from typing import TYPE_CHECKING, TextIO
 
 import click
 
-from .ktistec_handler import KtistecHandler
-from .message_builder import MessageBuilder
-from .profile import Profile, ProfileNotFoundException
+from .profile import (
+    Profile,
+    ProfileConfig,
+    ProfileNotFoundException,
+    TimeoutConfig,
+)
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+
+    from .ktistec_handler import KtistecHandler
+    from .timings import Tracer
 
 __all__ = ["main"]
 
@@ -15,24 +33,150 @@ EDITOR = os.environ.get("EDITOR", "vim")
 initial_message = ""
 
 
-@click.command()
+def _override(
+    config: ProfileConfig, overrides: dict[str, dict]
+) -> ProfileConfig:
+    # overrides maps profile sections to the settings replaced in them
+    return replace(
+        config,
+        **{
+            section: replace(getattr(config, section), **values)
+            for section, values in overrides.items()
+            if values
+        },
+    )
+
+
+def _start_warm_up(
+    ctx: click.Context, profile: ProfileConfig, tracer: "Tracer"
+) -> "Future[KtistecHandler]":
+    # logs in while the user is in the editor, so that the post is all that
+    # is left to wait for once it exits
+    from concurrent.futures import Future
+
+    future: Future[KtistecHandler] = Future()
+
+    def run() -> None:
+        try:
+            from .ktistec_handler import KtistecHandler
+
+            handler = KtistecHandler(ctx, profile, tracer)
+            handler.warm_up()
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            future.set_result(handler)
+
+    # a daemon thread, `kt` exiting early does not wait for the login
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+def _warmed_up(
+    warm_up: "Future[KtistecHandler] | None", debug: bool
+) -> "KtistecHandler | None":
+    # a failed warm-up leaves its half set up handler behind, the post
+    # starts over with a fresh one
+    if warm_up is None:
+        return None
+    try:
+        return warm_up.result()
+    except Exception as e:
+        if debug:
+            click.echo(f"Warm-up failed: {e}", err=True)
+        return None
+
+
+_SKIPPED = "Already posted, skipped. Use --force to post again."
+
+
+def _delimiter(ctx: click.Context, param: click.Parameter, value: str) -> str:
+    # accept escapes such as '\n' or '\0' as typed on the shell
+    try:
+        delimiter = value.encode("latin-1", "backslashreplace").decode(
+            "unicode_escape"
+        )
+    except UnicodeDecodeError:
+        raise click.BadParameter(f"{value!r} is no valid escape sequence.")
+    if not delimiter:
+        raise click.BadParameter("must not be empty.")
+    return delimiter
+
+
+@click.group(invoke_without_command=True)
 @click.option("--post", "-p", type=str)
 @click.option("--edit", "-e", is_flag=True)
+@click.option("--batch", "-b", type=click.File("r"))
+@click.option("--stop-on-error", is_flag=True)
+@click.option("--stdin", "from_stdin", is_flag=True)
+@click.option(
+    "--delimiter",
+    type=str,
+    default="\\n",
+    show_default=True,
+    callback=_delimiter,
+)
+@click.option("--max-in-flight", type=click.IntRange(min=1), default=1)
 @click.option("--debug", is_flag=True)
 @click.option("--profile", type=str)
+@click.option("--all-profiles", is_flag=True)
+@click.option("--workers", type=click.IntRange(min=1), default=8)
+@click.option("--max-length", type=click.IntRange(min=0))
+@click.option("--timeout", type=click.FloatRange(min=0, min_open=True))
+@click.option("--connect-timeout", type=click.FloatRange(min=0, min_open=True))
+@click.option("--read-timeout", type=click.FloatRange(min=0, min_open=True))
+@click.option("--lean", is_flag=True)
+@click.option("--spool", is_flag=True)
+@click.option("--timings", is_flag=True)
+@click.option("--trace", type=click.File("w"))
+@click.option("--no-daemon", is_flag=True)
+@click.option("--no-wait", is_flag=True)
+@click.option("--idempotency-key", type=str)
+@click.option("--force", is_flag=True)
 @click.pass_context
 def main(
     ctx: click.Context,
     post: str | None,
     profile: str | None,
     edit: bool,
+    batch: TextIO | None,
+    stop_on_error: bool,
+    from_stdin: bool,
+    delimiter: str,
+    max_in_flight: int,
     debug: bool,
+    all_profiles: bool,
+    workers: int,
+    max_length: int | None,
+    timeout: float | None,
+    connect_timeout: float | None,
+    read_timeout: float | None,
+    lean: bool,
+    spool: bool,
+    timings: bool,
+    trace: TextIO | None,
+    no_daemon: bool,
+    no_wait: bool,
+    idempotency_key: str | None,
+    force: bool,
 ) -> None:
+    # subcommands such as `kt timeline` come with options of their own
+    if ctx.invoked_subcommand:
+        return
+
     # check profile exists
     p = Profile()
+    fanout_profiles: dict[str, ProfileConfig] = {}
 
     try:
-        current_profile = p.load(profile)
+        if all_profiles:
+            fanout_profiles = p.loads()
+        elif profile and "," in profile:
+            fanout_profiles = p.load_many(
+                [name.strip() for name in profile.split(",") if name.strip()]
+            )
+        else:
+            current_profile = p.load(profile)
     except ProfileNotFoundException as e:
         click.echo(str(e), err=True)
         ctx.exit(1)
@@ -40,20 +184,139 @@ def main(
         click.echo(str(e))
         ctx.exit(1)
 
+    # settings given on the command line win over the profile's
+    overrides: dict[str, dict] = {
+        "timeouts": {
+            k: v
+            for k, v in (
+                ("connect", connect_timeout),
+                ("read", read_timeout),
+                ("deadline", timeout),
+            )
+            if v is not None
+        },
+        "http": {"lean": True} if lean else {},
+        "content": {} if max_length is None else {"max_length": max_length},
+    }
+    overridden = any(overrides.values())
+    if overridden:
+        if fanout_profiles:
+            fanout_profiles = {
+                name: _override(config, overrides)
+                for name, config in fanout_profiles.items()
+            }
+        else:
+            current_profile = _override(current_profile, overrides)
+
+    if (batch or from_stdin or spool) and idempotency_key is not None:
+        # batch records carry keys of their own, spooled posts are recorded
+        # by their message only
+        click.echo(
+            "--idempotency-key takes a single message, posted directly.",
+            err=True,
+        )
+        ctx.exit(1)
+
+    # heavy dependencies (requests, bs4, urlextract) are imported only by the
+    # code paths that post, keep `ktctl profile` and the daemon client fast
+    # to start
+    if batch:
+        from .batch import BatchPoster
+        from .ktistec_handler import KtistecHandler
+        from .ledger import Ledger
+
+        if fanout_profiles:
+            click.echo("--batch takes a single profile.", err=True)
+            ctx.exit(1)
+
+        handler = KtistecHandler(ctx, current_profile)
+        result = BatchPoster(handler, Ledger(current_profile), force).run(
+            batch, stop_on_error=stop_on_error
+        )
+        click.echo(
+            f"{result.succeeded} succeeded, {result.skipped} skipped, "
+            f"{result.failed} failed."
+        )
+        click.echo(str(handler.limiter.stats()), err=True)
+        if current_profile.http.lean:
+            click.echo(f"Saved {handler.bytes_saved} bytes.", err=True)
+        ctx.exit(1 if result.failed else 0)
+
+    if from_stdin:
+        from .ktistec_handler import KtistecHandler
+        from .ledger import Ledger
+        from .stream import StreamPoster, iter_records
+
+        if fanout_profiles:
+            click.echo("--stdin takes a single profile.", err=True)
+            ctx.exit(1)
+
+        handler = KtistecHandler(ctx, current_profile)
+        stream_result = StreamPoster(
+            handler, max_in_flight, Ledger(current_profile), force
+        ).run(iter_records(sys.stdin.buffer, delimiter))
+        click.echo(
+            f"{stream_result.succeeded} succeeded, "
+            f"{stream_result.skipped} skipped, {stream_result.failed} failed."
+        )
+        click.echo(str(handler.limiter.stats()), err=True)
+        if current_profile.http.lean:
+            click.echo(f"Saved {handler.bytes_saved} bytes.", err=True)
+        ctx.exit(1 if stream_result.failed else 0)
+
+    if fanout_profiles and max_length is not None:
+        click.echo("--max-length takes a single profile.", err=True)
+        ctx.exit(1)
+
+    split_length = 0
+    if not fanout_profiles:
+        split_length = current_profile.content.max_length
+
     post_message = ""
+    # long edits are split while they are read instead of loaded whole
+    source: TextIO | None = None
 
     if not post and not edit:
         click.echo("Please input post content.")
         ctx.exit(1)
 
+    from .timings import NullTracer, Tracer
+
+    tracer = Tracer() if timings or trace else NullTracer()
+    # a message handed to a running `ktctl daemon` skips the imports and
+    # login entirely
+    daemon_allowed = not (
+        no_daemon
+        or spool
+        or fanout_profiles
+        or timings
+        or trace
+        or max_length is not None
+        or overridden
+    )
+    warm_up: "Future[KtistecHandler] | None" = None
+
     if edit:
-        with tempfile.NamedTemporaryFile(suffix=".tmp") as tf:
+        from .daemon import socket_path
+
+        if not (
+            fanout_profiles
+            or spool
+            or (daemon_allowed and os.path.exists(socket_path()))
+        ):
+            warm_up = _start_warm_up(ctx, current_profile, tracer)
+
+        with tempfile.NamedTemporaryFile(suffix=".tmp", delete=False) as tf:
             tf.write(initial_message.encode())
-            tf.flush()
-            call([EDITOR, tf.name])
+        ctx.call_on_close(lambda: os.remove(tf.name))
+        call([EDITOR, tf.name])
 
-            with open(tf.name, "r") as f:
-                post_message = f.read()
+        f = open(tf.name, "r")
+        ctx.call_on_close(f.close)
+        if split_length and os.path.getsize(tf.name) > split_length:
+            source = f
+        else:
+            post_message = f.read()
 
     else:
         if post:
@@ -61,20 +324,201 @@ def main(
         else:
             click.echo("Please input post content.")
 
-    mb = MessageBuilder(post_message)
-    built_message = mb.build()
+    if daemon_allowed and not source:
+        from .daemon import send
+
+        try:
+            sent = send(
+                post_message,
+                profile,
+                wait=not no_wait,
+                idempotency_key=idempotency_key,
+                force=force,
+                # the daemon looks mentions up and posts a part, each within
+                # the deadline
+                timeout=2 * current_profile.timeouts.deadline,
+            )
+        except Exception as e:
+            click.echo(str(e), err=True)
+            if debug:
+                raise e
+            ctx.exit(1)
+        if sent is not None:
+            if not sent:
+                click.echo(_SKIPPED, err=True)
+            ctx.exit(0)
+
+    from .ktistec_handler import KtistecHandler
+    from .ledger import Ledger, part_key
+    from .message_builder import MessageBuilder
+
+    rest: Iterator[str] = iter(())
+    # a fanned out message is built once for all profiles, its mentions are
+    # looked up within the tightest of their timeouts
+    build_timeouts = (
+        TimeoutConfig(
+            connect=min(c.timeouts.connect for c in fanout_profiles.values()),
+            read=min(c.timeouts.read for c in fanout_profiles.values()),
+            deadline=min(c.timeouts.deadline for c in fanout_profiles.values()),
+        )
+        if fanout_profiles
+        else current_profile.timeouts
+    )
+
+    with tracer.phase("build"):
+        if split_length:
+            from .splitter import split_message
+
+            # later parts are linked as they are posted
+            parts = split_message(
+                source or io.StringIO(post_message),
+                split_length,
+                build_timeouts,
+                offline=spool,
+            )
+            built_message = next(parts, "")
+            rest = parts
+        else:
+            # `kt --spool` returns without waiting for the network, its
+            # mentions are only linked from the WebFinger cache
+            mb = MessageBuilder(
+                post_message, timeouts=build_timeouts, offline=spool
+            )
+            built_message = mb.build()
+
+    if spool:
+        from .spool import Spool, start_background_drain
+
+        # posting is left to a detached drain, `kt` only waits for the
+        # spool write to hit the disk
+        spool_profiles = fanout_profiles or {
+            profile or str(p.default_name()): current_profile
+        }
+        ledgers = {
+            name: Ledger(config) for name, config in spool_profiles.items()
+        }
+        spool_db = Spool()
+        for message in itertools.chain([built_message], rest):
+            for name, ledger in ledgers.items():
+                # skipped when posted before or still waiting in the spool
+                if force or not (
+                    ledger.delivered(message) or spool_db.waiting(name, message)
+                ):
+                    spool_db.put(name, message)
+        start_background_drain()
+        ctx.exit(0)
+
+    if fanout_profiles:
+        from .fanout import FanoutPoster, show_results
+
+        results = FanoutPoster(
+            ctx, fanout_profiles, workers, idempotency_key, force
+        ).run(built_message)
+        show_results(results)
+        ctx.exit(1 if any(r.error for r in results) else 0)
 
     try:
-        handler = KtistecHandler(ctx, current_profile)
-        handler.post(built_message)
+        handler = _warmed_up(warm_up, debug) or KtistecHandler(
+            ctx, current_profile, tracer
+        )
+        ledger = Ledger(current_profile)
+        posted = False
+        for i, message in enumerate(itertools.chain([built_message], rest)):
+            posted |= ledger.post(
+                handler, message, part_key(idempotency_key, i), force
+            )
+        if not posted:
+            click.echo(_SKIPPED, err=True)
+        if current_profile.http.lean:
+            click.echo(f"Saved {handler.bytes_saved} bytes.", err=True)
     except Exception as e:
         click.echo(str(e), err=True)
         if debug:
             raise e
+    finally:
+        if timings:
+            tracer.show()
+        if trace:
+            tracer.dump(trace)
 
     ctx.exit(0)
 
 
+@main.command()
+@click.option("--profile", type=str)
+@click.option("--box", type=click.Choice(["inbox", "outbox"]), default="inbox")
+@click.option("--limit", type=click.IntRange(min=1), default=20)
+@click.option("--offline", is_flag=True)
+@click.option("--debug", is_flag=True)
+@click.pass_context
+def timeline(
+    ctx: click.Context,
+    profile: str | None,
+    box: str,
+    limit: int,
+    offline: bool,
+    debug: bool,
+):
+    from tabulate import tabulate
+
+    from .search import to_text
+    from .timeline import Timeline
+
+    try:
+        current_profile = Profile().load(profile)
+        t = Timeline(current_profile)
+        if not offline:
+            from .ktistec_handler import KtistecHandler
+
+            count = t.sync(KtistecHandler(ctx, current_profile), box)
+            click.echo(f"{count} new items.", err=True)
+
+        click.echo(
+            tabulate(
+                [
+                    [
+                        item.published or "",
+                        item.actor or "",
+                        textwrap.shorten(to_text(item.content), width=60),
+                    ]
+                    for item in t.items(box, limit)
+                ],
+                ["Published", "Actor", "Content"],
+            )
+        )
+    except Exception as e:
+        click.echo(str(e), err=True)
+        if debug:
+            raise e
+        ctx.exit(1)
+
+
+@main.command()
+@click.argument("query")
+@click.option("--profile", type=str)
+@click.option("--limit", type=click.IntRange(min=1), default=20)
+@click.option("--debug", is_flag=True)
+@click.pass_context
+def search(
+    ctx: click.Context, query: str, profile: str | None, limit: int, debug: bool
+):
+    from .search import SearchIndex
+
+    try:
+        for hit in SearchIndex(Profile().load(profile)).search(query, limit):
+            created = time.strftime(
+                "%Y-%m-%d %H:%M", time.localtime(hit.created_at)
+            )
+            click.echo(f"{created}  {hit.source:<7} {hit.snippet}")
+            if hit.ref:
+                click.echo(f"{'':<25}{hit.ref}")
+    except Exception as e:
+        click.echo(str(e), err=True)
+        if debug:
+            raise e
+        ctx.exit(1)
+
+
 @click.group()
 def ctl_main():
     pass
@@ -117,6 +561,26 @@ def list_cmd(debug: bool):
             raise e
 
 
+@profile.command()
+@click.option("--login", is_flag=True)
+@click.option("--workers", type=click.IntRange(min=1), default=16)
+@click.option("--debug", is_flag=True)
+@click.pass_context
+def check(ctx: click.Context, login: bool, workers: int, debug: bool):
+    from .health import HealthChecker, show_results
+
+    try:
+        results = HealthChecker(ctx, Profile().loads(), workers, login).run()
+    except Exception as e:
+        click.echo(str(e), err=True)
+        if debug:
+            raise e
+        ctx.exit(1)
+
+    show_results(results)
+    ctx.exit(1 if any(r.error for r in results) else 0)
+
+
 @profile.command(name="set-default")
 @click.option("--name", type=str)
 @click.option("--debug", is_flag=True)
@@ -129,3 +593,124 @@ def set_default(ctx: click.Context, name: str, debug: bool):
         click.echo(str(e), err=True)
         if debug:
             raise e
+
+
+@ctl_main.group(name="spool")
+def spool_group():
+    pass
+
+
+@spool_group.command()
+@click.option("--max-attempts", type=click.IntRange(min=1))
+@click.option("--debug", is_flag=True)
+@click.pass_context
+def drain(ctx: click.Context, max_attempts: int | None, debug: bool):
+    from .spool import Spool
+
+    try:
+        result = Spool().drain(ctx, max_attempts)
+    except Exception as e:
+        click.echo(str(e), err=True)
+        if debug:
+            raise e
+        ctx.exit(1)
+
+    for entry in result.stuck:
+        click.echo(
+            f"{entry.profile_name}: entry {entry.id} gave up after "
+            f"{entry.attempts} attempts: {entry.last_error}",
+            err=True,
+        )
+    click.echo(
+        f"{result.delivered} delivered, {result.failed} failed, "
+        f"{len(result.stuck)} stuck."
+    )
+    if result.stuck:
+        click.echo("Run `ktctl spool retry` to try them again.", err=True)
+    if result.stuck or result.failed:
+        ctx.exit(1)
+
+
+@spool_group.command()
+@click.option("--id", "entry_id", type=int)
+@click.option("--debug", is_flag=True)
+def retry(entry_id: int | None, debug: bool):
+    from .spool import Spool, start_background_drain
+
+    try:
+        count = Spool().retry(entry_id)
+        click.echo(f"{count} entries reset.")
+        if count:
+            start_background_drain()
+    except Exception as e:
+        click.echo(str(e), err=True)
+        if debug:
+            raise e
+
+
+@ctl_main.command()
+@click.option("--debug", is_flag=True)
+@click.pass_context
+def daemon(ctx: click.Context, debug: bool):
+    from .daemon import KtDaemon
+
+    try:
+        KtDaemon(ctx).serve_forever()
+    except Exception as e:
+        click.echo(str(e), err=True)
+        if debug:
+            raise e
+        ctx.exit(1)
+
+
+@ctl_main.group(name="search")
+def search_group():
+    pass
+
+
+@search_group.command()
+@click.option("--profile", type=str)
+@click.option("--debug", is_flag=True)
+@click.pass_context
+def rebuild(ctx: click.Context, profile: str | None, debug: bool):
+    from .search import SearchIndex
+
+    try:
+        count = SearchIndex(Profile().load(profile)).rebuild()
+        click.echo(f"{count} documents indexed.")
+    except Exception as e:
+        click.echo(str(e), err=True)
+        if debug:
+            raise e
+        ctx.exit(1)
+
+
+@spool_group.command(name="list")
+@click.option("--debug", is_flag=True)
+def spool_list(debug: bool):
+    from tabulate import tabulate
+
+    from .spool import Spool
+
+    try:
+        click.echo(
+            tabulate(
+                [
+                    [
+                        e.id,
+                        e.profile_name,
+                        time.strftime(
+                            "%Y-%m-%d %H:%M:%S", time.localtime(e.created_at)
+                        ),
+                        e.attempts,
+                        e.last_error or "",
+                    ]
+                    for e in Spool().entries()
+                ],
+                ["ID", "Profile Name", "Created", "Attempts", "Last Error"],
+            )
+        )
+    except Exception as e:
+        click.echo(str(e), err=True)
+        if debug:
+            raise e
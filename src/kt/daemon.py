@@ -0,0 +1,227 @@
+import json
+import os
+import socket
+import socketserver
+import threading
+from collections.abc import Callable
+from typing import TYPE_CHECKING
+
+import click
+
+from .profile import Profile, ProfileConfig
+from .util import Logger
+
+if TYPE_CHECKING:
+    from .ktistec_handler import KtistecHandler
+    from .ledger import Ledger
+
+logger = Logger().get_logger()
+
+
+class DaemonException(Exception):
+    pass
+
+
+def socket_path() -> str:
+    return f"{os.path.expanduser('~')}/.kt/kt.sock"
+
+
+def send(
+    message: str,
+    profile_name: str | None,
+    wait: bool = True,
+    idempotency_key: str | None = None,
+    force: bool = False,
+    timeout: float | None = None,
+) -> bool | None:
+    # None means there is no daemon to talk to and the caller should post
+    # by itself, as when it does not even accept the connection in time.
+    # Otherwise whether the message was posted, False when it was skipped
+    # as delivered before. The timeout applies to every part of a message
+    # the daemon splits, it reports each part as it is posted.
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(socket_path())
+    except (FileNotFoundError, ConnectionRefusedError, TimeoutError):
+        sock.close()
+        return None
+
+    with sock, sock.makefile("rb") as f:
+        try:
+            sock.sendall(
+                json.dumps(
+                    {
+                        "profile": profile_name,
+                        "message": message,
+                        "wait": wait,
+                        "idempotency_key": idempotency_key,
+                        "force": force,
+                    }
+                ).encode()
+                + b"\n"
+            )
+            # progress lines for the parts come before the answer
+            line = f.readline()
+            while line and "ok" not in json.loads(line):
+                line = f.readline()
+        except TimeoutError:
+            # the daemon has the message and may still post it, posting it
+            # here as well could post it twice
+            raise DaemonException(
+                f"Daemon did not answer within {timeout:g} seconds."
+            )
+
+    if not line:
+        raise DaemonException("Daemon closed the connection.")
+
+    res = json.loads(line)
+    if not res["ok"]:
+        raise DaemonException(res["error"])
+
+    return res.get("posted", True)
+
+
+class KtDaemon:
+    def __init__(self, ctx: click.Context) -> None:
+        self.ctx = ctx
+        self._path = socket_path()
+        # one warm handler per profile config, a changed profile gets a new
+        # one on its next post
+        self._handlers: dict[ProfileConfig, "KtistecHandler"] = {}
+        self._ledgers: dict[ProfileConfig, "Ledger"] = {}
+        self._lock = threading.Lock()
+
+    def _handler(self, profile: ProfileConfig) -> "KtistecHandler":
+        from .ktistec_handler import KtistecHandler
+
+        with self._lock:
+            if profile not in self._handlers:
+                self._handlers[profile] = KtistecHandler(self.ctx, profile)
+            return self._handlers[profile]
+
+    def _ledger(self, profile: ProfileConfig) -> "Ledger":
+        from .ledger import Ledger
+
+        with self._lock:
+            if profile not in self._ledgers:
+                self._ledgers[profile] = Ledger(profile)
+            return self._ledgers[profile]
+
+    def post(
+        self,
+        profile_name: str | None,
+        message: str,
+        idempotency_key: str | None = None,
+        force: bool = False,
+        progress: Callable[[int], None] = lambda part: None,
+    ) -> bool:
+        # False when everything was delivered before and nothing is posted.
+        # progress is called with the index of every part once it is done.
+        from .ledger import part_key
+        from .splitter import build_parts
+
+        profile = Profile().load(profile_name)
+        handler = self._handler(profile)
+        ledger = self._ledger(profile)
+        posted = False
+        for i, part in enumerate(build_parts(message, profile)):
+            posted |= ledger.post(
+                handler, part, part_key(idempotency_key, i), force
+            )
+            progress(i)
+        return posted
+
+    def _server(self) -> socketserver.ThreadingUnixStreamServer:
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def _reply(self, res: dict) -> None:
+                try:
+                    self.wfile.write(json.dumps(res).encode() + b"\n")
+                    self.wfile.flush()
+                except BrokenPipeError:
+                    # the client went away, the post is done all the same
+                    logger.debug("Client closed the connection.")
+
+            def handle(self) -> None:
+                line = self.rfile.readline()
+                # `ktctl daemon` probing for a running daemon sends nothing
+                if not line:
+                    return
+
+                try:
+                    req = json.loads(line)
+                    profile_name = req.get("profile")
+                    message = req["message"]
+                    idempotency_key = req.get("idempotency_key")
+                    force = bool(req.get("force"))
+                except (ValueError, KeyError, AttributeError):
+                    self._reply({"ok": False, "error": "Bad request."})
+                    return
+
+                wait = req.get("wait", True)
+                if not wait:
+                    self._reply({"ok": True})
+
+                def progress(part: int) -> None:
+                    # keeps a waiting client's timeout from running out on
+                    # a long message
+                    if wait:
+                        self._reply({"part": part})
+
+                try:
+                    posted = daemon.post(
+                        profile_name, message, idempotency_key, force, progress
+                    )
+                except Exception as e:
+                    logger.debug(e, exc_info=True)
+                    click.echo(f"{profile_name or 'default'}: {e}", err=True)
+                    if wait:
+                        self._reply({"ok": False, "error": str(e)})
+                else:
+                    click.echo(
+                        f"{profile_name or 'default'}: "
+                        + ("posted" if posted else "skipped, already posted")
+                    )
+                    if wait:
+                        self._reply({"ok": True, "posted": posted})
+
+        class Server(socketserver.ThreadingUnixStreamServer):
+            daemon_threads = True
+
+        return Server(self._path, Handler)
+
+    def _remove_stale_socket(self) -> None:
+        if not os.path.exists(self._path):
+            return
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self._path)
+        except ConnectionRefusedError:
+            os.remove(self._path)
+        else:
+            raise DaemonException("Daemon is already running.")
+        finally:
+            sock.close()
+
+    def serve_forever(self) -> None:
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        self._remove_stale_socket()
+
+        # profiles hold passwords, only the owner may talk to the daemon
+        umask = os.umask(0o177)
+        try:
+            server = self._server()
+        finally:
+            os.umask(umask)
+
+        click.echo(f"Listening on {self._path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            os.remove(self._path)
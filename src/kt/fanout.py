@@ -0,0 +1,96 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import click
+from tabulate import tabulate
+
+from .ktistec_handler import KtistecHandler
+from .ledger import Ledger
+from .profile import ProfileConfig
+from .util import Logger
+
+logger = Logger().get_logger()
+
+
+@dataclass(frozen=True)
+class FanoutResult:
+    profile_name: str
+    server_url: str
+    elapsed: float
+    error: str | None = None
+    skipped: bool = False
+
+
+class FanoutPoster:
+    def __init__(
+        self,
+        ctx: click.Context,
+        profiles: dict[str, ProfileConfig],
+        max_workers: int = 8,
+        idempotency_key: str | None = None,
+        force: bool = False,
+    ) -> None:
+        self.ctx = ctx
+        self._profiles = profiles
+        self._max_workers = max_workers
+        self._idempotency_key = idempotency_key
+        self._force = force
+
+    def _post(
+        self, profile_name: str, profile: ProfileConfig, message: str
+    ) -> FanoutResult:
+        start = time.perf_counter()
+        error = None
+        posted = True
+        try:
+            # every profile gets its own handler, hence its own session, and
+            # its own ledger
+            posted = Ledger(profile).post(
+                KtistecHandler(self.ctx, profile),
+                message,
+                self._idempotency_key,
+                self._force,
+            )
+        except Exception as e:
+            logger.debug(e, exc_info=True)
+            error = str(e) or type(e).__name__
+
+        return FanoutResult(
+            profile_name=profile_name,
+            server_url=profile.server_url,
+            elapsed=time.perf_counter() - start,
+            error=error,
+            skipped=not posted,
+        )
+
+    def run(self, message: str) -> list[FanoutResult]:
+        workers = max(1, min(self._max_workers, len(self._profiles)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(self._post, name, profile, message)
+                for name, profile in self._profiles.items()
+            ]
+            return [f.result() for f in futures]
+
+
+def show_results(results: list[FanoutResult]) -> None:
+    click.echo(
+        tabulate(
+            [
+                [
+                    r.profile_name,
+                    r.server_url,
+                    (
+                        "failed"
+                        if r.error is not None
+                        else "skipped" if r.skipped else "ok"
+                    ),
+                    f"{r.elapsed:.3f}",
+                    r.error or "",
+                ]
+                for r in results
+            ],
+            ["Profile Name", "Server URL", "Result", "Time (s)", "Error"],
+        )
+    )
@@ -0,0 +1,127 @@
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from urllib.parse import urlparse
+
+import click
+from tabulate import tabulate
+
+from .ktistec_handler import KtistecHandler
+from .profile import ProfileConfig
+from .timings import Tracer
+from .util import Logger
+
+logger = Logger().get_logger()
+
+
+@dataclass(frozen=True)
+class CheckResult:
+    profile_name: str
+    server_url: str
+    status: str
+    connect: float | None = None
+    ttfb: float | None = None
+    total: float | None = None
+    error: str | None = None
+
+
+def connect_time(profile: ProfileConfig) -> float:
+    # name resolution and TCP handshake, requests does not tell them apart
+    # from the rest of a request
+    url = urlparse(profile.server_url)
+    port = url.port or (443 if url.scheme == "https" else 80)
+    start = time.perf_counter()
+    with socket.create_connection(
+        (url.hostname, port), timeout=profile.timeouts.connect
+    ):
+        return time.perf_counter() - start
+
+
+class HealthChecker:
+    def __init__(
+        self,
+        ctx: click.Context,
+        profiles: dict[str, ProfileConfig],
+        max_workers: int = 16,
+        login: bool = False,
+    ) -> None:
+        self.ctx = ctx
+        self._profiles = profiles
+        self._max_workers = max_workers
+        self._login = login
+
+    def _check(self, profile_name: str, profile: ProfileConfig) -> CheckResult:
+        start = time.perf_counter()
+        try:
+            connect = connect_time(profile)
+        except OSError as e:
+            logger.debug(e, exc_info=True)
+            return CheckResult(
+                profile_name=profile_name,
+                server_url=profile.server_url,
+                status="unreachable",
+                total=time.perf_counter() - start,
+                error=str(e) or type(e).__name__,
+            )
+
+        tracer = Tracer()
+        error = None
+        try:
+            KtistecHandler(self.ctx, profile, tracer).probe(self._login)
+        except Exception as e:
+            logger.debug(e, exc_info=True)
+            error = str(e) or type(e).__name__
+
+        # requests times a response up to its headers, first byte included
+        csrf = [p for p in tracer.phases if p.name == "csrf" and p.requests]
+        return CheckResult(
+            profile_name=profile_name,
+            server_url=profile.server_url,
+            status="ok" if error is None else "failed",
+            connect=connect,
+            ttfb=csrf[0].requests[0].elapsed if csrf else None,
+            total=time.perf_counter() - start,
+            error=error,
+        )
+
+    def run(self) -> list[CheckResult]:
+        workers = max(1, min(self._max_workers, len(self._profiles)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(self._check, name, profile)
+                for name, profile in self._profiles.items()
+            ]
+            return [f.result() for f in futures]
+
+
+def _ms(seconds: float | None) -> str:
+    return "" if seconds is None else f"{seconds * 1000:.1f}"
+
+
+def show_results(results: list[CheckResult]) -> None:
+    click.echo(
+        tabulate(
+            [
+                [
+                    r.profile_name,
+                    r.server_url,
+                    r.status,
+                    _ms(r.connect),
+                    _ms(r.ttfb),
+                    _ms(r.total),
+                    r.error or "",
+                ]
+                for r in results
+            ],
+            [
+                "Profile Name",
+                "Server URL",
+                "Status",
+                "Connect (ms)",
+                "TTFB (ms)",
+                "Total (ms)",
+                "Error",
+            ],
+        )
+    )
@@ -1,78 +1,449 @@
+import codecs
+import math
+import re
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlparse
+
 import click
 import requests
 from bs4 import BeautifulSoup
+from urllib3.exceptions import ReadTimeoutError
 
 from .profile import ProfileConfig
+from .rate_limit import get_limiter
+from .session_cache import SessionCache
+from .timings import NullTracer, Tracer
+from .transport import mount_adapter
 from .util import Logger
 
 logger = Logger().get_logger()
 
+# ktistec also exposes the token to its scripts in <head>, far ahead of any
+# form in the page body
+_SCRIPT_CSRF_PATTERN = re.compile(r"csrf:\s*'([^']+)'")
+
+_CHUNK_SIZE = 8192
+
+# rest of the body read after the token was found so that the connection
+# goes back to the pool, anything longer than this is cut off
+_DRAIN_LIMIT = 64 * 1024
+
+_ACTIVITY_JSON = "application/activity+json"
+
+# status codes ktistec answers a post with a stale authenticity token with
+_CSRF_REJECTED = (403, 422)
+
 
 class KtistecHandlerException(Exception):
     pass
 
 
+class KtistecTimeoutException(KtistecHandlerException):
+    pass
+
+
+def parse_csrf_token(html: str) -> str:
+    soup = BeautifulSoup(html, "html.parser")
+    tag = soup.find(
+        "input", attrs={"name": "authenticity_token", "type": "hidden"}
+    )
+    token = tag.get("value") if tag else None  # type: ignore
+
+    if not isinstance(token, str) or len(token) <= 0:
+        raise KtistecHandlerException("Failed to get CSRF Token.")
+
+    return token
+
+
+class CsrfTokenParser(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.token: str | None = None
+        self._script: list[str] | None = None
+
+    def handle_starttag(self, tag, attrs) -> None:
+        if tag == "input":
+            attr = dict(attrs)
+            if (
+                attr.get("name") == "authenticity_token"
+                and attr.get("type") == "hidden"
+                and attr.get("value")
+            ):
+                self.token = attr["value"]
+        elif tag == "script":
+            self._script = []
+
+    def handle_data(self, data) -> None:
+        if self._script is not None:
+            self._script.append(data)
+
+    def handle_endtag(self, tag) -> None:
+        if tag == "script" and self._script is not None:
+            m = _SCRIPT_CSRF_PATTERN.search("".join(self._script))
+            if m:
+                self.token = m.group(1)
+            self._script = None
+
+
+def extract_csrf_token(chunks: Iterable[str]) -> str | None:
+    parser = CsrfTokenParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+        if parser.token:
+            return parser.token
+
+    parser.close()
+    return parser.token
+
+
+def iter_text(
+    chunks: Iterable[bytes], encoding: str | None, received: list[str]
+) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder(encoding or "utf-8")("replace")
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        received.append(text)
+        yield text
+
+    text = decoder.decode(b"", final=True)
+    received.append(text)
+    yield text
+
+
+def is_timeout(e: requests.RequestException) -> bool:
+    if isinstance(e, requests.Timeout):
+        return True
+    # read timeouts of streamed bodies and exhausted retries come wrapped
+    # into a plain ConnectionError
+    reason = e.args[0] if e.args else None
+    reason = getattr(reason, "reason", reason)
+    return isinstance(reason, ReadTimeoutError)
+
+
+def is_overload(e: Exception) -> bool:
+    # errors that say the server is struggling, as opposed to our mistakes
+    if isinstance(e, requests.HTTPError) and e.response is not None:
+        return e.response.status_code == 429 or e.response.status_code >= 500
+    return isinstance(
+        e,
+        (requests.ConnectionError, requests.Timeout, KtistecTimeoutException),
+    )
+
+
 class KtistecHandler:
-    def __init__(self, ctx: click.Context, profile: ProfileConfig):
+    def __init__(
+        self,
+        ctx: click.Context,
+        profile: ProfileConfig,
+        tracer: Tracer | None = None,
+    ):
         self._profile = profile
+        # what messages for this handler are built with, e.g. its timeouts
+        self.profile = profile
         self.ctx = ctx
         self._session = requests.session()
+        # a retry only starts when it can still connect before the deadline
+        mount_adapter(
+            self._session,
+            profile.http,
+            lambda: self._remaining() - self._profile.timeouts.connect,
+        )
+        self._tracer = tracer or NullTracer()
+        if not isinstance(self._tracer, NullTracer):
+            self._session.hooks["response"].append(self._tracer.hook)
         self._headers = {
             "accept": "text/html",
             "Content-Type": "application/x-www-form-urlencoded",
         }
         self._sessions_url = self._profile.server_url + "/sessions"
+        self._settings_url = self._profile.server_url + "/settings"
         self._auth_token = ""
+        self._session_cache = SessionCache(profile)
+        self._logged_in = False
+        # counts logins, so that a session is dropped only once however many
+        # threads find it expired
+        self._session_generation = 0
+        self._login_lock = threading.Lock()
+        # the token stays valid for the whole session, fetched once and
+        # refetched only when the server rejects it
+        self._csrf_token: str | None = None
+        self._csrf_lock = threading.Lock()
+        self.limiter = get_limiter(profile)
+        # deadline of the post running on the current thread
+        self._local = threading.local()
+        # lean mode leaves bodies unread that nobody looks at, sizes of pages
+        # seen so far tell how much that saved
+        self._page_sizes: dict[str, int] = {}
+        self._stats_lock = threading.Lock()
+        self.bytes_saved = 0
+
+    def _saved(self, size: int) -> None:
+        with self._stats_lock:
+            self.bytes_saved += size
+
+    def _login_redirect(self, res: requests.Response) -> str | None:
+        # being sent back to the login form means the request was refused,
+        # whether the redirect was followed or not
+        if res.is_redirect:
+            target = urljoin(res.url, res.headers["Location"])
+        elif res.history:
+            target = res.url
+        else:
+            return None
+        if urlparse(target).path == urlparse(self._sessions_url).path:
+            return target
+        return None
+
+    def _skip_redirect(self, res: requests.Response) -> None:
+        if not res.is_redirect:
+            return
+        target = self._login_redirect(res)
+        if target:
+            raise KtistecHandlerException(f"Redirected to {target}.")
+        self._saved(
+            self._page_sizes.get(urljoin(res.url, res.headers["Location"]), 0)
+        )
+
+    def _remaining(self) -> float:
+        deadline = getattr(self._local, "deadline", None)
+        return math.inf if deadline is None else deadline - time.monotonic()
+
+    def _timeout(self) -> tuple[float, float]:
+        # every request gets what is left of the post's deadline at most
+        remaining = self._remaining()
+        if remaining <= 0:
+            raise requests.Timeout()
+        timeouts = self._profile.timeouts
+        return (min(timeouts.connect, remaining), min(timeouts.read, remaining))
+
+    @contextmanager
+    def _phase(self, name: str) -> Iterator[None]:
+        with self._tracer.phase(name):
+            try:
+                yield
+            except requests.RequestException as e:
+                if is_timeout(e):
+                    raise KtistecTimeoutException(
+                        f"Timed out during {name}."
+                    ) from e
+                raise
+
+    def _until_deadline(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        # the read timeout applies per chunk, a slow trickle of a body is
+        # stopped by the deadline instead
+        for chunk in chunks:
+            if self._remaining() <= 0:
+                raise requests.Timeout()
+            yield chunk
 
     def _get_csrf_token(self, url) -> str:
-        res = self._session.get(
+        received: list[str] = []
+        with self._session.get(
             url=url,
             headers=self._headers,
-        )
+            stream=True,
+            timeout=self._timeout(),
+        ) as res:
+            logger.debug(res.status_code)
+            res.raise_for_status()
+            size = int(res.headers.get("Content-Length", 0))
+            if size:
+                self._page_sizes[res.url] = size
+            chunks = self._until_deadline(res.iter_content(_CHUNK_SIZE))
+            token = extract_csrf_token(
+                iter_text(chunks, res.encoding, received)
+            )
+            if token and self._profile.http.lean:
+                # closing the connection is cheaper than the rest of the page
+                self._saved(max(size - res.raw.tell(), 0))
+                return token
+            if token:
+                for _ in zip(range(_DRAIN_LIMIT // _CHUNK_SIZE), chunks):
+                    pass
+                return token
+
+        html = "".join(received)
+        logger.debug(html)
+        # fall back to the full soup parse for pages the streaming parser
+        # could not find the token in
+        return parse_csrf_token(html)
+
+    def _login(self) -> None:
+        with self._phase("login csrf"):
+            token = self._get_csrf_token(self._sessions_url)
+
+        with self._phase("login"):
+            res = self._session.post(
+                url=self._sessions_url,
+                headers=self._headers,
+                data={
+                    "username": self._profile.user_name,
+                    "password": self._profile.password,
+                    "authenticity_token": token,
+                },
+                timeout=self._timeout(),
+                allow_redirects=not self._profile.http.lean,
+            )
         logger.debug(res.status_code)
         logger.debug(res.text)
         res.raise_for_status()
-        soup = BeautifulSoup(res.text, "html.parser")
-        token: str = soup.find(
-            "input", attrs={"name": "authenticity_token", "type": "hidden"}
-        ).get(  # type: ignore
-            "value"
-        )
+        if self._profile.http.lean:
+            self._skip_redirect(res)
+
+    def _is_logged_in(self) -> bool:
+        # settings page is only served to authenticated users, and HEAD
+        # spares us the body
+        with self._phase("session check"):
+            res = self._session.head(
+                url=self._settings_url,
+                headers=self._headers,
+                allow_redirects=False,
+                timeout=self._timeout(),
+            )
+        logger.debug(res.status_code)
+        return res.status_code == 200
 
-        if len(token) <= 0:
-            raise KtistecHandlerException("Failed to get CSRF Token.")
+    def _ensure_login(self) -> None:
+        # posts from several threads must not log in twice
+        with self._login_lock:
+            if self._logged_in:
+                return
 
-        return token
+            if (
+                self._session_cache.restore(self._session)
+                and self._is_logged_in()
+            ):
+                logger.debug("Reuse cached session.")
+            else:
+                self._session.cookies.clear()
+                self._login()
+                self._session_cache.save(self._session)
+                self._csrf_token = None
 
-    def _login(self) -> None:
-        token = self._get_csrf_token(self._sessions_url)
-        res = self._session.post(
-            url=self._sessions_url,
-            headers=self._headers,
-            data={
-                "username": self._profile.user_name,
-                "password": self._profile.password,
-                "authenticity_token": token,
-            },
-        )
+            self._logged_in = True
+            self._session_generation += 1
+
+    def _drop_session(self, generation: int) -> None:
+        # the server ended the session, forget everything that came with it
+        # unless another thread has logged in again already
+        with self._login_lock:
+            if generation != self._session_generation:
+                return
+            self._logged_in = False
+            self._session.cookies.clear()
+            self._session_cache.clear()
+            with self._csrf_lock:
+                self._csrf_token = None
+
+    def get(
+        self, url: str, headers: dict[str, str] | None = None
+    ) -> requests.Response:
+        # activity streams documents, read as the logged-in account so that
+        # the inbox is readable too
+        self._ensure_login()
+        with self._phase("fetch"):
+            res = self._session.get(
+                url=url,
+                headers={"accept": _ACTIVITY_JSON, **(headers or {})},
+                timeout=self._timeout(),
+            )
         logger.debug(res.status_code)
-        logger.debug(res.text)
         res.raise_for_status()
+        return res
 
-    def post(self, message: str) -> None:
-        self._login()
-        token = self._get_csrf_token(self._profile.server_url)
+    def probe(self, login: bool = False) -> None:
+        # what `ktctl profile check` exercises, the page the CSRF token comes
+        # from and optionally the login
+        self._local.deadline = (
+            time.monotonic() + self._profile.timeouts.deadline
+        )
+        try:
+            if login:
+                self._ensure_login()
+            with self._phase("csrf"):
+                self._get_csrf_token(self._profile.server_url)
+        finally:
+            self._local.deadline = None
 
-        res = self._session.post(
-            url=f"{self._profile.server_url}/actors/{self._profile.user_name}/outbox",
-            headers=self._headers,
-            data={
-                "type": "Publish",
-                "public": True,
-                "content": f"<div>{message}</div>",
-                "authenticity_token": token,
-            },
+    def warm_up(self) -> None:
+        # everything a post needs before the POST itself, done ahead of time
+        # while the message is still being written. Whatever fails here is
+        # simply done again by the post.
+        self._local.deadline = (
+            time.monotonic() + self._profile.timeouts.deadline
         )
+        try:
+            self._ensure_login()
+            self._post_csrf_token()
+        finally:
+            self._local.deadline = None
+
+    def post(self, message: str) -> None:
+        with self.limiter.slot(is_overload):
+            self._post(message)
+
+    def _post_csrf_token(self, rejected: str | None = None) -> str:
+        with self._csrf_lock:
+            # another thread may have refetched the rejected token already
+            if self._csrf_token is None or self._csrf_token == rejected:
+                with self._phase("csrf"):
+                    self._csrf_token = self._get_csrf_token(
+                        self._profile.server_url
+                    )
+            return self._csrf_token
+
+    def _send_post(self, message: str, token: str) -> requests.Response:
+        with self._phase("post"):
+            res = self._session.post(
+                url=f"{self._profile.server_url}/actors/{self._profile.user_name}/outbox",
+                headers=self._headers,
+                data={
+                    "type": "Publish",
+                    "public": True,
+                    "content": f"<div>{message}</div>",
+                    "authenticity_token": token,
+                },
+                timeout=self._timeout(),
+                # the redirect leads to a fully rendered page nobody reads
+                allow_redirects=not self._profile.http.lean,
+            )
         logger.debug(res.status_code)
         logger.debug(res.text)
+        return res
+
+    def _post_once(self, message: str) -> tuple[int, requests.Response]:
+        self._ensure_login()
+        generation = self._session_generation
+        token = self._post_csrf_token()
+        res = self._send_post(message, token)
+
+        if res.status_code in _CSRF_REJECTED:
+            logger.debug("CSRF token rejected, refetch and retry once.")
+            token = self._post_csrf_token(rejected=token)
+            res = self._send_post(message, token)
+
+        return generation, res
+
+    def _post(self, message: str) -> None:
+        self._local.deadline = (
+            time.monotonic() + self._profile.timeouts.deadline
+        )
+        try:
+            generation, res = self._post_once(message)
+            if self._login_redirect(res):
+                logger.debug("Session expired, log in again and retry once.")
+                self._drop_session(generation)
+                _, res = self._post_once(message)
+        finally:
+            self._local.deadline = None
+
         res.raise_for_status()
+        target = self._login_redirect(res)
+        if target:
+            raise KtistecHandlerException(f"Redirected to {target}.")
+        if self._profile.http.lean:
+            self._skip_redirect(res)
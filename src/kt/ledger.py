@@ -0,0 +1,145 @@
+import sqlite3
+import threading
+import time
+from collections.abc import Callable
+from hashlib import sha256
+from typing import TYPE_CHECKING
+
+from .profile import ProfileConfig
+from .search import SCHEMA as SEARCH_SCHEMA
+from .search import index
+from .store import connect, store_path
+from .util import Logger
+
+if TYPE_CHECKING:
+    from .ktistec_handler import KtistecHandler
+
+logger = Logger().get_logger()
+
+# delivered posts by key, a primary key lookup whatever the size of the
+# ledger. Keys given by the caller never expire, keys derived from the message
+# only for MESSAGE_WINDOW, so that the same text can be posted again later.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ledger (
+    key BLOB PRIMARY KEY,
+    delivered_at REAL NOT NULL,
+    expires_at REAL
+) WITHOUT ROWID;
+"""
+
+MESSAGE_WINDOW = 24 * 60 * 60.0
+
+
+def ledger_key(message: str, idempotency_key: str | None = None) -> bytes:
+    if idempotency_key is not None:
+        return sha256(b"key\0" + idempotency_key.encode()).digest()
+    return sha256(b"message\0" + message.encode()).digest()
+
+
+def part_key(idempotency_key: str | None, index: int) -> str | None:
+    # parts of a split message are delivered one by one, each gets its own
+    # key so that a rerun resumes after the last delivered part
+    if idempotency_key is None or index == 0:
+        return idempotency_key
+    return f"{idempotency_key}#{index}"
+
+
+class Ledger:
+    # the posting side of the account's store, also feeds the search index.
+    # One connection serves all posts, shared between threads under a lock.
+    def __init__(
+        self, profile: ProfileConfig, clock: Callable[[], float] = time.time
+    ) -> None:
+        self._path = store_path(profile)
+        self._clock = clock
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = connect(self._path, SCHEMA + SEARCH_SCHEMA)
+        return self._conn
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def delivered(
+        self, message: str, idempotency_key: str | None = None
+    ) -> bool:
+        with self._lock:
+            try:
+                return (
+                    self._connection()
+                    .execute(
+                        "SELECT 1 FROM ledger WHERE key = ? "
+                        "AND (expires_at IS NULL OR expires_at > ?)",
+                        (ledger_key(message, idempotency_key), self._clock()),
+                    )
+                    .fetchone()
+                    is not None
+                )
+            except sqlite3.Error as e:
+                logger.warning(f"Ledger unavailable: {e}")
+                return False
+
+    def record(
+        self,
+        message: str,
+        idempotency_key: str | None = None,
+        by_message: bool = False,
+    ) -> None:
+        # the post is out, a ledger that cannot be written only loses the
+        # protection against posting it again. With by_message a keyed post
+        # is recorded by its text as well.
+        now = self._clock()
+        rows = [
+            (
+                ledger_key(message, idempotency_key),
+                now,
+                None if idempotency_key is not None else now + MESSAGE_WINDOW,
+            )
+        ]
+        if by_message and idempotency_key is not None:
+            rows.append((ledger_key(message), now, now + MESSAGE_WINDOW))
+        with self._lock:
+            try:
+                conn = self._connection()
+            except sqlite3.Error as e:
+                logger.warning(f"Ledger unavailable: {e}")
+                return
+            try:
+                # one commit for both, the index in a savepoint of its own
+                with conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO ledger (key, delivered_at, "
+                        "expires_at) VALUES (?, ?, ?)",
+                        rows,
+                    )
+                    conn.execute("SAVEPOINT search")
+                    try:
+                        index(conn, "post", None, message)
+                    except sqlite3.Error as e:
+                        # nor is a stale search index a reason to fail the post
+                        conn.execute("ROLLBACK TO search")
+                        logger.debug(e, exc_info=True)
+                    conn.execute("RELEASE search")
+            except sqlite3.Error as e:
+                logger.warning(f"Ledger unavailable: {e}")
+
+    def post(
+        self,
+        handler: "KtistecHandler",
+        message: str,
+        idempotency_key: str | None = None,
+        force: bool = False,
+        by_message: bool = False,
+    ) -> bool:
+        # False when the message was delivered before and is skipped
+        if not force and self.delivered(message, idempotency_key):
+            return False
+        handler.post(message)
+        self.record(message, idempotency_key, by_message)
+        return True
@@ -1,17 +1,104 @@
+import html
+import re
+from bisect import bisect_right
+
 from urlextract import URLExtract
 
+from .profile import TimeoutConfig
+from .webfinger import MentionResolver, get_resolver
+
+# anchors already written by the user are left as they are
+_ANCHOR_PATTERN = re.compile(r"<a\b[^>]*>.*?</a\s*>", re.IGNORECASE | re.DOTALL)
+
+# @user@host, but not e-mail addresses or the tail of a URL path
+_MENTION_PATTERN = re.compile(
+    r"(?<![\w@/.])@([\w.-]+@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)+)"
+)
+
+_extractor: URLExtract | None = None
+
+
+def _get_extractor() -> URLExtract:
+    # loading the TLD list is expensive, share one extractor per process
+    global _extractor
+    if _extractor is None:
+        _extractor = URLExtract()
+    return _extractor
+
 
 class MessageBuilder:
-    def __init__(self, message: str) -> None:
+    # mentions are looked up within the profile's timeouts, offline they
+    # are only linked when the WebFinger cache knows them
+    def __init__(
+        self,
+        message: str,
+        resolver: MentionResolver | None = None,
+        timeouts: TimeoutConfig | None = None,
+        offline: bool = False,
+    ) -> None:
         self._message = message
+        self._resolver = resolver
+        self._timeouts = timeouts
+        self._offline = offline
+
+    def _find_links(self) -> list[tuple[int, int, str]]:
+        anchors = [m.span() for m in _ANCHOR_PATTERN.finditer(self._message)]
+        anchor_starts = [start for start, _ in anchors]
 
-    def build(self):
-        extractor = URLExtract()
-        urls = extractor.find_urls(self._message, only_unique=True)
+        def in_anchor(start: int, end: int) -> bool:
+            i = bisect_right(anchor_starts, start) - 1
+            if i >= 0 and anchors[i][1] > start:
+                return True
+            return i + 1 < len(anchors) and anchors[i + 1][0] < end
 
-        for url in urls:
-            self._message = self._message.replace(
-                url, f'<a href="{url}">{url}</a>'  # type: ignore
+        candidates = [
+            (start, end, f'<a href="{url}">{url}</a>')
+            for url, (start, end) in _get_extractor().find_urls(
+                self._message, get_indices=True
             )
+        ]
+
+        mentions = [
+            m
+            for m in _MENTION_PATTERN.finditer(self._message)
+            if not in_anchor(*m.span())
+        ]
+        if mentions:
+            # all handles of a message are looked up at once
+            resolver = self._resolver or get_resolver()
+            actors = resolver.resolve(
+                {m.group(1) for m in mentions}, self._timeouts, self._offline
+            )
+            candidates.extend(
+                (
+                    m.start(),
+                    m.end(),
+                    f'<a href="{html.escape(actors[m.group(1)])}" '
+                    f'class="mention">{m.group(0)}</a>',
+                )
+                for m in mentions
+                if m.group(1) in actors
+            )
+            candidates.sort()
+
+        links: list[tuple[int, int, str]] = []
+        pos = 0
+        for start, end, link in candidates:
+            if start < pos or in_anchor(start, end):
+                continue
+            links.append((start, end, link))
+            pos = end
+
+        return links
+
+    def build(self) -> str:
+        parts = []
+        pos = 0
+
+        for start, end, link in self._find_links():
+            parts.append(self._message[pos:start])
+            parts.append(link)
+            pos = end
+        parts.append(self._message[pos:])
 
-        return self._message
+        return "".join(parts)
@@ -1,12 +1,10 @@
 import os
 import tomllib
-from copy import deepcopy
-from dataclasses import asdict, dataclass
+from dataclasses import asdict, dataclass, field, fields, is_dataclass
 from tomllib import TOMLDecodeError
+from urllib.parse import urlparse
 
 import click
-import toml
-from tabulate import tabulate
 
 from .util import Logger
 
@@ -21,70 +19,222 @@ class ProfileException(Exception):
     pass
 
 
+@dataclass(frozen=True)
+class HttpConfig:
+    retries: int = 3
+    backoff_factor: float = 0.5
+    backoff_jitter: float = 0.5
+    status_forcelist: tuple[int, ...] = (502, 503, 504)
+    pool_connections: int = 10
+    pool_maxsize: int = 10
+    # leave redirect targets and the rest of token pages unread
+    lean: bool = False
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "HttpConfig":
+        if "status_forcelist" in data:
+            data = {**data, "status_forcelist": tuple(data["status_forcelist"])}
+        return cls(**data)
+
+
+@dataclass(frozen=True)
+class RateLimitConfig:
+    # posts per second, 0 leaves posting unpaced
+    rate: float = 0.0
+    burst: int = 1
+    min_in_flight: int = 1
+    max_in_flight: int = 8
+    latency_target: float = 5.0
+    decrease_factor: float = 0.5
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RateLimitConfig":
+        return cls(**data)
+
+
+@dataclass(frozen=True)
+class TimeoutConfig:
+    # seconds, connect and read apply to every request of a post and the
+    # deadline to the post as a whole
+    connect: float = 5.0
+    read: float = 30.0
+    deadline: float = 60.0
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TimeoutConfig":
+        return cls(**data)
+
+
+@dataclass(frozen=True)
+class ContentConfig:
+    # longest post content the server accepts, 0 for no limit; longer
+    # messages are split into several posts
+    max_length: int = 0
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ContentConfig":
+        return cls(**data)
+
+
 @dataclass(frozen=True)
 class ProfileConfig:
     server_url: str
     user_name: str
     password: str
+    http: HttpConfig = field(default_factory=HttpConfig)
+    rate_limit: RateLimitConfig = field(default_factory=RateLimitConfig)
+    content: ContentConfig = field(default_factory=ContentConfig)
+    timeouts: TimeoutConfig = field(default_factory=TimeoutConfig)
+
+    @property
+    def account(self) -> str:
+        return f"{self.user_name}@{urlparse(self.server_url).netloc}"
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ProfileConfig":
+        data = dict(data)
+        if "http" in data:
+            data["http"] = HttpConfig.from_dict(data["http"])
+        if "rate_limit" in data:
+            data["rate_limit"] = RateLimitConfig.from_dict(data["rate_limit"])
+        if "content" in data:
+            data["content"] = ContentConfig.from_dict(data["content"])
+        if "timeouts" in data:
+            data["timeouts"] = TimeoutConfig.from_dict(data["timeouts"])
+        return cls(**data)
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        # settings left at their defaults are kept out of the profile file
+        for f in fields(self):
+            value = getattr(self, f.name)
+            if is_dataclass(value) and not isinstance(value, type):
+                if value == type(value)():
+                    del data[f.name]
+                else:
+                    data[f.name] = {
+                        k: list(v) if isinstance(v, tuple) else v
+                        for k, v in data[f.name].items()
+                    }
+        return data
+
+
+# legacy profile files mark the default profile with this name suffix
+_LEGACY_DEFAULT_SUFFIX = ":default"
+
+
+@dataclass(frozen=True)
+class _ProfileSnapshot:
+    mtime_ns: int
+    size: int
+    profiles: dict[str, ProfileConfig]
+    default: str | None
+
+
+# parsed profile files shared by every Profile instance, keyed by path and
+# invalidated when the file's mtime or size changes
+_snapshots: dict[str, _ProfileSnapshot] = {}
 
 
 class Profile:
     def __init__(self) -> None:
         self._profile_path = f"{os.path.expanduser('~')}/.kt/profile"
 
-    def loads(self) -> dict[str, ProfileConfig]:
+    def _read(self) -> _ProfileSnapshot:
         try:
-            with open(self._profile_path, "rb") as f:
-                toml_data: dict[str, dict[str, dict[str, str]]] = tomllib.load(
-                    f
-                )
+            stat = os.stat(self._profile_path)
+        except FileNotFoundError:
+            raise ProfileNotFoundException("Config file not found.")
 
-            return {
-                profile_name: ProfileConfig(**profile)
-                for profile_name, profile in toml_data["profiles"].items()
-            }
+        snapshot = _snapshots.get(self._profile_path)
+        if (
+            snapshot
+            and snapshot.mtime_ns == stat.st_mtime_ns
+            and snapshot.size == stat.st_size
+        ):
+            return snapshot
 
+        try:
+            with open(self._profile_path, "rb") as f:
+                toml_data = tomllib.load(f)
         except FileNotFoundError:
             raise ProfileNotFoundException("Config file not found.")
         except TOMLDecodeError:
             raise ProfileException("Bad toml file.")
 
+        default = toml_data.get("default")
+        profiles = {}
+        for profile_name, profile in toml_data.get("profiles", {}).items():
+            if profile_name.endswith(_LEGACY_DEFAULT_SUFFIX):
+                profile_name = profile_name[: -len(_LEGACY_DEFAULT_SUFFIX)]
+                default = default or profile_name
+            try:
+                profiles[profile_name] = ProfileConfig.from_dict(profile)
+            except TypeError:
+                raise ProfileException(f"Bad profile config `{profile_name}`.")
+
+        snapshot = _ProfileSnapshot(
+            mtime_ns=stat.st_mtime_ns,
+            size=stat.st_size,
+            profiles=profiles,
+            default=default if default in profiles else None,
+        )
+        _snapshots[self._profile_path] = snapshot
+
+        return snapshot
+
+    def loads(self) -> dict[str, ProfileConfig]:
+        return dict(self._read().profiles)
+
+    def default_name(self) -> str | None:
+        return self._read().default
+
     def load(self, profile_name: str | None = None) -> ProfileConfig:
-        profiles = self.loads()
+        snapshot = self._read()
 
         if profile_name:
             try:
-                if f"{profile_name}:default" in profiles:
-                    return profiles[f"{profile_name}:default"]
-                else:
-                    return profiles[profile_name]
+                return snapshot.profiles[profile_name]
             except KeyError:
                 raise ProfileException(
                     "Specified profile name not found in config."
                 )
 
-        else:
-            try:
-                default = [n for n in profiles.keys() if n.endswith("default")][
-                    0
-                ]
-                return profiles[default]
-            except IndexError:
-                raise ProfileException(
-                    "Default profile config not found. You can configure profile by running `ktctl profile`"
-                )
+        if snapshot.default is None:
+            raise ProfileException(
+                "Default profile config not found. You can configure profile by running `ktctl profile`"
+            )
 
-    def _save_toml(self, data: dict[str, ProfileConfig]) -> None:
-        os.makedirs(self._profile_path[:-8], exist_ok=True)
-        toml.dump(
-            {
-                "profiles": {
-                    profile_name: asdict(profile)
-                    for profile_name, profile in data.items()
-                }
-            },
-            open(self._profile_path, "w"),
-        )
+        return snapshot.profiles[snapshot.default]
+
+    def load_many(self, profile_names: list[str]) -> dict[str, ProfileConfig]:
+        profiles = self._read().profiles
+
+        try:
+            return {name: profiles[name] for name in profile_names}
+        except KeyError as e:
+            raise ProfileException(
+                f"Specified profile name {e} not found in config."
+            )
+
+    def _save_toml(
+        self, data: dict[str, ProfileConfig], default: str | None
+    ) -> None:
+        import toml
+
+        toml_data: dict = {}
+        if default is not None:
+            toml_data["default"] = default
+        toml_data["profiles"] = {
+            profile_name: profile.to_dict()
+            for profile_name, profile in data.items()
+        }
+
+        os.makedirs(os.path.dirname(self._profile_path), exist_ok=True)
+        with open(self._profile_path, "w") as f:
+            toml.dump(toml_data, f)
+
+        _snapshots.pop(self._profile_path, None)
 
     def save(
         self,
@@ -110,8 +260,11 @@ class Profile:
                 return prompt_server_url(ctx, click.prompt(msg))
 
         profiles: dict[str, ProfileConfig] = {}
+        default = None
         try:
-            profiles = self.loads()
+            snapshot = self._read()
+            profiles = dict(snapshot.profiles)
+            default = snapshot.default
         except ProfileNotFoundException:
             pass
 
@@ -128,78 +281,64 @@ class Profile:
         )
 
         profiles[profile_name] = profile
-        self._save_toml(profiles)
+        self._save_toml(profiles, default)
 
         click.echo(f"Profile `{profile_name}` saved.")
 
     def remove(self, name: str) -> None:
-        profiles = self.loads()
+        snapshot = self._read()
 
-        name_to_show = deepcopy(name)
-        if f"{name}:default" in profiles:
-            name = f"{name}:default"
-        elif name not in profiles:
+        if name not in snapshot.profiles:
             raise ProfileException(
                 "Specified profile name not found in config."
             )
 
-        if click.confirm(
-            f"Do you really want to remove profile `{name_to_show}` ?"
-        ):
-
+        if click.confirm(f"Do you really want to remove profile `{name}` ?"):
+            profiles = dict(snapshot.profiles)
             del profiles[name]
-            self._save_toml(profiles)
+            self._save_toml(
+                profiles,
+                None if snapshot.default == name else snapshot.default,
+            )
 
-            click.echo(f"Profile `{name_to_show}` removed.")
+            click.echo(f"Profile `{name}` removed.")
 
     def list_profile(self) -> None:
-        profiles = self.loads()
+        from tabulate import tabulate
+
+        snapshot = self._read()
 
         click.echo(
             tabulate(
                 [
-                    [name, profile.server_url, profile.user_name]
-                    for name, profile in profiles.items()
+                    [
+                        name,
+                        profile.server_url,
+                        profile.user_name,
+                        "*" if name == snapshot.default else "",
+                    ]
+                    for name, profile in snapshot.profiles.items()
                 ],
-                ["Profile Name", "Server URL", "User Name"],
+                ["Profile Name", "Server URL", "User Name", "Default"],
             )
         )
 
     def set_default(self, ctx: click.Context, name: str) -> None:
-        profiles = self.loads()
-        default = None
-
-        try:
-            default = [n for n in profiles.keys() if n.endswith("default")][0]
-        except IndexError:
-            pass
+        snapshot = self._read()
 
-        if name not in profiles and f"{name}:default" not in profiles:
+        if name not in snapshot.profiles:
             raise ProfileException("Specified profile not found.")
 
-        if default:
-            if name == default.split(":")[0]:
+        if snapshot.default:
+            if name == snapshot.default:
                 raise ProfileException(
                     "Specified profile name is already set as default."
                 )
-            if click.confirm(
-                f"Profile {default.split(':')[0]} is already set as default.\nDo you want to set profile {name} as default?"
+            if not click.confirm(
+                f"Profile {snapshot.default} is already set as default.\nDo you want to set profile {name} as default?"
             ):
-                p = deepcopy(profiles)
-                del profiles[name]
-                profiles[f"{name}:default"] = p[name]
-                del profiles[default]
-                profiles[default.split(":")[0]] = p[default]
-
-                self._save_toml(profiles)
-            else:
                 ctx.exit(0)
-        else:
-
-            p = deepcopy(profiles)
-            del profiles[name]
-            profiles[f"{name}:default"] = p[name]
 
-            self._save_toml(profiles)
+        self._save_toml(snapshot.profiles, name)
 
         click.echo(f"Set profile `{name}` as default.")
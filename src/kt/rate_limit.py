@@ -0,0 +1,146 @@
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from urllib.parse import urlparse
+
+from .profile import ProfileConfig, RateLimitConfig
+from .util import Logger
+
+logger = Logger().get_logger()
+
+# completed posts older than this do not count towards the reported rate
+_RATE_WINDOW = 10.0
+
+
+@dataclass(frozen=True)
+class RateLimitStats:
+    rate: float
+    window: int
+    in_flight: int
+
+    def __str__(self) -> str:
+        return f"Rate: {self.rate:.2f} posts/s, window {self.window}."
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        config: RateLimitConfig,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._config = config
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._tokens = float(config.burst)
+        self._refilled_at = clock()
+        # AIMD concurrency window, starts wide open and backs off on the
+        # first sign of trouble
+        self._window = float(config.max_in_flight)
+        self._decreased_at = float("-inf")
+        self._in_flight = 0
+        self._completed: deque[float] = deque()
+
+    def _trim(self, now: float) -> None:
+        while self._completed and now - self._completed[0] > _RATE_WINDOW:
+            self._completed.popleft()
+
+    def _refill(self, now: float) -> None:
+        if self._config.rate > 0:
+            self._tokens = min(
+                float(self._config.burst),
+                self._tokens + (now - self._refilled_at) * self._config.rate,
+            )
+        self._refilled_at = now
+
+    def _wait_time(self) -> float | None:
+        # None means a slot is free right now
+        if self._in_flight >= int(self._window):
+            return 1.0
+        if self._config.rate > 0 and self._tokens < 1:
+            return (1 - self._tokens) / self._config.rate
+        return None
+
+    def acquire(self) -> None:
+        with self._cond:
+            while True:
+                self._refill(self._clock())
+                wait = self._wait_time()
+                if wait is None:
+                    break
+                self._cond.wait(wait)
+
+            self._in_flight += 1
+            if self._config.rate > 0:
+                self._tokens -= 1
+
+    def release(self, elapsed: float, overloaded: bool) -> None:
+        with self._cond:
+            now = self._clock()
+            self._in_flight -= 1
+            self._trim(now)
+            self._completed.append(now)
+
+            if overloaded or elapsed > self._config.latency_target:
+                # posts already in flight when the server got slow report
+                # back too, back off once per round trip
+                if now - self._decreased_at > elapsed:
+                    self._window = max(
+                        float(self._config.min_in_flight),
+                        self._window * self._config.decrease_factor,
+                    )
+                    self._decreased_at = now
+                    logger.debug(f"Rate limit window down to {self.window}.")
+            else:
+                self._window = min(
+                    float(self._config.max_in_flight),
+                    self._window + 1 / self._window,
+                )
+
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, is_overload: Callable[[Exception], bool]) -> Iterator[None]:
+        self.acquire()
+        start = self._clock()
+        try:
+            yield
+        except Exception as e:
+            self.release(self._clock() - start, is_overload(e))
+            raise
+        else:
+            self.release(self._clock() - start, False)
+
+    @property
+    def window(self) -> int:
+        return int(self._window)
+
+    def stats(self) -> RateLimitStats:
+        with self._cond:
+            now = self._clock()
+            self._trim(now)
+
+            rate = 0.0
+            if len(self._completed) > 1:
+                span = now - self._completed[0]
+                rate = (len(self._completed) - 1) / span if span > 0 else 0.0
+
+            return RateLimitStats(
+                rate=rate, window=self.window, in_flight=self._in_flight
+            )
+
+
+# one limiter per server shared by every handler in the process, so profiles
+# on the same instance are paced together; the first profile's settings win
+_limiters: dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(profile: ProfileConfig) -> RateLimiter:
+    server = urlparse(profile.server_url).netloc
+    with _limiters_lock:
+        if server not in _limiters:
+            _limiters[server] = RateLimiter(profile.rate_limit)
+        return _limiters[server]
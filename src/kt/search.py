@@ -0,0 +1,126 @@
+import html
+import re
+import sqlite3
+import time
+from dataclasses import dataclass
+
+from .profile import ProfileConfig
+from .store import connect, store_path
+from .util import Logger
+
+logger = Logger().get_logger()
+
+# documents hold plain text of posted and fetched content, the FTS table
+# indexes them as external content and is kept in step by the triggers
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    ref TEXT UNIQUE,
+    created_at REAL NOT NULL,
+    content TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+    content, content='documents', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS documents_ai AFTER INSERT ON documents BEGIN
+    INSERT INTO documents_fts (rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS documents_ad AFTER DELETE ON documents BEGIN
+    INSERT INTO documents_fts (documents_fts, rowid, content)
+    VALUES ('delete', old.id, old.content);
+END;
+CREATE TRIGGER IF NOT EXISTS documents_au AFTER UPDATE ON documents BEGIN
+    INSERT INTO documents_fts (documents_fts, rowid, content)
+    VALUES ('delete', old.id, old.content);
+    INSERT INTO documents_fts (rowid, content) VALUES (new.id, new.content);
+END;
+"""
+
+_TAG_PATTERN = re.compile(r"<[^>]+>")
+
+
+class SearchException(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class SearchHit:
+    source: str
+    ref: str | None
+    created_at: float
+    snippet: str
+
+
+def to_text(content: str) -> str:
+    return " ".join(html.unescape(_TAG_PATTERN.sub(" ", content)).split())
+
+
+def index(
+    conn: sqlite3.Connection, source: str, ref: str | None, content: str
+) -> None:
+    # fetched items are indexed once per ref, posts have none
+    conn.execute(
+        "INSERT INTO documents (source, ref, created_at, content) "
+        "VALUES (?, ?, ?, ?) ON CONFLICT (ref) DO UPDATE SET "
+        "source = excluded.source, content = excluded.content",
+        (source, ref, time.time(), to_text(content)),
+    )
+
+
+def _phrases(query: str) -> str:
+    # plain words for queries that are no valid FTS5 syntax, e.g. URLs
+    return " ".join('"' + w.replace('"', '""') + '"' for w in query.split())
+
+
+class SearchIndex:
+    # one connection for the searches and rebuilds of an instance
+    def __init__(self, profile: ProfileConfig) -> None:
+        self._path = store_path(profile)
+        self._conn: sqlite3.Connection | None = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            from .timeline import SCHEMA as TIMELINE_SCHEMA
+
+            self._conn = connect(self._path, TIMELINE_SCHEMA + SCHEMA)
+        return self._conn
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def search(self, query: str, limit: int = 20) -> list[SearchHit]:
+        conn = self._connection()
+        for q in (query, _phrases(query)):
+            try:
+                return [
+                    SearchHit(*row)
+                    for row in conn.execute(
+                        "SELECT d.source, d.ref, d.created_at, "
+                        "snippet(documents_fts, 0, '[', ']', '...', 12) "
+                        "FROM documents_fts "
+                        "JOIN documents d ON d.id = documents_fts.rowid "
+                        "WHERE documents_fts MATCH ? ORDER BY rank LIMIT ?",
+                        (q, limit),
+                    )
+                ]
+            except sqlite3.OperationalError as e:
+                logger.debug(e)
+        raise SearchException("Bad search query.")
+
+    def rebuild(self) -> int:
+        # pulls in timeline items indexed by older versions and rebuilds the
+        # full text index from the documents
+        conn = self._connection()
+        with conn:
+            for box, ref, content in conn.execute(
+                "SELECT box, id, content FROM timeline WHERE id NOT IN "
+                "(SELECT ref FROM documents WHERE ref IS NOT NULL)"
+            ).fetchall():
+                index(conn, box, ref, content)
+            conn.execute(
+                "INSERT INTO documents_fts (documents_fts) VALUES ('rebuild')"
+            )
+        return conn.execute("SELECT count(*) FROM documents").fetchone()[0]
@@ -0,0 +1,58 @@
+import json
+import os
+from hashlib import sha256
+
+import requests
+from requests.cookies import create_cookie
+
+from .profile import ProfileConfig
+from .util import Logger
+
+logger = Logger().get_logger()
+
+
+class SessionCache:
+    def __init__(self, profile: ProfileConfig) -> None:
+        key = sha256(profile.account.encode()).hexdigest()[:16]
+        self._cache_dir = f"{os.path.expanduser('~')}/.kt/sessions"
+        self._cache_path = f"{self._cache_dir}/{key}.json"
+
+    def restore(self, session: requests.Session) -> bool:
+        try:
+            with open(self._cache_path, "r") as f:
+                cookies: list[dict] = json.load(f)
+        except (FileNotFoundError, ValueError) as e:
+            logger.debug(e)
+            return False
+
+        for cookie in cookies:
+            session.cookies.set_cookie(create_cookie(**cookie))
+
+        return len(cookies) > 0
+
+    def save(self, session: requests.Session) -> None:
+        cookies = [
+            {
+                "name": c.name,
+                "value": c.value,
+                "domain": c.domain,
+                "path": c.path,
+                "expires": c.expires,
+                "secure": c.secure,
+            }
+            for c in session.cookies
+        ]
+
+        os.makedirs(self._cache_dir, mode=0o700, exist_ok=True)
+        # session cookies are credentials, keep them private to the user
+        fd = os.open(
+            self._cache_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600
+        )
+        with os.fdopen(fd, "w") as f:
+            json.dump(cookies, f)
+
+    def clear(self) -> None:
+        try:
+            os.remove(self._cache_path)
+        except FileNotFoundError:
+            pass
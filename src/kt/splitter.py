@@ -0,0 +1,105 @@
+import io
+import re
+from collections.abc import Iterator
+from typing import TextIO
+
+from .message_builder import MessageBuilder
+from .profile import ProfileConfig, TimeoutConfig
+
+# the handler wraps every post into a <div>, which counts towards the limit
+_WRAPPER_LENGTH = len("<div></div>")
+
+_WHITESPACE_PATTERN = re.compile(r"\s")
+
+_ANCHOR_END_PATTERN = re.compile(r"</a\s*>", re.IGNORECASE)
+
+
+def cut_point(text: str, size: int) -> int | None:
+    # latest place at or before size to cut text without splitting a URL or
+    # a tag, URLs never contain whitespace and anchors are kept whole
+    window = text[:size]
+    cut = None
+    for m in _WHITESPACE_PATTERN.finditer(window):
+        cut = m.end()
+    if cut is None:
+        return None
+
+    lower = window[:cut].lower()
+    tag = lower.rfind("<")
+    if tag > lower.rfind(">"):
+        cut = tag
+    anchor = lower.rfind("<a")
+    if anchor > lower.rfind("</a"):
+        cut = min(cut, anchor)
+
+    return cut or None
+
+
+def iter_segments(f: TextIO, size: int) -> Iterator[str]:
+    buffer = ""
+
+    while True:
+        chunk = f.read(size)
+        buffer += chunk
+        while len(buffer) > size:
+            # a run without whitespace longer than a post cannot be posted in
+            # one piece anyway
+            cut = cut_point(buffer, size) or size
+            yield buffer[:cut]
+            buffer = buffer[cut:]
+        if not chunk:
+            break
+
+    if buffer:
+        yield buffer
+
+
+def _split_built(built: str, limit: int) -> Iterator[str]:
+    # linking made the segment too long, cut the linked text again; anchors
+    # are never cut so this needs no second pass through the URL extractor
+    while len(built) > limit:
+        cut = cut_point(built, limit)
+        if cut is None:
+            # an anchor longer than a post is sent on its own
+            m = _ANCHOR_END_PATTERN.search(built)
+            cut = m.end() if m else len(built)
+        yield built[:cut]
+        built = built[cut:]
+
+    if built:
+        yield built
+
+
+def split_message(
+    f: TextIO,
+    max_length: int,
+    timeouts: TimeoutConfig | None = None,
+    offline: bool = False,
+) -> Iterator[str]:
+    # reads f a post at a time and yields linked posts of at most max_length,
+    # so at most a couple of posts are held in memory at once
+    limit = max(max_length - _WRAPPER_LENGTH, 1)
+    parts: list[str] = []
+    length = 0
+
+    for segment in iter_segments(f, limit):
+        built_segment = MessageBuilder(segment, None, timeouts, offline).build()
+        for built in _split_built(built_segment, limit):
+            if parts and length + len(built) > limit:
+                yield "".join(parts)
+                parts = []
+                length = 0
+            parts.append(built)
+            length += len(built)
+
+    if parts:
+        yield "".join(parts)
+
+
+def build_parts(message: str, profile: ProfileConfig) -> Iterator[str]:
+    # the message as posted to the profile, split when it limits the length
+    if profile.content.max_length:
+        return split_message(
+            io.StringIO(message), profile.content.max_length, profile.timeouts
+        )
+    return iter([MessageBuilder(message, timeouts=profile.timeouts).build()])
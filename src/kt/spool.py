@@ -0,0 +1,269 @@
+import fcntl
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+import click
+
+from .profile import Profile
+from .util import Logger
+
+if TYPE_CHECKING:
+    from .ktistec_handler import KtistecHandler
+    from .ledger import Ledger
+
+logger = Logger().get_logger()
+
+DEFAULT_MAX_ATTEMPTS = 5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    profile_name TEXT NOT NULL,
+    message TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT
+)
+"""
+
+
+@dataclass(frozen=True)
+class SpoolEntry:
+    id: int
+    profile_name: str
+    message: str
+    created_at: float
+    attempts: int
+    last_error: str | None
+
+
+@dataclass(frozen=True)
+class DrainResult:
+    delivered: int
+    failed: int
+    # first entries of profiles that ran out of attempts, they hold back the
+    # rest of their profile's posts until retried
+    stuck: tuple[SpoolEntry, ...] = ()
+
+
+def spool_key(entry: SpoolEntry) -> str:
+    # ids alone could come back after spool.db was removed
+    return f"spool:{entry.id}:{entry.created_at!r}"
+
+
+class Spool:
+    def __init__(self) -> None:
+        self._spool_dir = f"{os.path.expanduser('~')}/.kt"
+        self._spool_path = f"{self._spool_dir}/spool.db"
+        self._lock_path = f"{self._spool_dir}/spool.lock"
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(self._spool_dir, exist_ok=True)
+        conn = sqlite3.connect(self._spool_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # a committed entry must survive a crash right after `kt` returns
+        conn.execute("PRAGMA synchronous=FULL")
+        conn.execute(_SCHEMA)
+        return conn
+
+    def put(self, profile_name: str, message: str) -> int:
+        conn = self._connect()
+        try:
+            with conn:
+                cur = conn.execute(
+                    "INSERT INTO outbox (profile_name, message, created_at) "
+                    "VALUES (?, ?, ?)",
+                    (profile_name, message, time.time()),
+                )
+            return cur.lastrowid or 0
+        finally:
+            conn.close()
+
+    def waiting(self, profile_name: str, message: str) -> bool:
+        # whether the message is spooled for the profile and not drained yet
+        conn = self._connect()
+        try:
+            return (
+                conn.execute(
+                    "SELECT 1 FROM outbox WHERE profile_name = ? "
+                    "AND message = ?",
+                    (profile_name, message),
+                ).fetchone()
+                is not None
+            )
+        finally:
+            conn.close()
+
+    def entries(self) -> list[SpoolEntry]:
+        conn = self._connect()
+        try:
+            return [
+                SpoolEntry(*row)
+                for row in conn.execute(
+                    "SELECT id, profile_name, message, created_at, attempts, "
+                    "last_error FROM outbox ORDER BY id"
+                )
+            ]
+        finally:
+            conn.close()
+
+    def _pending(
+        self, conn: sqlite3.Connection, max_attempts: int
+    ) -> tuple[dict[str, list[SpoolEntry]], dict[str, SpoolEntry]]:
+        # a profile whose oldest entry ran out of attempts is stuck as a
+        # whole, posting its later entries would change their order
+        pending: dict[str, list[SpoolEntry]] = {}
+        stuck: dict[str, SpoolEntry] = {}
+        for row in conn.execute(
+            "SELECT id, profile_name, message, created_at, attempts, "
+            "last_error FROM outbox ORDER BY id"
+        ):
+            entry = SpoolEntry(*row)
+            if entry.profile_name in stuck:
+                continue
+            if (
+                entry.profile_name not in pending
+                and entry.attempts >= max_attempts
+            ):
+                stuck[entry.profile_name] = entry
+                continue
+            pending.setdefault(entry.profile_name, []).append(entry)
+        return pending, stuck
+
+    def retry(self, entry_id: int | None = None) -> int:
+        # gives entries that ran out of attempts a fresh start
+        conn = self._connect()
+        try:
+            with conn:
+                if entry_id is None:
+                    cur = conn.execute(
+                        "UPDATE outbox SET attempts = 0 WHERE attempts > 0"
+                    )
+                else:
+                    cur = conn.execute(
+                        "UPDATE outbox SET attempts = 0 WHERE id = ?",
+                        (entry_id,),
+                    )
+            return cur.rowcount
+        finally:
+            conn.close()
+
+    def _drain_profile(
+        self,
+        conn: sqlite3.Connection,
+        handler: "KtistecHandler",
+        ledger: "Ledger",
+        entries: list[SpoolEntry],
+    ) -> tuple[int, int]:
+        delivered = 0
+        try:
+            for entry in entries:
+                # `kt --spool` checked the ledger for the message when it
+                # was spooled. The entry's own key covers a drain dying
+                # between the post and the delete below, the message is
+                # recorded too so that later posts of it are skipped.
+                ledger.post(
+                    handler, entry.message, spool_key(entry), by_message=True
+                )
+                with conn:
+                    conn.execute("DELETE FROM outbox WHERE id = ?", (entry.id,))
+                delivered += 1
+        except Exception as e:
+            logger.debug(e, exc_info=True)
+            # keep the order of the profile's posts, the rest waits for the
+            # next drain
+            self._fail(conn, entries[delivered], e)
+            return delivered, 1
+
+        return delivered, 0
+
+    def _fail(
+        self, conn: sqlite3.Connection, entry: SpoolEntry, e: Exception
+    ) -> None:
+        with conn:
+            conn.execute(
+                "UPDATE outbox SET attempts = attempts + 1, "
+                "last_error = ? WHERE id = ?",
+                (str(e) or type(e).__name__, entry.id),
+            )
+
+    def drain(
+        self, ctx: click.Context, max_attempts: int | None = None
+    ) -> DrainResult:
+        from .ktistec_handler import KtistecHandler
+        from .ledger import Ledger
+
+        max_attempts = max_attempts or DEFAULT_MAX_ATTEMPTS
+        delivered = 0
+        failed = 0
+        # one handler, hence one logged in session, per profile
+        handlers: dict[str, tuple[KtistecHandler, Ledger]] = {}
+        failed_profiles: set[str] = set()
+
+        os.makedirs(self._spool_dir, exist_ok=True)
+        with open(self._lock_path, "w") as lock:
+            # one drain at a time, a second one waits and picks up the rest
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            conn = self._connect()
+            try:
+                while True:
+                    pending, stuck = self._pending(conn, max_attempts)
+                    pending = {
+                        name: entries
+                        for name, entries in pending.items()
+                        if name not in failed_profiles
+                    }
+                    if not pending:
+                        break
+
+                    for profile_name, entries in pending.items():
+                        try:
+                            if profile_name not in handlers:
+                                profile = Profile().load(profile_name)
+                                handlers[profile_name] = (
+                                    KtistecHandler(ctx, profile),
+                                    Ledger(profile),
+                                )
+                        except Exception as e:
+                            # e.g. a removed profile, an attempt of its first
+                            # entry like a failed post so that it ends up stuck
+                            click.echo(f"{profile_name}: {e}", err=True)
+                            self._fail(conn, entries[0], e)
+                            failed += 1
+                            failed_profiles.add(profile_name)
+                            continue
+
+                        d, f = self._drain_profile(
+                            conn, *handlers[profile_name], entries
+                        )
+                        delivered += d
+                        failed += f
+                        if f:
+                            failed_profiles.add(profile_name)
+            finally:
+                conn.close()
+
+        return DrainResult(
+            delivered=delivered, failed=failed, stuck=tuple(stuck.values())
+        )
+
+
+def start_background_drain() -> None:
+    subprocess.Popen(
+        [
+            sys.executable,
+            "-c",
+            f"from {__package__}.cli import ctl_main; ctl_main()",
+            "spool",
+            "drain",
+        ],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
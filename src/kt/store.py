@@ -0,0 +1,39 @@
+import os
+import sqlite3
+import threading
+from hashlib import sha256
+
+from .profile import ProfileConfig
+
+
+# one SQLite database per account for what `kt` keeps locally about it, each
+# feature creates its own tables on connect
+def store_path(profile: ProfileConfig) -> str:
+    key = sha256(profile.account.encode()).hexdigest()[:16]
+    return f"{os.path.expanduser('~')}/.kt/store/{key}.db"
+
+
+# databases whose schema this process has set up already, running the
+# schema scripts again on every connect costs more than the inserts
+_ready: set[tuple[str, str]] = set()
+_ready_lock = threading.Lock()
+
+
+def connect(path: str, schema: str) -> sqlite3.Connection:
+    # a connection may be shared by posting threads, its owner serializes
+    # access to it
+    with _ready_lock:
+        ready = (path, schema) in _ready and os.path.exists(path)
+    if not ready:
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    # WAL commits survive a crash of kt without a sync each, only a power
+    # loss can take the last few with it
+    conn.execute("PRAGMA synchronous=NORMAL")
+    if not ready:
+        conn.execute("PRAGMA journal_mode=WAL")
+        # one transaction, not a commit per statement
+        conn.executescript(f"BEGIN;\n{schema}\nCOMMIT;")
+        with _ready_lock:
+            _ready.add((path, schema))
+    return conn
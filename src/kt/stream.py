@@ -0,0 +1,131 @@
+import codecs
+import queue
+import threading
+from collections.abc import Iterator
+from dataclasses import dataclass
+from typing import BinaryIO
+
+import click
+
+from .ktistec_handler import KtistecHandler
+from .ledger import Ledger
+from .splitter import build_parts
+from .util import Logger
+
+logger = Logger().get_logger()
+
+_CHUNK_SIZE = 4096
+
+_STOP = object()
+
+
+@dataclass(frozen=True)
+class StreamResult:
+    succeeded: int
+    failed: int
+    skipped: int = 0
+
+
+def iter_records(
+    f: BinaryIO, delimiter: str = "\n", encoding: str = "utf-8"
+) -> Iterator[str]:
+    # read1 returns whatever is available, so records are yielded as soon as
+    # their delimiter arrives instead of when a full chunk is buffered
+    read = getattr(f, "read1", None) or f.read
+    decoder = codecs.getincrementaldecoder(encoding)("replace")
+    buffer = ""
+
+    while True:
+        chunk = read(_CHUNK_SIZE)
+        buffer += decoder.decode(chunk, final=not chunk)
+        *records, buffer = buffer.split(delimiter)
+        for record in records:
+            if record.strip():
+                yield record
+        if not chunk:
+            break
+
+    if buffer.strip():
+        yield buffer
+
+
+class StreamPoster:
+    def __init__(
+        self,
+        handler: KtistecHandler,
+        max_in_flight: int = 1,
+        ledger: Ledger | None = None,
+        force: bool = False,
+    ):
+        self._handler = handler
+        self._ledger = ledger
+        self._force = force
+        # one worker posts the records in the order they are read, more
+        # post concurrently and may reach the timeline out of order
+        self._max_in_flight = max_in_flight
+        # records read ahead of the posting workers, bounded so memory
+        # stays flat when the server falls behind
+        self._queue: queue.Queue = queue.Queue(maxsize=max_in_flight)
+        self._lock = threading.Lock()
+        self._succeeded = 0
+        self._failed = 0
+        self._skipped = 0
+
+    def _work(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+
+            record_no, record = item
+            try:
+                # long records go out in parts, each recorded on its own
+                posted = False
+                for part in build_parts(record, self._handler.profile):
+                    if self._ledger is None:
+                        posted = True
+                        self._handler.post(part)
+                    else:
+                        posted |= self._ledger.post(
+                            self._handler, part, force=self._force
+                        )
+            except Exception as e:
+                logger.debug(e, exc_info=True)
+                with self._lock:
+                    self._failed += 1
+                click.echo(f"record {record_no}: failed: {e}", err=True)
+            else:
+                if posted:
+                    with self._lock:
+                        self._succeeded += 1
+                    click.echo(f"record {record_no}: ok")
+                else:
+                    with self._lock:
+                        self._skipped += 1
+                    click.echo(f"record {record_no}: skipped, already posted")
+
+    def run(self, records: Iterator[str]) -> StreamResult:
+        workers = [
+            threading.Thread(target=self._work, daemon=True)
+            for _ in range(self._max_in_flight)
+        ]
+        for worker in workers:
+            worker.start()
+
+        try:
+            for record_no, record in enumerate(records, start=1):
+                self._queue.put((record_no, record))
+        except KeyboardInterrupt:
+            # stop reading, but let queued and in-flight posts finish
+            click.echo("Interrupted, flushing queued records.", err=True)
+        finally:
+            for _ in workers:
+                self._queue.put(_STOP)
+            for worker in workers:
+                worker.join()
+
+        return StreamResult(
+            succeeded=self._succeeded,
+            failed=self._failed,
+            skipped=self._skipped,
+        )
@@ -0,0 +1,208 @@
+import json
+import sqlite3
+import time
+from collections.abc import Iterator
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from .profile import ProfileConfig
+from .search import SCHEMA as SEARCH_SCHEMA
+from .search import index
+from .store import connect, store_path
+from .util import Logger
+
+if TYPE_CHECKING:
+    from .ktistec_handler import KtistecHandler
+
+logger = Logger().get_logger()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS timeline (
+    box TEXT NOT NULL,
+    id TEXT NOT NULL,
+    type TEXT,
+    actor TEXT,
+    published TEXT,
+    content TEXT NOT NULL,
+    data TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (box, id)
+);
+CREATE INDEX IF NOT EXISTS timeline_published ON timeline (box, published);
+CREATE TABLE IF NOT EXISTS timeline_sync (
+    box TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    checkpoint TEXT,
+    synced_at REAL NOT NULL
+);
+"""
+
+
+@dataclass(frozen=True)
+class TimelineItem:
+    id: str
+    type: str | None
+    actor: str | None
+    published: str | None
+    content: str
+
+
+@dataclass(frozen=True)
+class _SyncState:
+    etag: str | None
+    last_modified: str | None
+    checkpoint: str | None
+
+
+def _id(value) -> str | None:
+    # activity streams properties are either embedded objects or their IRIs
+    if isinstance(value, dict):
+        return value.get("id")
+    return value
+
+
+def to_item(data) -> TimelineItem:
+    if not isinstance(data, dict):
+        return TimelineItem(
+            id=data, type=None, actor=None, published=None, content=""
+        )
+
+    obj = data.get("object")
+    obj = obj if isinstance(obj, dict) else {}
+    return TimelineItem(
+        id=data["id"],
+        type=data.get("type"),
+        actor=_id(data.get("actor")),
+        published=data.get("published") or obj.get("published"),
+        content=data.get("content") or obj.get("content") or "",
+    )
+
+
+class Timeline:
+    def __init__(self, profile: ProfileConfig) -> None:
+        self._profile = profile
+        self._path = store_path(profile)
+
+    def _connect(self) -> sqlite3.Connection:
+        return connect(self._path, SCHEMA + SEARCH_SCHEMA)
+
+    def _collection_url(self, box: str) -> str:
+        return (
+            f"{self._profile.server_url}/actors/{self._profile.user_name}/{box}"
+        )
+
+    def _state(self, conn: sqlite3.Connection, box: str) -> _SyncState:
+        row = conn.execute(
+            "SELECT etag, last_modified, checkpoint FROM timeline_sync "
+            "WHERE box = ?",
+            (box,),
+        ).fetchone()
+        return _SyncState(*row) if row else _SyncState(None, None, None)
+
+    def iter_pages(
+        self, handler: "KtistecHandler", box: str, state: _SyncState
+    ) -> Iterator[tuple[dict, list]]:
+        # yields (collection response headers, page items) page by page,
+        # nothing when the collection is unchanged since the last sync
+        headers = {}
+        if state.etag:
+            headers["If-None-Match"] = state.etag
+        if state.last_modified:
+            headers["If-Modified-Since"] = state.last_modified
+
+        res = handler.get(self._collection_url(box), headers)
+        if res.status_code == 304:
+            logger.debug(f"{box} not modified.")
+            return
+
+        validators = {
+            "etag": res.headers.get("ETag"),
+            "last_modified": res.headers.get("Last-Modified"),
+        }
+        collection = res.json()
+        page = collection.get("first")
+        if page is None:
+            # collections small enough to be sent in one piece
+            page = collection
+
+        while page:
+            if not isinstance(page, dict):
+                page = handler.get(page).json()
+            yield validators, page.get("orderedItems", page.get("items", []))
+            page = page.get("next")
+
+    def iter_new(
+        self, handler: "KtistecHandler", box: str, state: _SyncState
+    ) -> Iterator[tuple[dict, dict]]:
+        # newest first, stops at the checkpoint so that older pages are
+        # never fetched again
+        for validators, items in self.iter_pages(handler, box, state):
+            for data in items:
+                if _id(data) == state.checkpoint:
+                    return
+                yield validators, data
+
+    def sync(self, handler: "KtistecHandler", box: str) -> int:
+        conn = self._connect()
+        try:
+            state = self._state(conn, box)
+            validators: dict = {}
+            checkpoint = state.checkpoint
+            count = 0
+
+            with conn:
+                for validators, data in self.iter_new(handler, box, state):
+                    item = to_item(data)
+                    if count == 0:
+                        checkpoint = item.id
+                    count += 1
+                    conn.execute(
+                        "INSERT OR REPLACE INTO timeline (box, id, type, "
+                        "actor, published, content, data, fetched_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (
+                            box,
+                            item.id,
+                            item.type,
+                            item.actor,
+                            item.published,
+                            item.content,
+                            json.dumps(data),
+                            time.time(),
+                        ),
+                    )
+                    index(conn, box, item.id, item.content)
+
+                # an unchanged collection keeps its validators
+                if validators:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO timeline_sync (box, etag, "
+                        "last_modified, checkpoint, synced_at) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (
+                            box,
+                            validators["etag"],
+                            validators["last_modified"],
+                            checkpoint,
+                            time.time(),
+                        ),
+                    )
+
+            return count
+        finally:
+            conn.close()
+
+    def items(self, box: str, limit: int) -> list[TimelineItem]:
+        conn = self._connect()
+        try:
+            return [
+                TimelineItem(*row)
+                for row in conn.execute(
+                    "SELECT id, type, actor, published, content FROM timeline "
+                    "WHERE box = ? ORDER BY published DESC LIMIT ?",
+                    (box, limit),
+                )
+            ]
+        finally:
+            conn.close()
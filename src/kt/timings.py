@@ -0,0 +1,141 @@
+import json
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, TextIO
+
+import click
+
+
+@dataclass
+class RequestRecord:
+    method: str
+    url: str
+    status_code: int
+    elapsed: float
+    bytes_sent: int
+    bytes_received: int
+    redirect: bool
+
+
+@dataclass
+class PhaseRecord:
+    name: str
+    elapsed: float = 0.0
+    requests: list[RequestRecord] = field(default_factory=list)
+
+
+class Tracer:
+    def __init__(self) -> None:
+        self.phases: list[PhaseRecord] = []
+        self._lock = threading.Lock()
+        # the phase running on each thread and the responses it has seen so
+        # far, concurrent posts keep their requests apart
+        self._local = threading.local()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        record = PhaseRecord(name)
+        with self._lock:
+            self.phases.append(record)
+        responses: list[Any] = []
+        self._local.responses = responses
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record.elapsed = time.perf_counter() - start
+            # bodies are read by now, streamed ones only as far as we went
+            record.requests = [self._to_record(r) for r in responses]
+            self._local.responses = None
+
+    def hook(self, res, *args, **kwargs) -> None:
+        # requests response hook, called once per response including every
+        # redirect hop
+        responses = getattr(self._local, "responses", None)
+        if responses is not None:
+            responses.append(res)
+
+    def _to_record(self, res) -> RequestRecord:
+        body = res.request.body or b""
+        try:
+            received = res.raw.tell()
+        except AttributeError:
+            received = int(res.headers.get("Content-Length", 0))
+
+        return RequestRecord(
+            method=res.request.method,
+            url=res.url,
+            status_code=res.status_code,
+            elapsed=res.elapsed.total_seconds(),
+            bytes_sent=len(body.encode() if isinstance(body, str) else body),
+            bytes_received=received,
+            redirect=res.is_redirect,
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "phases": [asdict(p) for p in self.phases],
+            "total": sum(p.elapsed for p in self.phases),
+        }
+
+    def dump(self, f: TextIO) -> None:
+        json.dump(self.to_dict(), f, indent=2)
+        f.write("\n")
+
+    def show(self) -> None:
+        from tabulate import tabulate
+
+        rows = []
+        for p in self.phases:
+            rows.append(
+                [
+                    p.name,
+                    f"{p.elapsed * 1000:.1f}",
+                    len(p.requests),
+                    ", ".join(str(r.status_code) for r in p.requests),
+                    sum(r.bytes_sent for r in p.requests),
+                    sum(r.bytes_received for r in p.requests),
+                    sum(r.redirect for r in p.requests),
+                ]
+            )
+        rows.append(
+            [
+                "total",
+                f"{sum(p.elapsed for p in self.phases) * 1000:.1f}",
+                "",
+                "",
+                "",
+                "",
+                "",
+            ]
+        )
+
+        click.echo(
+            tabulate(
+                rows,
+                [
+                    "Phase",
+                    "Time (ms)",
+                    "Requests",
+                    "Status",
+                    "Bytes Sent",
+                    "Bytes Received",
+                    "Redirects",
+                ],
+            ),
+            err=True,
+        )
+
+
+class NullTracer(Tracer):
+    # stands in when neither --timings nor --trace asked for one, long runs
+    # such as the daemon must not pile up records
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        yield
+
+    def hook(self, res, *args, **kwargs) -> None:
+        pass
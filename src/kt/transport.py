@@ -0,0 +1,90 @@
+import random
+from collections.abc import Callable
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, MaxRetryError
+from urllib3.util.retry import Retry
+
+from .profile import HttpConfig
+
+
+class JitteredRetry(Retry):
+    # urllib3 before 2.0 has no backoff_jitter, so add it on top here
+    def __init__(
+        self,
+        *args,
+        jitter: float = 0.0,
+        budget: Callable[[], float] | None = None,
+        **kwargs,
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.jitter = jitter
+        # seconds left to start another attempt in, retries must not outlast
+        # the deadline of the post they belong to
+        self.budget = budget
+
+    def new(self, **kwargs) -> "JitteredRetry":
+        retry = super().new(**kwargs)
+        retry.jitter = self.jitter  # type: ignore
+        retry.budget = self.budget  # type: ignore
+        return retry  # type: ignore
+
+    def increment(  # type: ignore[override]
+        self,
+        method=None,
+        url=None,
+        response=None,
+        error=None,
+        _pool=None,
+        _stacktrace=None,
+    ) -> "JitteredRetry":
+        retry = super().increment(
+            method, url, response, error, _pool, _stacktrace
+        )
+        if (
+            self.budget is not None
+            and Retry.get_backoff_time(retry) >= self.budget()
+        ):
+            # surfaces as a connect timeout, the post then fails naming the
+            # phase it ran out of time in
+            raise MaxRetryError(
+                _pool, url, ConnectTimeoutError("Deadline reached.")
+            )
+        return retry  # type: ignore
+
+    def get_backoff_time(self) -> float:
+        backoff = super().get_backoff_time()
+        if backoff <= 0:
+            return backoff
+        return backoff + random.uniform(0, self.jitter)
+
+
+def build_retry(
+    http: HttpConfig, budget: Callable[[], float] | None = None
+) -> JitteredRetry:
+    # POST is not in the default allowed methods, so a post is only retried
+    # on connect errors, where the request never reached the server
+    return JitteredRetry(
+        total=http.retries,
+        backoff_factor=http.backoff_factor,
+        jitter=http.backoff_jitter,
+        budget=budget,
+        status_forcelist=http.status_forcelist,
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        raise_on_status=False,
+    )
+
+
+def mount_adapter(
+    session: requests.Session,
+    http: HttpConfig,
+    budget: Callable[[], float] | None = None,
+) -> None:
+    adapter = HTTPAdapter(
+        max_retries=build_retry(http, budget),
+        pool_connections=http.pool_connections,
+        pool_maxsize=http.pool_maxsize,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
@@ -0,0 +1,201 @@
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .profile import TimeoutConfig
+from .store import connect
+from .util import Logger
+
+logger = Logger().get_logger()
+
+# handles resolve to actor IRIs, or to nothing when the server does not know
+# them; both are kept until expires_at
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS webfinger (
+    handle TEXT PRIMARY KEY,
+    href TEXT,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+TTL = 24 * 60 * 60.0
+NOT_FOUND_TTL = 60 * 60.0
+
+_ACTIVITY_TYPES = (
+    "application/activity+json",
+    'application/ld+json; profile="https://www.w3.org/ns/activitystreams"',
+)
+
+
+def cache_path() -> str:
+    # mentions do not depend on the account, one cache serves all profiles
+    return f"{os.path.expanduser('~')}/.kt/webfinger.db"
+
+
+def normalize(handle: str) -> str:
+    user, _, host = handle.lstrip("@").rpartition("@")
+    return f"{user}@{host.lower()}"
+
+
+def actor_url(jrd) -> str | None:
+    links = jrd.get("links", []) if isinstance(jrd, dict) else []
+    for link in links:
+        if (
+            isinstance(link, dict)
+            and link.get("rel") == "self"
+            and link.get("type") in _ACTIVITY_TYPES
+            and link.get("href")
+        ):
+            return link["href"]
+    return None
+
+
+class MentionResolver:
+    def __init__(
+        self,
+        path: str | None = None,
+        ttl: float = TTL,
+        max_workers: int = 8,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self._path = path or cache_path()
+        self._ttl = ttl
+        self._max_workers = max_workers
+        self._clock = clock
+        self._session = requests.Session()
+        self._lock = threading.Lock()
+        self._memory: dict[str, tuple[str | None, float]] = {}
+
+    def _lookup(
+        self, handle: str, timeout: tuple[float, float]
+    ) -> tuple[str | None, float]:
+        host = handle.rpartition("@")[2]
+        res = self._session.get(
+            f"https://{host}/.well-known/webfinger",
+            params={"resource": f"acct:{handle}"},
+            headers={"Accept": "application/jrd+json"},
+            timeout=timeout,
+        )
+        if res.status_code in (404, 410):
+            return None, NOT_FOUND_TTL
+        res.raise_for_status()
+        return actor_url(res.json()), self._ttl
+
+    def _fetch(
+        self, handles: list[str], timeouts: TimeoutConfig
+    ) -> dict[str, tuple[str | None, float]]:
+        # failed lookups are left out, they are tried again next time. All
+        # lookups share the deadline, each request gets what is left of it
+        deadline = time.monotonic() + timeouts.deadline
+
+        def lookup(handle: str) -> tuple[str, tuple[str | None, float] | None]:
+            try:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise requests.Timeout()
+                timeout = (
+                    min(timeouts.connect, remaining),
+                    min(timeouts.read, remaining),
+                )
+                return handle, self._lookup(handle, timeout)
+            except (requests.RequestException, ValueError) as e:
+                logger.debug(f"WebFinger lookup for {handle} failed: {e}")
+                return handle, None
+
+        if not handles:
+            return {}
+        workers = max(1, min(self._max_workers, len(handles)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            now = self._clock()
+            return {
+                handle: (result[0], now + result[1])
+                for handle, result in executor.map(lookup, handles)
+                if result is not None
+            }
+
+    def _load(
+        self, conn: sqlite3.Connection, handles: list[str]
+    ) -> dict[str, tuple[str | None, float]]:
+        rows = conn.execute(
+            "SELECT handle, href, expires_at FROM webfinger WHERE handle IN "
+            f"({', '.join('?' * len(handles))}) AND expires_at > ?",
+            (*handles, self._clock()),
+        )
+        return {handle: (href, expires_at) for handle, href, expires_at in rows}
+
+    def resolve(
+        self,
+        handles: Iterable[str],
+        timeouts: TimeoutConfig | None = None,
+        offline: bool = False,
+    ) -> dict[str, str]:
+        # returns actor IRIs by handle as given, unresolved handles are left
+        # out. Offline only the cache is consulted.
+        timeouts = timeouts or TimeoutConfig()
+        keys = {handle: normalize(handle) for handle in handles}
+        now = self._clock()
+        with self._lock:
+            found = {
+                key: self._memory[key]
+                for key in set(keys.values())
+                if key in self._memory and self._memory[key][1] > now
+            }
+
+        missing = sorted(set(keys.values()) - found.keys())
+        if missing:
+            fetched = None
+            conn = None
+            try:
+                conn = connect(self._path, SCHEMA)
+                found.update(self._load(conn, missing))
+                fetched = (
+                    {}
+                    if offline
+                    else self._fetch(
+                        sorted(set(missing) - found.keys()), timeouts
+                    )
+                )
+                with conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO webfinger "
+                        "(handle, href, expires_at) VALUES (?, ?, ?)",
+                        [(k, href, exp) for k, (href, exp) in fetched.items()],
+                    )
+            except sqlite3.Error as e:
+                # lookups still work without the cache
+                logger.warning(f"WebFinger cache unavailable: {e}")
+            finally:
+                if conn is not None:
+                    conn.close()
+
+            if fetched is None and not offline:
+                fetched = self._fetch(
+                    sorted(set(missing) - found.keys()), timeouts
+                )
+            found.update(fetched or {})
+            with self._lock:
+                self._memory.update(found)
+
+        return {
+            handle: href
+            for handle, key in keys.items()
+            if key in found and (href := found[key][0]) is not None
+        }
+
+
+_resolver: MentionResolver | None = None
+_resolver_lock = threading.Lock()
+
+
+def get_resolver() -> MentionResolver:
+    # one resolver per process, so batch and daemon posts share its memory
+    global _resolver
+    with _resolver_lock:
+        if _resolver is None:
+            _resolver = MentionResolver()
+        return _resolver
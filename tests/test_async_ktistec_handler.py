@@ -0,0 +1,142 @@
+import asyncio
+import os
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from src.kt.async_ktistec_handler import AsyncKtistecHandler, post_all
+from src.kt.ktistec_handler import KtistecHandlerException
+from src.kt.profile import ProfileConfig
+
+
+class TestAsyncKtistecHandler:
+    @pytest.fixture
+    def sessions_response_body(self):
+        return open(
+            f"{os.getcwd()}/tests/resources/ktistec_handler/dummy_sessions_response_body",
+            "r",
+        ).read()
+
+    def make_app(self, sessions_response_body, requests):
+        async def csrf(request):
+            requests.append((request.method, request.path))
+            return web.Response(
+                text=sessions_response_body, content_type="text/html"
+            )
+
+        async def login(request):
+            data = await request.post()
+            requests.append((request.method, request.path, dict(data)))
+            res = web.Response(text="")
+            res.set_cookie("AuthToken", data["username"])
+            return res
+
+        async def outbox(request):
+            data = await request.post()
+            requests.append(
+                (
+                    request.method,
+                    request.path,
+                    dict(data),
+                    request.cookies.get("AuthToken"),
+                )
+            )
+            return web.Response(text="")
+
+        app = web.Application()
+        app.router.add_get("/", csrf)
+        app.router.add_get("/sessions", csrf)
+        app.router.add_post("/sessions", login)
+        app.router.add_post("/actors/{user}/outbox", outbox)
+        return app
+
+    def test_post_success(self, sessions_response_body):
+        requests: list = []
+
+        async def run():
+            async with TestServer(
+                self.make_app(sessions_response_body, requests)
+            ) as server:
+                profile = ProfileConfig(
+                    server_url=str(server.make_url("")).rstrip("/"),
+                    user_name="test_user_one",
+                    password="test_passwd_one",
+                )
+                async with AsyncKtistecHandler(profile) as target:
+                    await asyncio.gather(target.post("one"), target.post("two"))
+
+        asyncio.run(run())
+
+        token = "beb886633614303dd2c5774a25a347ee"
+        assert requests[:2] == [
+            ("GET", "/sessions"),
+            (
+                "POST",
+                "/sessions",
+                {
+                    "username": "test_user_one",
+                    "password": "test_passwd_one",
+                    "authenticity_token": token,
+                },
+            ),
+        ]
+        outbox = [r for r in requests if r[1].endswith("/outbox")]
+        assert sorted(r[2]["content"] for r in outbox) == [
+            "<div>one</div>",
+            "<div>two</div>",
+        ]
+        assert outbox[0][2]["authenticity_token"] == token
+        assert outbox[0][3] == "test_user_one"
+
+    def test_post_all_shares_connector(self, sessions_response_body):
+        requests: list = []
+
+        async def run():
+            async with TestServer(
+                self.make_app(sessions_response_body, requests)
+            ) as server:
+                server_url = str(server.make_url("")).rstrip("/")
+                return await post_all(
+                    {
+                        "foo": ProfileConfig(
+                            server_url=server_url,
+                            user_name="test_user_one",
+                            password="test_passwd_one",
+                        ),
+                        "bar": ProfileConfig(
+                            server_url=server_url + "/not_found",
+                            user_name="test_user_two",
+                            password="test_passwd_two",
+                        ),
+                    },
+                    "test_message",
+                )
+
+        res = asyncio.run(run())
+
+        assert res["foo"] is None
+        assert res["bar"] is not None
+        assert [r[3] for r in requests if r[1].endswith("/outbox")] == [
+            "test_user_one"
+        ]
+
+    def test_get_csrf_token_fail(self):
+        async def empty(request):
+            return web.Response(text="<html></html>")
+
+        async def run():
+            app = web.Application()
+            app.router.add_get("/", empty)
+            async with TestServer(app) as server:
+                profile = ProfileConfig(
+                    server_url=str(server.make_url("")).rstrip("/"),
+                    user_name="test_user_one",
+                    password="test_passwd_one",
+                )
+                async with AsyncKtistecHandler(profile) as target:
+                    await target._get_csrf_token(profile.server_url)
+
+        with pytest.raises(KtistecHandlerException) as e:
+            asyncio.run(run())
+        assert str(e.value) == "Failed to get CSRF Token."
@@ -0,0 +1,149 @@
+import io
+from dataclasses import replace
+from unittest.mock import Mock, patch
+
+import pytest
+
+from src.kt.batch import (
+    BatchPoster,
+    BatchRecordException,
+    BatchResult,
+    iter_records,
+    parse_keyed_record,
+)
+from src.kt.ledger import Ledger
+from src.kt.profile import ContentConfig, ProfileConfig
+
+
+class TestBatch:
+    @pytest.fixture
+    def handler(self):
+        return Mock(
+            profile=ProfileConfig(
+                server_url="https://one.example.com",
+                user_name="test_user",
+                password="test_passwd",
+            )
+        )
+
+    test_cases = {
+        "json string": ('"test message"\n', ("test message", None)),
+        "json object": (
+            '{"message": "test message"}\n',
+            ("test message", None),
+        ),
+    }
+
+    @pytest.mark.parametrize(
+        "line,expected",
+        list(test_cases.values()),
+        ids=test_cases.keys(),
+    )
+    def test_parse_record(self, line, expected):
+        assert parse_keyed_record(line) == expected
+
+    error_cases = {
+        "bad json": ("{message", "Bad json record."),
+        "no message": ('{"text": "foo"}', "Record has no `message` string."),
+        "not string": ('{"message": 1}', "Record has no `message` string."),
+        "empty": ('""', "Empty message."),
+    }
+
+    @pytest.mark.parametrize(
+        "line,expected",
+        list(error_cases.values()),
+        ids=error_cases.keys(),
+    )
+    def test_parse_record_fail(self, line, expected):
+        with pytest.raises(BatchRecordException) as e:
+            parse_keyed_record(line)
+        assert str(e.value) == expected
+
+    def test_parse_keyed_record(self):
+        assert parse_keyed_record(
+            '{"message": "m", "idempotency_key": "k"}'
+        ) == (
+            "m",
+            "k",
+        )
+        assert parse_keyed_record('"m"') == ("m", None)
+        with pytest.raises(BatchRecordException) as e:
+            parse_keyed_record('{"message": "m", "idempotency_key": 1}')
+        assert str(e.value) == "Record has a non-string `idempotency_key`."
+
+    def test_iter_records_skip_blank_lines(self):
+        f = io.StringIO('"one"\n\n  \n"two"\n')
+
+        assert list(iter_records(f)) == [(1, '"one"\n'), (4, '"two"\n')]
+
+    def test_run_continue_past_failures(self, handler, capsys):
+        handler.post.side_effect = [None, Exception("server error"), None]
+        f = io.StringIO('"one"\n{broken\n"two"\n"three"\n')
+
+        res = BatchPoster(handler).run(f)
+
+        assert res == BatchResult(succeeded=2, failed=2)
+        assert handler.post.call_count == 3
+        captured = capsys.readouterr()
+        assert captured.out == "line 1: ok\nline 4: ok\n"
+        assert (
+            captured.err
+            == "line 2: failed: Bad json record.\nline 3: failed: server error\n"
+        )
+
+    def test_run_stop_on_error(self, handler):
+        handler.post.side_effect = Exception("server error")
+        f = io.StringIO('"one"\n"two"\n')
+
+        res = BatchPoster(handler).run(f, stop_on_error=True)
+
+        assert res == BatchResult(succeeded=0, failed=1)
+        handler.post.assert_called_once_with("one")
+
+    def test_run_skips_delivered(self, handler, tmp_path, capsys):
+        profile = ProfileConfig(
+            server_url="https://one.example.com",
+            user_name="test_user",
+            password="test_passwd",
+        )
+        handler.post.side_effect = [None, Exception("server error"), None, None]
+        records = (
+            '"one"\n"two"\n{"message": "three", "idempotency_key": "k3"}\n'
+        )
+
+        with patch("os.path.expanduser", return_value=str(tmp_path)):
+            ledger = Ledger(profile)
+            first = BatchPoster(handler, ledger).run(io.StringIO(records))
+            capsys.readouterr()
+            rerun = BatchPoster(handler, ledger).run(io.StringIO(records))
+
+        assert first == BatchResult(succeeded=2, failed=1)
+        assert rerun == BatchResult(succeeded=1, failed=0, skipped=2)
+        assert [c.args for c in handler.post.call_args_list][3:] == [("two",)]
+        assert capsys.readouterr().out == (
+            "line 1: skipped, already posted\n"
+            "line 2: ok\n"
+            "line 3: skipped, already posted\n"
+        )
+
+    def test_run_splits_long_records(self, handler, tmp_path):
+        handler.profile = replace(
+            handler.profile, content=ContentConfig(max_length=20)
+        )
+        handler.post.side_effect = [None, Exception("server error"), None, None]
+        records = '{"message": "one two three four", "idempotency_key": "k"}\n'
+
+        with patch("os.path.expanduser", return_value=str(tmp_path)):
+            ledger = Ledger(handler.profile)
+            first = BatchPoster(handler, ledger).run(io.StringIO(records))
+            rerun = BatchPoster(handler, ledger).run(io.StringIO(records))
+
+        assert first == BatchResult(succeeded=0, failed=1)
+        assert rerun == BatchResult(succeeded=1, failed=0)
+        # the rerun resumes at the part that failed
+        assert [c.args for c in handler.post.call_args_list] == [
+            ("one two ",),
+            ("three ",),
+            ("three ",),
+            ("four",),
+        ]
@@ -0,0 +1,199 @@
+import os
+import subprocess
+import sys
+from unittest.mock import Mock, patch
+
+import click
+import pytest
+from click.testing import CliRunner
+
+from src.kt.cli import _delimiter, _start_warm_up, _warmed_up, ctl_main, main
+from src.kt.profile import ProfileConfig, TimeoutConfig
+from src.kt.spool import DrainResult, Spool
+from src.kt.timings import Tracer
+
+# cumulative import time budget of src.kt.cli in microseconds
+IMPORT_TIME_BUDGET = 250_000
+
+HEAVY_MODULES = [
+    "aiohttp",
+    "bs4",
+    "requests",
+    "tabulate",
+    "toml",
+    "urlextract",
+]
+
+
+class TestCli:
+    @pytest.fixture
+    def profiles(self, tmp_path):
+        configs = {
+            name: ProfileConfig(
+                server_url=f"https://{name}.example.com",
+                user_name="test_user",
+                password="test_passwd",
+                timeouts=TimeoutConfig(deadline=deadline),
+            )
+            for name, deadline in (("a", 30.0), ("b", 10.0))
+        }
+        with patch("os.path.expanduser", return_value=str(tmp_path)), patch(
+            "src.kt.cli.Profile"
+        ) as profile:
+            profile.return_value.loads.return_value = configs
+            profile.return_value.load_many.return_value = configs
+            profile.return_value.load.side_effect = configs.get
+            yield configs
+
+    def _import_cli(self, *args):
+        return subprocess.run(
+            [sys.executable, *args, "-c", "import src.kt.cli"],
+            cwd=os.getcwd(),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+    def test_no_heavy_imports_on_startup(self):
+        res = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import sys, src.kt.cli; print(' '.join(sys.modules))",
+            ],
+            cwd=os.getcwd(),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        modules = {m.split(".")[0] for m in res.stdout.split()}
+
+        assert [m for m in HEAVY_MODULES if m in modules] == []
+
+    def test_import_time(self):
+        res = self._import_cli("-X", "importtime")
+        line = [
+            line
+            for line in res.stderr.splitlines()
+            if line.split("|")[-1].strip() == "src.kt.cli"
+        ][0]
+        cumulative = int(line.split("|")[1])
+
+        assert cumulative < IMPORT_TIME_BUDGET
+
+    def test_warm_up(self):
+        handler = Mock()
+        ctx = click.Context(command=click.Command("test"))
+
+        with patch(
+            "src.kt.ktistec_handler.KtistecHandler", return_value=handler
+        ):
+            warm_up = _start_warm_up(ctx, Mock(), Tracer())
+            assert _warmed_up(warm_up, False) is handler
+
+        handler.warm_up.assert_called_once()
+
+    def test_warm_up_failed(self, capsys):
+        handler = Mock()
+        handler.warm_up.side_effect = Exception("Failed to get CSRF Token.")
+        ctx = click.Context(command=click.Command("test"))
+
+        with patch(
+            "src.kt.ktistec_handler.KtistecHandler", return_value=handler
+        ):
+            warm_up = _start_warm_up(ctx, Mock(), Tracer())
+            assert _warmed_up(warm_up, True) is None
+
+        assert _warmed_up(None, True) is None
+        assert (
+            capsys.readouterr().err
+            == "Warm-up failed: Failed to get CSRF Token.\n"
+        )
+
+    def test_empty_delimiter(self):
+        res = CliRunner().invoke(main, ["--stdin", "--delimiter", ""])
+
+        assert res.exit_code == 2
+        assert (
+            "Invalid value for '--delimiter': must not be empty." in res.output
+        )
+
+    def test_delimiter_escapes(self):
+        param = Mock()
+        assert _delimiter(Mock(), param, "\\0") == "\0"
+        assert _delimiter(Mock(), param, ",") == ","
+        with pytest.raises(click.BadParameter):
+            _delimiter(Mock(), param, "\\x")
+
+    @pytest.mark.parametrize(
+        "args", [["--profile", "a,b"], ["--all-profiles"]], ids=["many", "all"]
+    )
+    def test_fanout(self, profiles, args):
+        with patch("src.kt.fanout.FanoutPoster") as poster, patch(
+            "src.kt.message_builder.MessageBuilder"
+        ) as mb:
+            mb.return_value.build.return_value = "hello"
+            poster.return_value.run.return_value = []
+            res = CliRunner().invoke(main, ["-p", "hello", *args])
+
+        assert res.exit_code == 0, res.output
+        poster.return_value.run.assert_called_once_with("hello")
+        # mentions are looked up within the tightest deadline
+        assert mb.call_args.kwargs["timeouts"].deadline == 10.0
+
+    def test_fanout_spool(self, profiles):
+        with patch("src.kt.spool.Spool") as spool, patch(
+            "src.kt.spool.start_background_drain"
+        ):
+            spool.return_value.waiting.return_value = False
+            res = CliRunner().invoke(
+                main, ["--spool", "-p", "hello", "--profile", "a,b"]
+            )
+
+        assert res.exit_code == 0, res.output
+        assert [c.args for c in spool.return_value.put.call_args_list] == [
+            ("a", "hello"),
+            ("b", "hello"),
+        ]
+
+    def test_spool_skips_delivered(self, profiles):
+        profiles_load = patch(
+            "src.kt.spool.Profile.load", side_effect=profiles.get
+        )
+        handler = Mock()
+        ctx = click.Context(command=click.Command("test"))
+
+        def kt(*args):
+            with patch("src.kt.spool.start_background_drain"), patch(
+                "src.kt.ktistec_handler.KtistecHandler", handler
+            ):
+                return CliRunner().invoke(main, [*args, "--profile", "a"])
+
+        # spooled twice before a drain ran
+        assert kt("--spool", "-p", "dup").exit_code == 0
+        assert kt("--spool", "-p", "dup").exit_code == 0
+        assert len(Spool().entries()) == 1
+
+        with profiles_load, patch(
+            "src.kt.ktistec_handler.KtistecHandler", handler
+        ):
+            assert Spool().drain(ctx).delivered == 1
+
+        # spooled and posted again after the drain
+        assert kt("--spool", "-p", "dup").exit_code == 0
+        assert Spool().entries() == []
+        res = kt("--no-daemon", "-p", "dup")
+
+        assert res.exit_code == 0, res.output
+        assert "Already posted, skipped." in res.output
+        handler.return_value.post.assert_called_once_with("dup")
+
+    def test_drain_failed(self):
+        with patch(
+            "src.kt.spool.Spool.drain",
+            return_value=DrainResult(delivered=2, failed=1),
+        ):
+            res = CliRunner().invoke(ctl_main, ["spool", "drain"])
+
+        assert res.exit_code == 1
+        assert res.output == "2 delivered, 1 failed, 0 stuck.\n"
@@ -0,0 +1,166 @@
+import os
+import socket
+import threading
+import time
+from unittest.mock import Mock, patch
+
+import click
+import pytest
+
+from src.kt.daemon import DaemonException, KtDaemon, send
+from src.kt.profile import ContentConfig, ProfileConfig
+
+
+class TestDaemon:
+    @pytest.fixture
+    def home(self, tmp_path):
+        with patch("os.path.expanduser", return_value=str(tmp_path)):
+            os.makedirs(tmp_path / ".kt")
+            yield tmp_path
+
+    @pytest.fixture
+    def ctx(self):
+        return click.Context(command=click.Command("test"))
+
+    @pytest.fixture
+    def profile_load(self):
+        def load(name):
+            return ProfileConfig(
+                server_url=f"https://{name or 'default'}.example.com",
+                user_name="test_user",
+                password="test_passwd",
+            )
+
+        with patch("src.kt.daemon.Profile.load", side_effect=load) as m:
+            yield m
+
+    @pytest.fixture
+    def handlers(self):
+        handlers = {}
+
+        def handler(ctx, profile):
+            handlers[profile.server_url] = Mock()
+            return handlers[profile.server_url]
+
+        with patch("src.kt.ktistec_handler.KtistecHandler", handler):
+            yield handlers
+
+    @pytest.fixture
+    def server(self, home, ctx, profile_load, handlers):
+        server = KtDaemon(ctx)._server()
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield server
+        server.shutdown()
+        server.server_close()
+
+    def test_send_without_daemon(self, home):
+        assert send("test", None) is None
+
+    def test_send(self, server, handlers):
+        assert send("test", None) is True
+        assert send("another", None) is True
+        assert send("test", "foo") is True
+
+        # one warm handler per profile
+        default = handlers["https://default.example.com"]
+        assert [c.args for c in default.post.call_args_list] == [
+            ("test",),
+            ("another",),
+        ]
+        foo = handlers["https://foo.example.com"]
+        assert [c.args for c in foo.post.call_args_list] == [("test",)]
+
+    def test_send_skips_delivered(self, server, handlers):
+        assert send("test", None, idempotency_key="k1") is True
+        assert send("test", None, idempotency_key="k1") is False
+        assert send("test", None, idempotency_key="k1", force=True) is True
+
+        default = handlers["https://default.example.com"]
+        assert default.post.call_count == 2
+
+    def test_send_long_message(self, server, handlers, profile_load):
+        # every part may take most of the timeout, the message as a whole
+        # takes longer
+        profile_load.side_effect = lambda name: ProfileConfig(
+            server_url="https://default.example.com",
+            user_name="test_user",
+            password="test_passwd",
+            content=ContentConfig(max_length=20),
+        )
+        send("first", None)
+        handlers["https://default.example.com"].post.side_effect = (
+            lambda m: time.sleep(0.2)
+        )
+
+        assert send("one two three four five six", None, timeout=0.3) is True
+        posts = handlers["https://default.example.com"].post.call_args_list
+        assert len(posts[1:]) == 4
+
+    def test_send_failure(self, server, handlers, profile_load):
+        profile_load.side_effect = Exception("Profile not found.")
+
+        with pytest.raises(DaemonException) as e:
+            send("test", "bar")
+
+        assert str(e.value) == "Profile not found."
+
+    def test_send_no_wait(self, server, handlers, profile_load):
+        profile_load.side_effect = Exception("Profile not found.")
+
+        assert send("test", "bar", wait=False) is True
+
+    def test_bad_request(self, server, home):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(str(home / ".kt" / "kt.sock"))
+            sock.sendall(b"not json\n")
+            res = sock.makefile("rb").readline()
+
+        assert res == b'{"ok": false, "error": "Bad request."}\n'
+
+    def test_already_running(self, server, ctx):
+        with pytest.raises(DaemonException) as e:
+            KtDaemon(ctx).serve_forever()
+
+        assert str(e.value) == "Daemon is already running."
+
+    def test_stale_socket(self, home, ctx):
+        path = str(home / ".kt" / "kt.sock")
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.bind(path)
+
+        daemon = KtDaemon(ctx)
+        daemon._remove_stale_socket()
+
+        assert not os.path.exists(path)
+
+    def test_probe_connection_ignored(self, server, home, handlers):
+        # `ktctl daemon` checking for a running daemon connects and hangs up
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(str(home / ".kt" / "kt.sock"))
+
+        assert send("test", None) is True
+        assert handlers["https://default.example.com"].post.call_count == 1
+
+    def test_client_gone_before_reply(self, server, home, handlers):
+        replied = threading.Event()
+
+        with patch("src.kt.daemon.logger") as logger:
+            logger.debug.side_effect = lambda *args: replied.set()
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.connect(str(home / ".kt" / "kt.sock"))
+                sock.sendall(b'{"message": "test"}\n')
+            assert replied.wait(1)
+
+        logger.debug.assert_called_once_with("Client closed the connection.")
+        assert send("another", None) is True
+
+    def test_send_timeout(self, home):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as listener:
+            listener.bind(str(home / ".kt" / "kt.sock"))
+            listener.listen()
+
+            with pytest.raises(DaemonException) as e:
+                send("test", None, timeout=0.1)
+
+        assert str(e.value) == "Daemon did not answer within 0.1 seconds."
@@ -0,0 +1,99 @@
+import time
+from unittest.mock import patch
+
+import click
+import pytest
+
+from src.kt.fanout import FanoutPoster, FanoutResult, show_results
+from src.kt.profile import ProfileConfig
+
+
+class TestFanoutPoster:
+    @pytest.fixture
+    def profile_configs(self):
+        return {
+            f"p{i}": ProfileConfig(
+                server_url=f"https://{i}.example.com",
+                user_name=f"test_user_{i}",
+                password=f"test_passwd_{i}",
+            )
+            for i in range(4)
+        }
+
+    @pytest.fixture
+    def ctx(self):
+        return click.Context(command=click.Command("test"))
+
+    @pytest.fixture(autouse=True)
+    def home(self, tmp_path):
+        with patch("os.path.expanduser", return_value=str(tmp_path)):
+            yield tmp_path
+
+    def test_run_in_parallel(self, ctx, profile_configs):
+        handlers = []
+
+        class DummyHandler:
+            def __init__(self, ctx, profile):
+                self.profile = profile
+                handlers.append(self)
+
+            def post(self, message):
+                time.sleep(0.2)
+                if self.profile.server_url == "https://2.example.com":
+                    raise Exception("server error")
+
+        with patch("src.kt.fanout.KtistecHandler", DummyHandler):
+            start = time.perf_counter()
+            results = FanoutPoster(ctx, profile_configs, 4).run("test")
+            elapsed = time.perf_counter() - start
+
+        assert elapsed < 0.6
+        assert len({id(h) for h in handlers}) == 4
+        assert [r.profile_name for r in results] == ["p0", "p1", "p2", "p3"]
+        assert [r.error for r in results] == [
+            None,
+            None,
+            "server error",
+            None,
+        ]
+
+    def test_run_skips_delivered(self, ctx, profile_configs):
+        failing = {"https://2.example.com"}
+        posted = []
+
+        class DummyHandler:
+            def __init__(self, ctx, profile):
+                self.profile = profile
+
+            def post(self, message):
+                if self.profile.server_url in failing:
+                    raise Exception("server error")
+                posted.append(self.profile.server_url)
+
+        with patch("src.kt.fanout.KtistecHandler", DummyHandler):
+            FanoutPoster(ctx, profile_configs, 4).run("test")
+            failing.clear()
+            posted.clear()
+            results = FanoutPoster(ctx, profile_configs, 4).run("test")
+
+        assert posted == ["https://2.example.com"]
+        assert [r.skipped for r in results] == [True, True, False, True]
+        assert all(r.error is None for r in results)
+
+    def test_show_results(self, capsys):
+        show_results(
+            [
+                FanoutResult("foo", "https://one.example.com", 0.1234),
+                FanoutResult("bar", "https://two.example.com", 1.5, "error"),
+            ]
+        )
+
+        captured = capsys.readouterr()
+        assert (
+            captured.out
+            == """Profile Name    Server URL               Result      Time (s)  Error
+--------------  -----------------------  --------  ----------  -------
+foo             https://one.example.com  ok             0.123
+bar             https://two.example.com  failed         1.5    error
+"""
+        )
@@ -0,0 +1,110 @@
+import time
+from unittest.mock import patch
+
+import click
+import pytest
+
+from src.kt.health import CheckResult, HealthChecker, show_results
+from src.kt.profile import ProfileConfig
+from src.kt.timings import PhaseRecord, RequestRecord
+
+
+class TestHealthChecker:
+    @pytest.fixture
+    def profile_configs(self):
+        return {
+            f"p{i}": ProfileConfig(
+                server_url=f"https://{i}.example.com",
+                user_name=f"test_user_{i}",
+                password=f"test_passwd_{i}",
+            )
+            for i in range(4)
+        }
+
+    @pytest.fixture
+    def ctx(self):
+        return click.Context(command=click.Command("test"))
+
+    def test_run_in_parallel(self, ctx, profile_configs):
+        probes = []
+
+        class DummyHandler:
+            def __init__(self, ctx, profile, tracer):
+                self.profile = profile
+                self.tracer = tracer
+
+            def probe(self, login):
+                probes.append(login)
+                time.sleep(0.2)
+                self.tracer.phases.append(
+                    PhaseRecord(
+                        "csrf",
+                        0.2,
+                        [
+                            RequestRecord(
+                                "GET",
+                                self.profile.server_url,
+                                200,
+                                0.05,
+                                0,
+                                0,
+                                False,
+                            )
+                        ],
+                    )
+                )
+                if self.profile.server_url == "https://2.example.com":
+                    raise Exception("Failed to get CSRF Token.")
+
+        def connect_time(profile):
+            if profile.server_url == "https://3.example.com":
+                raise ConnectionRefusedError("Connection refused")
+            return 0.01
+
+        with (
+            patch("src.kt.health.KtistecHandler", DummyHandler),
+            patch("src.kt.health.connect_time", connect_time),
+        ):
+            start = time.perf_counter()
+            results = HealthChecker(ctx, profile_configs, login=True).run()
+            elapsed = time.perf_counter() - start
+
+        assert elapsed < 0.6
+        assert probes == [True, True, True]
+        assert [(r.profile_name, r.status) for r in results] == [
+            ("p0", "ok"),
+            ("p1", "ok"),
+            ("p2", "failed"),
+            ("p3", "unreachable"),
+        ]
+        assert results[0].connect == 0.01
+        assert results[0].ttfb == 0.05
+        assert results[2].error == "Failed to get CSRF Token."
+        assert results[3].error == "Connection refused"
+        assert results[3].ttfb is None
+
+    def test_show_results(self, capsys):
+        show_results(
+            [
+                CheckResult(
+                    "foo", "https://one.example.com", "ok", 0.01, 0.05, 0.1234
+                ),
+                CheckResult(
+                    "bar",
+                    "https://two.example.com",
+                    "unreachable",
+                    total=1.5,
+                    error="timed out",
+                ),
+            ]
+        )
+
+        captured = capsys.readouterr()
+        assert (
+            captured.out
+            == """Profile Name    Server URL               Status         Connect (ms)    TTFB (ms)    Total (ms)  Error
+--------------  -----------------------  -----------  --------------  -----------  ------------  ---------
+foo             https://one.example.com  ok                       10           50         123.4
+bar             https://two.example.com  unreachable                                     1500    timed out
+"""
+        )
@@ -1,14 +1,31 @@
 import os
+import time
+from dataclasses import replace
 from unittest import mock
 from unittest.mock import patch
 
 import click
 import pytest
+import requests
 import requests_mock
-from requests import Session
+from requests import Response, Session
+from urllib3.exceptions import MaxRetryError, ReadTimeoutError
 
-from src.kt.ktistec_handler import KtistecHandler, KtistecHandlerException
-from src.kt.profile import ProfileConfig
+from src.kt.ktistec_handler import (
+    KtistecHandler,
+    KtistecHandlerException,
+    KtistecTimeoutException,
+    extract_csrf_token,
+    is_overload,
+    is_timeout,
+)
+from src.kt.profile import (
+    HttpConfig,
+    ProfileConfig,
+    RateLimitConfig,
+    TimeoutConfig,
+)
+from src.kt.rate_limit import RateLimiter
 
 
 class TestKtistecHandler:
@@ -28,7 +45,12 @@ class TestKtistecHandler:
         ).read()
 
     @pytest.fixture
-    def target(self, profile_config):
+    def home(self, tmp_path):
+        with patch("os.path.expanduser", return_value=str(tmp_path)):
+            yield tmp_path
+
+    @pytest.fixture
+    def target(self, home, profile_config):
         return KtistecHandler(
             ctx=click.Context(command=click.Command("test")),
             profile=profile_config,
@@ -63,8 +85,105 @@ class TestKtistecHandler:
             target._get_csrf_token(url)
             assert str(e) == "Failed to get CSRF Token."
 
+    @requests_mock.Mocker(kw="mock")
+    def test_ensure_login_reuse_cached_session(self, target, **kwargs):
+        kwargs["mock"].head("https://one.example.com/settings", status_code=200)
+        target._session_cache = mock.Mock()
+        target._session_cache.restore.return_value = True
+        target._login = mock.Mock()
+
+        target._ensure_login()
+        target._ensure_login()
+
+        target._login.assert_not_called()
+        target._session_cache.save.assert_not_called()
+        assert kwargs["mock"].call_count == 1
+
+    @requests_mock.Mocker(kw="mock")
+    def test_ensure_login_cached_session_expired(self, target, **kwargs):
+        kwargs["mock"].head(
+            "https://one.example.com/settings",
+            status_code=302,
+            headers={"Location": "https://one.example.com/sessions"},
+        )
+        target._session_cache = mock.Mock()
+        target._session_cache.restore.return_value = True
+        target._login = mock.Mock()
+
+        target._ensure_login()
+
+        target._login.assert_called_once()
+        target._session_cache.save.assert_called_once_with(target._session)
+
+    def test_ensure_login_no_cached_session(self, target):
+        target._session_cache = mock.Mock()
+        target._session_cache.restore.return_value = False
+        target._login = mock.Mock()
+        target._is_logged_in = mock.Mock()
+
+        target._ensure_login()
+
+        target._is_logged_in.assert_not_called()
+        target._login.assert_called_once()
+        target._session_cache.save.assert_called_once_with(target._session)
+
+    def test_extract_csrf_token_chunked(self, sessions_response_body):
+        chunks = [
+            sessions_response_body[i : i + 7]
+            for i in range(0, len(sessions_response_body), 7)
+        ]
+
+        assert extract_csrf_token(chunks) == "beb886633614303dd2c5774a25a347ee"
+
+    def test_extract_csrf_token_from_input(self):
+        html = (
+            '<form><input type="hidden" name="authenticity_token" '
+            'value="input_token"></form>'
+        )
+
+        assert extract_csrf_token([html]) == "input_token"
+
+    def test_extract_csrf_token_stop_early(self, sessions_response_body):
+        consumed = []
+
+        def chunks():
+            for line in sessions_response_body.splitlines(keepends=True):
+                consumed.append(line)
+                yield line
+            yield "<div>" * 100000
+
+        assert (
+            extract_csrf_token(chunks()) == "beb886633614303dd2c5774a25a347ee"
+        )
+        assert len(consumed) < 20
+
+    def test_extract_csrf_token_not_found(self):
+        assert extract_csrf_token(["<html>", "</html>"]) is None
+
+    @requests_mock.Mocker(kw="mock")
+    def test_get_csrf_token_soup_fallback(
+        self, target, sessions_response_body, **kwargs
+    ):
+        url = "https://one.example.com"
+        kwargs["mock"].get(url, text=sessions_response_body)
+
+        def not_found(chunks):
+            for _ in chunks:
+                pass
+            return None
+
+        with patch("src.kt.ktistec_handler.extract_csrf_token", not_found):
+            assert (
+                target._get_csrf_token(url)
+                == "beb886633614303dd2c5774a25a347ee"
+            )
+
     @patch.object(Session, "post")
     def test_post_success(self, requests, target):
+        requests.return_value.is_redirect = False
+        requests.return_value.history = []
+        target._session_cache = mock.Mock()
+        target._session_cache.restore.return_value = False
         target._login = mock.Mock()
         target._get_csrf_token = mock.Mock()
         target._get_csrf_token.return_value = "beb886633614303dd2c5774a25a347ee"
@@ -83,4 +202,270 @@ class TestKtistecHandler:
                 "content": "<div>test_message</div>",
                 "authenticity_token": "beb886633614303dd2c5774a25a347ee",
             },
+            timeout=(5.0, 30.0),
+            allow_redirects=True,
+        )
+
+    @requests_mock.Mocker(kw="mock")
+    def test_post_reuses_csrf_token(self, target, **kwargs):
+        outbox = kwargs["mock"].post(
+            "https://one.example.com/actors/test_user_one/outbox",
+            status_code=200,
+        )
+        target._ensure_login = mock.Mock()
+        target._get_csrf_token = mock.Mock(return_value="token")
+
+        target.post("one")
+        target.post("two")
+
+        target._get_csrf_token.assert_called_once_with(
+            "https://one.example.com"
+        )
+        assert outbox.call_count == 2
+
+    @requests_mock.Mocker(kw="mock")
+    def test_post_refetches_rejected_csrf_token(self, target, **kwargs):
+        outbox = kwargs["mock"].post(
+            "https://one.example.com/actors/test_user_one/outbox",
+            [{"status_code": 422}, {"status_code": 200}],
+        )
+        target._ensure_login = mock.Mock()
+        target._get_csrf_token = mock.Mock(side_effect=["stale", "fresh"])
+
+        target.post("test_message")
+
+        assert target._get_csrf_token.call_count == 2
+        assert [r.text for r in outbox.request_history] == [
+            "type=Publish&public=True&content=%3Cdiv%3Etest_message%3C%2Fdiv%3E"
+            "&authenticity_token=stale",
+            "type=Publish&public=True&content=%3Cdiv%3Etest_message%3C%2Fdiv%3E"
+            "&authenticity_token=fresh",
+        ]
+        assert target._csrf_token == "fresh"
+
+    @requests_mock.Mocker(kw="mock")
+    def test_post_retries_rejected_csrf_token_once(self, target, **kwargs):
+        outbox = kwargs["mock"].post(
+            "https://one.example.com/actors/test_user_one/outbox",
+            status_code=403,
+        )
+        target._ensure_login = mock.Mock()
+        target._get_csrf_token = mock.Mock(side_effect=["stale", "fresh"])
+
+        with pytest.raises(requests.HTTPError):
+            target.post("test_message")
+
+        assert outbox.call_count == 2
+
+    @requests_mock.Mocker(kw="mock")
+    def test_post_after_warm_up(self, target, **kwargs):
+        outbox = kwargs["mock"].post(
+            "https://one.example.com/actors/test_user_one/outbox",
+            status_code=200,
+        )
+        target._session_cache = mock.Mock()
+        target._session_cache.restore.return_value = False
+        target._login = mock.Mock()
+        target._get_csrf_token = mock.Mock(return_value="token")
+
+        target.warm_up()
+        target.post("test_message")
+
+        target._login.assert_called_once()
+        target._get_csrf_token.assert_called_once_with(
+            "https://one.example.com"
+        )
+        assert outbox.call_count == 1
+        assert target._local.deadline is None
+
+    @requests_mock.Mocker(kw="mock")
+    def test_post_after_failed_warm_up(self, target, **kwargs):
+        outbox = kwargs["mock"].post(
+            "https://one.example.com/actors/test_user_one/outbox",
+            status_code=200,
         )
+        target._session_cache = mock.Mock()
+        target._session_cache.restore.return_value = False
+        target._login = mock.Mock(side_effect=[requests.ConnectionError, None])
+        target._get_csrf_token = mock.Mock(return_value="token")
+
+        with pytest.raises(requests.ConnectionError):
+            target.warm_up()
+        target.post("test_message")
+
+        assert target._login.call_count == 2
+        assert outbox.call_count == 1
+
+    @requests_mock.Mocker(kw="mock")
+    def test_post_logs_in_again_when_session_expired(self, target, **kwargs):
+        outbox = kwargs["mock"].post(
+            "https://one.example.com/actors/test_user_one/outbox",
+            [
+                {
+                    "status_code": 302,
+                    "headers": {"Location": "https://one.example.com/sessions"},
+                },
+                {"status_code": 200},
+            ],
+        )
+        kwargs["mock"].get("https://one.example.com/sessions", text="login")
+        target._session_cache = mock.Mock()
+        target._session_cache.restore.return_value = False
+        target._login = mock.Mock()
+        target._get_csrf_token = mock.Mock(side_effect=["stale", "fresh"])
+
+        target.post("test_message")
+
+        assert target._login.call_count == 2
+        target._session_cache.clear.assert_called_once()
+        assert outbox.call_count == 2
+        assert outbox.last_request.text.endswith("authenticity_token=fresh")
+
+    @requests_mock.Mocker(kw="mock")
+    def test_post_redirected_to_login(self, target, **kwargs):
+        outbox = kwargs["mock"].post(
+            "https://one.example.com/actors/test_user_one/outbox",
+            status_code=302,
+            headers={"Location": "/sessions"},
+        )
+        kwargs["mock"].get("https://one.example.com/sessions", text="login")
+        target._session_cache = mock.Mock()
+        target._session_cache.restore.return_value = False
+        target._login = mock.Mock()
+        target._get_csrf_token = mock.Mock(return_value="token")
+
+        with pytest.raises(KtistecHandlerException) as e:
+            target.post("test_message")
+
+        assert str(e.value) == "Redirected to https://one.example.com/sessions."
+        assert outbox.call_count == 2
+
+    def test_ensure_login_drops_csrf_token(self, target):
+        target._session_cache = mock.Mock()
+        target._session_cache.restore.return_value = False
+        target._login = mock.Mock()
+        target._csrf_token = "stale"
+
+        target._ensure_login()
+
+        assert target._csrf_token is None
+
+    @requests_mock.Mocker(kw="mock")
+    def test_post_timeout_names_phase(self, target, **kwargs):
+        kwargs["mock"].post(
+            "https://one.example.com/actors/test_user_one/outbox",
+            exc=requests.ReadTimeout,
+        )
+        target._ensure_login = mock.Mock()
+        target._get_csrf_token = mock.Mock(return_value="token")
+
+        with pytest.raises(KtistecTimeoutException) as e:
+            target.post("test_message")
+
+        assert str(e.value) == "Timed out during post."
+
+    def test_post_deadline_exceeded(self, target):
+        target._profile = replace(
+            target._profile, timeouts=TimeoutConfig(deadline=0)
+        )
+        target._session_cache = mock.Mock()
+        target._session_cache.restore.return_value = False
+
+        with pytest.raises(KtistecTimeoutException) as e:
+            target.post("test_message")
+
+        assert str(e.value) == "Timed out during login csrf."
+
+    def test_timeout_uses_remaining_deadline(self, target):
+        target._local.deadline = time.monotonic() + 2
+
+        connect, read = target._timeout()
+
+        assert connect == 5.0 or connect <= 2
+        assert 1 < read <= 2
+
+    def test_is_timeout(self):
+        assert is_timeout(requests.ConnectTimeout())
+        assert is_timeout(
+            requests.ConnectionError(ReadTimeoutError(None, "/", "timed out"))
+        )
+        assert is_timeout(
+            requests.ConnectionError(
+                MaxRetryError(None, "/", ReadTimeoutError(None, "/", "x"))
+            )
+        )
+        assert not is_timeout(requests.ConnectionError())
+
+    @pytest.fixture
+    def lean_target(self, home, profile_config):
+        return KtistecHandler(
+            ctx=click.Context(command=click.Command("test")),
+            profile=replace(profile_config, http=HttpConfig(lean=True)),
+        )
+
+    @requests_mock.Mocker(kw="mock")
+    def test_lean_post_skips_redirect(
+        self, lean_target, sessions_response_body, **kwargs
+    ):
+        kwargs["mock"].get(
+            "https://one.example.com/",
+            text=sessions_response_body,
+            headers={"Content-Length": "100000"},
+        )
+        outbox = kwargs["mock"].post(
+            "https://one.example.com/actors/test_user_one/outbox",
+            status_code=302,
+            headers={"Location": "/"},
+        )
+        lean_target._ensure_login = mock.Mock()
+
+        lean_target.post("one")
+        lean_target.post("two")
+
+        assert outbox.call_count == 2
+        # the home page was fetched once for the token, never as a redirect
+        assert [r.method for r in kwargs["mock"].request_history] == [
+            "GET",
+            "POST",
+            "POST",
+        ]
+        assert lean_target.bytes_saved == 3 * 100000 - len(
+            sessions_response_body
+        )
+
+    @requests_mock.Mocker(kw="mock")
+    def test_lean_post_redirected_to_login(self, lean_target, **kwargs):
+        kwargs["mock"].post(
+            "https://one.example.com/actors/test_user_one/outbox",
+            status_code=302,
+            headers={"Location": "/sessions"},
+        )
+        lean_target._ensure_login = mock.Mock()
+        lean_target._get_csrf_token = mock.Mock(return_value="token")
+
+        with pytest.raises(KtistecHandlerException) as e:
+            lean_target.post("test_message")
+
+        assert str(e.value) == "Redirected to https://one.example.com/sessions."
+
+    def test_post_releases_limiter_on_failure(self, target):
+        target._post = mock.Mock(side_effect=requests.ConnectionError())
+        target.limiter = RateLimiter(RateLimitConfig(max_in_flight=8))
+
+        with pytest.raises(requests.ConnectionError):
+            target.post("test_message")
+
+        assert target.limiter.stats().in_flight == 0
+        assert target.limiter.window == 4
+
+    def test_is_overload(self):
+        def http_error(status_code):
+            res = Response()
+            res.status_code = status_code
+            return requests.HTTPError(response=res)
+
+        assert is_overload(http_error(503))
+        assert is_overload(http_error(429))
+        assert not is_overload(http_error(403))
+        assert is_overload(requests.Timeout())
+        assert not is_overload(ValueError())
@@ -0,0 +1,128 @@
+import sqlite3
+from unittest.mock import Mock, patch
+
+import pytest
+
+from src.kt.ledger import MESSAGE_WINDOW, Ledger, ledger_key, part_key
+from src.kt.profile import ProfileConfig
+from src.kt.search import SearchIndex
+from src.kt.store import connect, store_path
+
+
+class TestLedger:
+    @pytest.fixture
+    def profile(self):
+        return ProfileConfig(
+            server_url="https://one.example.com",
+            user_name="test_user",
+            password="test_passwd",
+        )
+
+    @pytest.fixture
+    def now(self):
+        return [1000.0]
+
+    @pytest.fixture
+    def target(self, tmp_path, profile, now):
+        with patch("os.path.expanduser", return_value=str(tmp_path)):
+            yield Ledger(profile, clock=lambda: now[0])
+
+    def test_post(self, target):
+        handler = Mock()
+
+        assert target.post(handler, "test") is True
+        assert target.post(handler, "test") is False
+        assert target.post(handler, "other") is True
+        assert target.post(handler, "test", force=True) is True
+
+        assert [c.args for c in handler.post.call_args_list] == [
+            ("test",),
+            ("other",),
+            ("test",),
+        ]
+
+    def test_post_indexes_message(self, target, profile, tmp_path):
+        target.post(Mock(), 'see <a href="https://example.com">example</a>')
+
+        with patch("os.path.expanduser", return_value=str(tmp_path)):
+            hits = SearchIndex(profile).search("example")
+        assert [h.snippet for h in hits] == ["see [example]"]
+
+    def test_one_connection(self, target):
+        with patch("src.kt.ledger.connect", wraps=connect) as m:
+            for i in range(3):
+                target.post(Mock(), f"message {i}")
+
+        m.assert_called_once()
+
+    def test_post_failure_not_recorded(self, target):
+        handler = Mock()
+        handler.post.side_effect = [Exception("server error"), None]
+
+        with pytest.raises(Exception):
+            target.post(handler, "test")
+
+        assert target.delivered("test") is False
+        assert target.post(handler, "test") is True
+
+    def test_message_window(self, target, now):
+        target.record("test")
+        now[0] += MESSAGE_WINDOW - 1
+        assert target.delivered("test") is True
+
+        now[0] += 2
+        assert target.delivered("test") is False
+
+    def test_idempotency_key(self, target, now):
+        target.record("test", "k1")
+
+        assert target.delivered("edited test", "k1") is True
+        assert target.delivered("test") is False
+        assert target.delivered("test", "k2") is False
+
+        now[0] += MESSAGE_WINDOW * 365
+        assert target.delivered("test", "k1") is True
+
+    def test_idempotency_key_by_message(self, target, now):
+        target.record("test", "k1", by_message=True)
+
+        assert target.delivered("test", "k1") is True
+        assert target.delivered("test") is True
+
+        now[0] += MESSAGE_WINDOW + 1
+        assert target.delivered("test", "k1") is True
+        assert target.delivered("test") is False
+
+    def test_separate_accounts(self, target, tmp_path, now):
+        target.record("test")
+        other = ProfileConfig(
+            server_url="https://two.example.com",
+            user_name="test_user",
+            password="test_passwd",
+        )
+        with patch("os.path.expanduser", return_value=str(tmp_path)):
+            assert (
+                Ledger(other, clock=lambda: now[0]).delivered("test") is False
+            )
+
+    def test_unavailable_ledger(self, target, tmp_path, profile):
+        with patch("os.path.expanduser", return_value=str(tmp_path)):
+            path = store_path(profile)
+        target.record("test")
+        conn = sqlite3.connect(path)
+        conn.execute("DROP TABLE ledger")
+        conn.execute("CREATE VIEW ledger AS SELECT 1 AS x")
+        conn.close()
+
+        handler = Mock()
+        assert target.post(handler, "test") is True
+        handler.post.assert_called_once_with("test")
+
+    def test_ledger_key(self):
+        assert ledger_key("test") != ledger_key("test", "test")
+        assert len(ledger_key("x" * 100000)) == 32
+
+    def test_part_key(self):
+        assert part_key(None, 1) is None
+        assert part_key("k", 0) == "k"
+        assert part_key("k", 2) == "k#2"
@@ -1,3 +1,5 @@
+from unittest.mock import Mock
+
 import pytest
 
 from src.kt.message_builder import MessageBuilder
@@ -31,6 +33,18 @@ class TestMessageBuilder:
             "link message\nhttp://one.example.com\nhttp://two.example.com",
             'link message\n<a href="http://one.example.com">http://one.example.com</a>\n<a href="http://two.example.com">http://two.example.com</a>',
         ),
+        "link message repeated": (
+            "http://example.com and http://example.com",
+            '<a href="http://example.com">http://example.com</a> and <a href="http://example.com">http://example.com</a>',
+        ),
+        "link message substring url": (
+            "http://example.com/foo http://example.com",
+            '<a href="http://example.com/foo">http://example.com/foo</a> <a href="http://example.com">http://example.com</a>',
+        ),
+        "link message existing anchor": (
+            '<a href="http://example.com">http://example.com</a> http://example.com',
+            '<a href="http://example.com">http://example.com</a> <a href="http://example.com">http://example.com</a>',
+        ),
     }
 
     @pytest.mark.parametrize(
@@ -41,3 +55,42 @@ class TestMessageBuilder:
     def test_message_build(self, message, expected):
         m = MessageBuilder(message)
         assert m.build() == expected
+
+    def test_message_build_many_links(self):
+        message = " ".join(f"http://{i}.example.com" for i in range(500))
+        res = MessageBuilder(message).build()
+
+        assert res.count("<a href=") == 500
+        assert '<a href="http://499.example.com">' in res
+        assert '<a href="<a' not in res
+
+    def test_message_build_mentions(self):
+        resolver = Mock()
+        resolver.resolve.return_value = {
+            "alice@one.example.com": "https://one.example.com/actors/alice"
+        }
+        message = (
+            "hi @alice@one.example.com and @bob@two.example.com, "
+            "mail alice@one.example.com "
+            '<a href="http://x.example.com">@alice@one.example.com</a>'
+        )
+        res = MessageBuilder(message, resolver).build()
+
+        resolver.resolve.assert_called_once_with(
+            {"alice@one.example.com", "bob@two.example.com"}, None, False
+        )
+        assert res == (
+            'hi <a href="https://one.example.com/actors/alice" class="mention">'
+            "@alice@one.example.com</a> and @bob@two.example.com, "
+            "mail alice@one.example.com "
+            '<a href="http://x.example.com">@alice@one.example.com</a>'
+        )
+
+    def test_message_build_without_mentions(self):
+        resolver = Mock()
+        res = MessageBuilder(
+            "http://example.com/@alice@one.example.com", resolver
+        ).build()
+
+        resolver.resolve.assert_not_called()
+        assert res.count("<a href=") == 1
@@ -1,29 +1,47 @@
 import io
 import os
-from unittest.mock import Mock, mock_open, patch
+from unittest.mock import Mock, patch
 
 import click
 import pytest
 
 from src.kt.profile import (
+    ContentConfig,
+    HttpConfig,
     Profile,
     ProfileConfig,
     ProfileException,
     ProfileNotFoundException,
+    RateLimitConfig,
+    TimeoutConfig,
+    _ProfileSnapshot,
+    _snapshots,
 )
 
 
 class TestProfile:
+    @pytest.fixture(autouse=True)
+    def clear_snapshots(self):
+        _snapshots.clear()
+        yield
+        _snapshots.clear()
+
     @pytest.fixture
     def dummy_profile(self):
         return open(
             f"{os.getcwd()}/tests/resources/profile/dummy_profile", "rb"
         ).read()
 
+    @pytest.fixture
+    def dummy_legacy_profile(self):
+        return open(
+            f"{os.getcwd()}/tests/resources/profile/dummy_legacy_profile", "rb"
+        ).read()
+
     @pytest.fixture
     def dummy_profile_configs(self):
         return {
-            "foo:default": ProfileConfig(
+            "foo": ProfileConfig(
                 server_url="https://one.example.com",
                 user_name="test_user_one",
                 password="test_passwd_one",
@@ -35,116 +53,230 @@ class TestProfile:
             ),
         }
 
-    @patch("os.path.expanduser")
-    def test_loads_success(
-        self, mock_expanduser, dummy_profile, dummy_profile_configs
+    @pytest.fixture
+    def dummy_snapshot(self, dummy_profile_configs):
+        return _ProfileSnapshot(
+            mtime_ns=0,
+            size=0,
+            profiles=dummy_profile_configs,
+            default="foo",
+        )
+
+    @pytest.fixture
+    def home(self, tmp_path):
+        with patch("os.path.expanduser", return_value=str(tmp_path)):
+            yield tmp_path
+
+    def write_profile(self, home, data):
+        os.makedirs(home / ".kt", exist_ok=True)
+        (home / ".kt" / "profile").write_bytes(data)
+
+    def test_loads_success(self, home, dummy_profile, dummy_profile_configs):
+        self.write_profile(home, dummy_profile)
+        target = Profile()
+
+        assert target.loads() == dummy_profile_configs
+        assert target.default_name() == "foo"
+
+    def test_loads_legacy_default(
+        self, home, dummy_legacy_profile, dummy_profile_configs
+    ):
+        self.write_profile(home, dummy_legacy_profile)
+        target = Profile()
+
+        assert target.loads() == dummy_profile_configs
+        assert target.default_name() == "foo"
+        assert target.load() == dummy_profile_configs["foo"]
+
+    def test_loads_cached_snapshot(self, home, dummy_profile):
+        self.write_profile(home, dummy_profile)
+        target = Profile()
+        target.loads()
+
+        with patch("builtins.open") as mock_io:
+            Profile().loads()
+            mock_io.assert_not_called()
+
+    def test_loads_invalidated_on_change(
+        self, home, dummy_profile, dummy_profile_configs
     ):
-        mock_io = mock_open(read_data=dummy_profile)
-        mock_expanduser.return_value = "/home/test_user"
-        with patch("builtins.open", mock_io):
-            target = Profile()
-            res = target.loads()
-            mock_io.assert_called_once_with("/home/test_user/.kt/profile", "rb")
-            assert res == dummy_profile_configs
-
-    @patch("os.path.expanduser")
-    def test_loads_file_not_found(
-        self,
-        mock_expanduser,
+        self.write_profile(home, dummy_profile)
+        target = Profile()
+        target.loads()
+
+        self.write_profile(
+            home, dummy_profile.replace(b"test_user_two", b"test_user_2")
+        )
+
+        assert target.loads()["bar"].user_name == "test_user_2"
+
+    def test_loads_http_config(self, home, dummy_profile):
+        self.write_profile(
+            home,
+            dummy_profile
+            + b"\n[profiles.bar.http]\nretries = 5\nstatus_forcelist = [503]\n",
+        )
+        target = Profile()
+
+        assert target.load("bar").http == HttpConfig(
+            retries=5, status_forcelist=(503,)
+        )
+        assert target.load("foo").http == HttpConfig()
+
+    def test_loads_rate_limit_config(self, home, dummy_profile):
+        self.write_profile(
+            home,
+            dummy_profile
+            + b"\n[profiles.bar.rate_limit]\nrate = 2.5\nmax_in_flight = 2\n",
+        )
+        target = Profile()
+
+        assert target.load("bar").rate_limit == RateLimitConfig(
+            rate=2.5, max_in_flight=2
+        )
+        assert target.load("foo").rate_limit == RateLimitConfig()
+
+    def test_loads_content_config(self, home, dummy_profile):
+        self.write_profile(
+            home,
+            dummy_profile + b"\n[profiles.bar.content]\nmax_length = 500\n",
+        )
+        target = Profile()
+
+        assert target.load("bar").content == ContentConfig(max_length=500)
+        assert target.load("foo").content == ContentConfig()
+
+    def test_loads_timeout_config(self, home, dummy_profile):
+        self.write_profile(
+            home, dummy_profile + b"\n[profiles.bar.timeouts]\ndeadline = 10\n"
+        )
+        target = Profile()
+
+        assert target.load("bar").timeouts == TimeoutConfig(deadline=10)
+        assert target.load("foo").timeouts == TimeoutConfig()
+
+    def test_loads_bad_profile_config(self, home, dummy_profile):
+        self.write_profile(
+            home, dummy_profile + b"\n[profiles.bar.http]\nfoo = 1\n"
+        )
+        target = Profile()
+
+        with pytest.raises(ProfileException) as e:
+            target.loads()
+        assert str(e.value) == "Bad profile config `bar`."
+
+    def test_loads_file_not_found(self, home):
+        target = Profile()
+        with pytest.raises(ProfileNotFoundException) as e:
+            target.loads()
+        assert str(e.value) == "Config file not found."
+
+    def test_loads_bad_toml_file(self, home):
+        self.write_profile(home, b"foobar")
+        target = Profile()
+        with pytest.raises(ProfileException) as e:
+            target.loads()
+        assert str(e.value) == "Bad toml file."
+
+    def test_load_specify_profile_name_success(
+        self, dummy_snapshot, dummy_profile_configs
     ):
-        mock_io = mock_open()
-        mock_io.side_effect = FileNotFoundError
-        mock_expanduser.return_value = "/home/test_user"
-        with patch("builtins.open", mock_io):
-            target = Profile()
-            with pytest.raises(ProfileNotFoundException) as e:
-                target.loads()
-                assert str(e) == "Config file not found."
-
-    @patch("os.path.expanduser")
-    def test_loads_bad_toml_file(self, mock_expanduser):
-        mock_io = mock_open(read_data=b"foobar")
-        mock_expanduser.return_value = "/home/test_user"
-        with patch("builtins.open", mock_io):
-            target = Profile()
-            with pytest.raises(ProfileException) as e:
-                target.loads()
-                assert str(e) == "Bad toml file."
-
-    def test_load_specify_profile_name_success(self, dummy_profile_configs):
-        mock_loads = Mock()
-        mock_loads.return_value = dummy_profile_configs
-        with patch("src.kt.profile.Profile.loads", mock_loads):
-            target = Profile()
-            res = target.load("bar")
-            assert res == dummy_profile_configs["bar"]
+        target = Profile()
+        target._read = Mock(return_value=dummy_snapshot)
+        res = target.load("bar")
+        assert res == dummy_profile_configs["bar"]
 
     def test_load_specify_default_profile_name_success(
-        self, dummy_profile_configs
+        self, dummy_snapshot, dummy_profile_configs
     ):
-        mock_loads = Mock()
-        mock_loads.return_value = dummy_profile_configs
-        with patch("src.kt.profile.Profile.loads", mock_loads):
-            target = Profile()
-            res = target.load("foo")
-            assert res == dummy_profile_configs["foo:default"]
-
-    def test_load_specify_profile_name_not_found(self, dummy_profile_configs):
-        mock_loads = Mock()
-        mock_loads.return_value = dummy_profile_configs
-        with patch("src.kt.profile.Profile.loads", mock_loads):
-            target = Profile()
-            with pytest.raises(ProfileException) as e:
-                target.load("baz")
-                assert str(e) == "Specified profile name not found in config."
-
-    def test_load_default_profile_success(self, dummy_profile_configs):
-        mock_loads = Mock()
-        mock_loads.return_value = dummy_profile_configs
-        with patch("src.kt.profile.Profile.loads", mock_loads):
-            target = Profile()
-            res = target.load()
-            assert res == dummy_profile_configs["foo:default"]
+        target = Profile()
+        target._read = Mock(return_value=dummy_snapshot)
+        res = target.load("foo")
+        assert res == dummy_profile_configs["foo"]
+
+    def test_load_specify_profile_name_not_found(self, dummy_snapshot):
+        target = Profile()
+        target._read = Mock(return_value=dummy_snapshot)
+        with pytest.raises(ProfileException) as e:
+            target.load("baz")
+        assert str(e.value) == "Specified profile name not found in config."
+
+    def test_load_default_profile_success(
+        self, dummy_snapshot, dummy_profile_configs
+    ):
+        target = Profile()
+        target._read = Mock(return_value=dummy_snapshot)
+        res = target.load()
+        assert res == dummy_profile_configs["foo"]
 
     def test_load_default_profile_not_found(self, dummy_profile_configs):
-        mock_loads = Mock()
-        mock_loads.return_value = dummy_profile_configs
-        del dummy_profile_configs["foo:default"]
-        with patch("src.kt.profile.Profile.loads", mock_loads):
-            target = Profile()
-            with pytest.raises(ProfileException) as e:
-                target.load()
-                assert (
-                    str(e)
-                    == "Default profile config not found. You can configure profile by running `ktctl profile add`"
-                )
-
-    @patch("os.makedirs")
-    @patch("os.path.expanduser")
-    def test_save_toml(
-        self,
-        mock_expanduser,
-        mock_makedirs,
-        dummy_profile,
-        dummy_profile_configs,
+        target = Profile()
+        target._read = Mock(
+            return_value=_ProfileSnapshot(0, 0, dummy_profile_configs, None)
+        )
+        with pytest.raises(ProfileException) as e:
+            target.load()
+        assert (
+            str(e.value)
+            == "Default profile config not found. You can configure profile by running `ktctl profile`"
+        )
+
+    def test_load_many(self, dummy_snapshot, dummy_profile_configs):
+        target = Profile()
+        target._read = Mock(return_value=dummy_snapshot)
+
+        assert target.load_many(["bar", "foo"]) == {
+            "bar": dummy_profile_configs["bar"],
+            "foo": dummy_profile_configs["foo"],
+        }
+
+    def test_load_many_not_found(self, dummy_snapshot):
+        target = Profile()
+        target._read = Mock(return_value=dummy_snapshot)
+
+        with pytest.raises(ProfileException) as e:
+            target.load_many(["foo", "baz"])
+        assert (
+            str(e.value) == "Specified profile name 'baz' not found in config."
+        )
+
+    def test_save_toml(self, home, dummy_profile, dummy_profile_configs):
+        target = Profile()
+        target._save_toml(dummy_profile_configs, "foo")
+
+        assert (home / ".kt" / "profile").read_bytes() == dummy_profile
+
+    def test_save_toml_http_config(self, home, dummy_profile_configs):
+        dummy_profile_configs["bar"] = ProfileConfig(
+            server_url="https://two.example.com",
+            user_name="test_user_two",
+            password="test_passwd_two",
+            http=HttpConfig(retries=5, status_forcelist=(503,)),
+        )
+        target = Profile()
+        target._save_toml(dummy_profile_configs, "foo")
+
+        assert target.loads() == dummy_profile_configs
+        assert (
+            b"[profiles.foo.http]"
+            not in (home / ".kt" / "profile").read_bytes()
+        )
+
+    def test_save_toml_migrates_legacy_file(
+        self, home, dummy_profile, dummy_legacy_profile
     ):
-        mock_io = mock_open()
-        mock_expanduser.return_value = "/home/test_user"
-        with patch("builtins.open", mock_io):
-            target = Profile()
-            target._save_toml(dummy_profile_configs)
-            mock_makedirs.assert_called_once_with(
-                "/home/test_user/.kt", exist_ok=True
-            )
-            mock_io.assert_called_once_with("/home/test_user/.kt/profile", "w")
-            mock_io.__call__().write.assert_called_once_with(
-                dummy_profile.decode()
-            )
+        self.write_profile(home, dummy_legacy_profile)
+        target = Profile()
+        snapshot = target._read()
+        target._save_toml(snapshot.profiles, snapshot.default)
+
+        assert (home / ".kt" / "profile").read_bytes() == dummy_profile
 
-    def test_save_success(self, dummy_profile_configs, monkeypatch):
+    def test_save_success(
+        self, dummy_snapshot, dummy_profile_configs, monkeypatch
+    ):
         target = Profile()
-        target.loads = Mock()
-        target.loads.return_value = dummy_profile_configs
+        target._read = Mock(return_value=dummy_snapshot)
         target._save_toml = Mock()
 
         dummy_profile_configs["test_profile_name"] = ProfileConfig(
@@ -162,13 +294,12 @@ class TestProfile:
         with patch("getpass.getpass", side_effect=["test_passwd"]):
             target.save(click.Context(command=click.Command("test")))
 
-        target.loads.assert_called()
-        target._save_toml.assert_called_with(dummy_profile_configs)
+        target._read.assert_called()
+        target._save_toml.assert_called_with(dummy_profile_configs, "foo")
 
     def test_save_success_file_not_found(self, monkeypatch):
         target = Profile()
-        target.loads = Mock()
-        target.loads.side_effect = ProfileNotFoundException
+        target._read = Mock(side_effect=ProfileNotFoundException)
         target._save_toml = Mock()
 
         profile_configs = {}
@@ -187,15 +318,14 @@ class TestProfile:
         with patch("getpass.getpass", side_effect=["test_passwd"]):
             target.save(click.Context(command=click.Command("test")))
 
-        target.loads.assert_called()
-        target._save_toml.assert_called_with(profile_configs)
+        target._read.assert_called()
+        target._save_toml.assert_called_with(profile_configs, None)
 
     def test_save_success_on_second_server_url_input(
-        self, dummy_profile_configs, monkeypatch
+        self, dummy_snapshot, dummy_profile_configs, monkeypatch
     ):
         target = Profile()
-        target.loads = Mock()
-        target.loads.return_value = dummy_profile_configs
+        target._read = Mock(return_value=dummy_snapshot)
         target._save_toml = Mock()
 
         dummy_profile_configs["test_profile_name"] = ProfileConfig(
@@ -213,15 +343,14 @@ class TestProfile:
         with patch("getpass.getpass", side_effect=["test_passwd"]):
             target.save(click.Context(command=click.Command("test")))
 
-        target.loads.assert_called()
-        target._save_toml.assert_called_with(dummy_profile_configs)
+        target._read.assert_called()
+        target._save_toml.assert_called_with(dummy_profile_configs, "foo")
 
     def test_save_validation_error_server_url(
-        self, dummy_profile_configs, monkeypatch, capsys
+        self, dummy_snapshot, dummy_profile_configs, monkeypatch, capsys
     ):
         target = Profile()
-        target.loads = Mock()
-        target.loads.return_value = dummy_profile_configs
+        target._read = Mock(return_value=dummy_snapshot)
         target._save_toml = Mock()
 
         dummy_profile_configs["test_profile_name"] = ProfileConfig(
@@ -254,10 +383,11 @@ class TestProfile:
 
         target._save_toml.assert_not_called()
 
-    def test_remove_success(self, dummy_profile_configs, monkeypatch, capsys):
+    def test_remove_success(
+        self, dummy_snapshot, dummy_profile_configs, monkeypatch, capsys
+    ):
         target = Profile()
-        target.loads = Mock()
-        target.loads.return_value = dummy_profile_configs
+        target._read = Mock(return_value=dummy_snapshot)
         target._save_toml = Mock()
 
         monkeypatch.setattr(
@@ -270,7 +400,7 @@ class TestProfile:
         except click.exceptions.Abort:
             pass
 
-        target.loads.assert_called()
+        target._read.assert_called()
 
         captured = capsys.readouterr()
 
@@ -281,20 +411,20 @@ class TestProfile:
 
         target._save_toml.assert_called_once_with(
             {
-                "foo:default": ProfileConfig(
+                "foo": ProfileConfig(
                     server_url="https://one.example.com",
                     user_name="test_user_one",
                     password="test_passwd_one",
                 ),
-            }
+            },
+            "foo",
         )
 
     def test_remove_default_success(
-        self, dummy_profile_configs, monkeypatch, capsys
+        self, dummy_snapshot, dummy_profile_configs, monkeypatch, capsys
     ):
         target = Profile()
-        target.loads = Mock()
-        target.loads.return_value = dummy_profile_configs
+        target._read = Mock(return_value=dummy_snapshot)
         target._save_toml = Mock()
 
         monkeypatch.setattr(
@@ -307,7 +437,7 @@ class TestProfile:
         except click.exceptions.Abort:
             pass
 
-        target.loads.assert_called()
+        target._read.assert_called()
 
         captured = capsys.readouterr()
 
@@ -323,13 +453,15 @@ class TestProfile:
                     user_name="test_user_two",
                     password="test_passwd_two",
                 ),
-            }
+            },
+            None,
         )
 
-    def test_remove_cancel(self, dummy_profile_configs, monkeypatch, capsys):
+    def test_remove_cancel(
+        self, dummy_snapshot, dummy_profile_configs, monkeypatch, capsys
+    ):
         target = Profile()
-        target.loads = Mock()
-        target.loads.return_value = dummy_profile_configs
+        target._read = Mock(return_value=dummy_snapshot)
         target._save_toml = Mock()
 
         monkeypatch.setattr(
@@ -342,7 +474,7 @@ class TestProfile:
         except click.exceptions.Abort:
             pass
 
-        target.loads.assert_called()
+        target._read.assert_called()
 
         captured = capsys.readouterr()
 
@@ -353,10 +485,11 @@ class TestProfile:
 
         target._save_toml.assert_not_called()
 
-    def test_remove_not_found(self, dummy_profile_configs, monkeypatch, capsys):
+    def test_remove_not_found(
+        self, dummy_snapshot, dummy_profile_configs, monkeypatch, capsys
+    ):
         target = Profile()
-        target.loads = Mock()
-        target.loads.return_value = dummy_profile_configs
+        target._read = Mock(return_value=dummy_snapshot)
         target._save_toml = Mock()
 
         monkeypatch.setattr(
@@ -372,10 +505,9 @@ class TestProfile:
 
             assert str(e) == "Specified profile name not found in config."
 
-    def test_list_profile(self, dummy_profile_configs, capsys):
+    def test_list_profile(self, dummy_snapshot, dummy_profile_configs, capsys):
         target = Profile()
-        target.loads = Mock()
-        target.loads.return_value = dummy_profile_configs
+        target._read = Mock(return_value=dummy_snapshot)
 
         target.list_profile()
 
@@ -383,18 +515,19 @@ class TestProfile:
 
         assert (
             captured.out
-            == """Profile Name    Server URL               User Name
---------------  -----------------------  -------------
-foo:default     https://one.example.com  test_user_one
+            == """Profile Name    Server URL               User Name      Default
+--------------  -----------------------  -------------  ---------
+foo             https://one.example.com  test_user_one  *
 bar             https://two.example.com  test_user_two
 """
         )
 
-    def test_set_default(self, dummy_profile_configs, capsys, monkeypatch):
+    def test_set_default(
+        self, dummy_snapshot, dummy_profile_configs, capsys, monkeypatch
+    ):
         target = Profile()
-        target.loads = Mock()
+        target._read = Mock(return_value=dummy_snapshot)
         target._save_toml = Mock()
-        target.loads.return_value = dummy_profile_configs
 
         monkeypatch.setattr(
             "sys.stdin",
@@ -409,28 +542,14 @@ bar             https://two.example.com  test_user_two
             == "Profile foo is already set as default.\nDo you want to set profile bar as default? [y/N]: Set profile `bar` as default.\n"
         )
 
-        target._save_toml.assert_called_once_with(
-            {
-                "foo": ProfileConfig(
-                    server_url="https://one.example.com",
-                    user_name="test_user_one",
-                    password="test_passwd_one",
-                ),
-                "bar:default": ProfileConfig(
-                    server_url="https://two.example.com",
-                    user_name="test_user_two",
-                    password="test_passwd_two",
-                ),
-            }
-        )
+        target._save_toml.assert_called_once_with(dummy_profile_configs, "bar")
 
     def test_set_default_already_default(
-        self, dummy_profile_configs, capsys, monkeypatch
+        self, dummy_snapshot, dummy_profile_configs, capsys, monkeypatch
     ):
         target = Profile()
-        target.loads = Mock()
+        target._read = Mock(return_value=dummy_snapshot)
         target._save_toml = Mock()
-        target.loads.return_value = dummy_profile_configs
 
         with pytest.raises(ProfileException) as e:
             target.set_default(
@@ -439,12 +558,11 @@ bar             https://two.example.com  test_user_two
             assert str(e) == "Specified profile name is already set as default."
 
     def test_set_default_no_specified_profile(
-        self, dummy_profile_configs, capsys, monkeypatch
+        self, dummy_snapshot, dummy_profile_configs, capsys, monkeypatch
     ):
         target = Profile()
-        target.loads = Mock()
+        target._read = Mock(return_value=dummy_snapshot)
         target._save_toml = Mock()
-        target.loads.return_value = dummy_profile_configs
 
         with pytest.raises(ProfileException) as e:
             target.set_default(
@@ -452,47 +570,23 @@ bar             https://two.example.com  test_user_two
             )
             assert str(e) == "Specified profile not found."
 
-    def test_set_default_no_default(self):
+    def test_set_default_no_default(self, dummy_profile_configs):
         target = Profile()
-        target.loads = Mock()
+        target._read = Mock(
+            return_value=_ProfileSnapshot(0, 0, dummy_profile_configs, None)
+        )
         target._save_toml = Mock()
-        target.loads.return_value = {
-            "foo": ProfileConfig(
-                server_url="https://one.example.com",
-                user_name="test_user_one",
-                password="test_passwd_one",
-            ),
-            "bar": ProfileConfig(
-                server_url="https://two.example.com",
-                user_name="test_user_two",
-                password="test_passwd_two",
-            ),
-        }
 
         target.set_default(click.Context(command=click.Command("test")), "bar")
-        target._save_toml.assert_called_once_with(
-            {
-                "foo": ProfileConfig(
-                    server_url="https://one.example.com",
-                    user_name="test_user_one",
-                    password="test_passwd_one",
-                ),
-                "bar:default": ProfileConfig(
-                    server_url="https://two.example.com",
-                    user_name="test_user_two",
-                    password="test_passwd_two",
-                ),
-            }
-        )
+        target._save_toml.assert_called_once_with(dummy_profile_configs, "bar")
 
     def test_set_default_no_config(self):
         target = Profile()
-        target.loads = Mock()
+        target._read = Mock(return_value=_ProfileSnapshot(0, 0, {}, None))
         target._save_toml = Mock()
-        target.loads.return_value = {}
 
         with pytest.raises(ProfileException) as e:
             target.set_default(
                 click.Context(command=click.Command("test")), "bar"
             )
-            assert str(e) == "Specified profile not found."
+        assert str(e.value) == "Specified profile not found."
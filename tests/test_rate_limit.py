@@ -0,0 +1,163 @@
+import threading
+
+import pytest
+
+from src.kt.profile import ProfileConfig, RateLimitConfig
+from src.kt.rate_limit import RateLimiter, get_limiter
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestRateLimiter:
+    @pytest.fixture
+    def clock(self):
+        return FakeClock()
+
+    def test_window_decreases_on_overload(self, clock):
+        target = RateLimiter(RateLimitConfig(max_in_flight=8), clock)
+
+        target.acquire()
+        clock.now += 1
+        target.release(1.0, overloaded=True)
+
+        assert target.window == 4
+
+    def test_window_decreases_on_latency(self, clock):
+        target = RateLimiter(
+            RateLimitConfig(max_in_flight=8, latency_target=2.0), clock
+        )
+
+        target.acquire()
+        clock.now += 3
+        target.release(3.0, overloaded=False)
+
+        assert target.window == 4
+
+    def test_window_decreases_once_per_round_trip(self, clock):
+        target = RateLimiter(RateLimitConfig(max_in_flight=8), clock)
+
+        for _ in range(3):
+            target.acquire()
+        clock.now += 1
+        for _ in range(3):
+            target.release(1.0, overloaded=True)
+
+        assert target.window == 4
+
+    def test_window_bounds(self, clock):
+        target = RateLimiter(
+            RateLimitConfig(min_in_flight=2, max_in_flight=4), clock
+        )
+
+        for _ in range(5):
+            target.acquire()
+            clock.now += 2
+            target.release(1.0, overloaded=True)
+        assert target.window == 2
+
+        for _ in range(20):
+            target.acquire()
+            target.release(0.1, overloaded=False)
+        assert target.window == 4
+
+    def test_window_grows_additively(self, clock):
+        target = RateLimiter(RateLimitConfig(max_in_flight=8), clock)
+        target.acquire()
+        clock.now += 1
+        target.release(1.0, overloaded=True)
+
+        # about a window's worth of successes opens one more slot
+        for _ in range(5):
+            target.acquire()
+            target.release(0.1, overloaded=False)
+
+        assert target.window == 5
+
+    def test_acquire_blocks_on_full_window(self, clock):
+        target = RateLimiter(RateLimitConfig(max_in_flight=1), clock)
+        target.acquire()
+
+        acquired = threading.Event()
+
+        def acquire():
+            target.acquire()
+            acquired.set()
+
+        thread = threading.Thread(target=acquire)
+        thread.start()
+        assert not acquired.wait(0.05)
+
+        target.release(0.1, overloaded=False)
+        thread.join(1)
+        assert acquired.is_set()
+
+    def test_token_bucket(self, clock):
+        target = RateLimiter(RateLimitConfig(rate=2.0, burst=2), clock)
+
+        target.acquire()
+        target.acquire()
+        assert target._wait_time() == 0.5
+
+        clock.now += 0.5
+        target._refill(clock.now)
+        assert target._wait_time() is None
+
+    def test_unpaced(self, clock):
+        target = RateLimiter(RateLimitConfig(), clock)
+
+        for _ in range(5):
+            target.acquire()
+            target.release(0.1, overloaded=False)
+
+        assert target._wait_time() is None
+
+    def test_slot(self, clock):
+        target = RateLimiter(RateLimitConfig(max_in_flight=8), clock)
+
+        with pytest.raises(ValueError):
+            with target.slot(lambda e: True):
+                raise ValueError()
+
+        assert target.window == 4
+        assert target.stats().in_flight == 0
+
+    def test_stats(self, clock):
+        target = RateLimiter(RateLimitConfig(), clock)
+
+        for _ in range(5):
+            target.acquire()
+            clock.now += 0.5
+            target.release(0.5, overloaded=False)
+
+        stats = target.stats()
+        assert stats.rate == 2.0
+        assert str(stats) == "Rate: 2.00 posts/s, window 8."
+
+        clock.now += 60
+        assert target.stats().rate == 0.0
+
+    def test_get_limiter_per_server(self):
+        one = ProfileConfig(
+            server_url="https://limiter.example.com",
+            user_name="one",
+            password="test_passwd",
+        )
+        two = ProfileConfig(
+            server_url="https://limiter.example.com",
+            user_name="two",
+            password="test_passwd",
+        )
+        other = ProfileConfig(
+            server_url="https://other.limiter.example.com",
+            user_name="one",
+            password="test_passwd",
+        )
+
+        assert get_limiter(one) is get_limiter(two)
+        assert get_limiter(one) is not get_limiter(other)
@@ -0,0 +1,105 @@
+import sqlite3
+from unittest.mock import patch
+
+import pytest
+
+from src.kt.profile import ProfileConfig
+from src.kt.search import SearchException, SearchIndex, index, to_text
+from src.kt.store import connect, store_path
+from src.kt.timeline import SCHEMA as TIMELINE_SCHEMA
+
+
+def add_post(target, content):
+    conn = target._connection()
+    with conn:
+        index(conn, "post", None, content)
+
+
+class TestSearch:
+    @pytest.fixture
+    def profile(self):
+        return ProfileConfig(
+            server_url="https://one.example.com",
+            user_name="test_user",
+            password="test_passwd",
+        )
+
+    @pytest.fixture
+    def target(self, tmp_path, profile):
+        with patch("os.path.expanduser", return_value=str(tmp_path)):
+            yield SearchIndex(profile)
+
+    def test_search(self, target):
+        add_post(target, "release 1.0 is out")
+        add_post(target, 'see <a href="https://example.com">the notes</a>')
+
+        hits = target.search("release")
+        assert [(h.source, h.ref, h.snippet) for h in hits] == [
+            ("post", None, "[release] 1.0 is out")
+        ]
+        assert target.search("notes")[0].snippet == "see the [notes]"
+        assert target.search("missing") == []
+
+    def test_search_limit(self, target):
+        for i in range(5):
+            add_post(target, f"release {i}")
+
+        assert len(target.search("release", limit=3)) == 3
+
+    def test_search_plain_words_fallback(self, target):
+        add_post(target, "see https://example.com/notes")
+
+        assert len(target.search("https://example.com/notes")) == 1
+
+    def test_search_bad_query(self, target):
+        with patch("src.kt.search._phrases", return_value="AND"):
+            with pytest.raises(SearchException) as e:
+                target.search("AND")
+
+        assert str(e.value) == "Bad search query."
+
+    def test_index_updates_fetched_items(self, target):
+        add_post(target, "first")
+        conn = target._connection()
+        with conn:
+            index(conn, "inbox", "https://one.example.com/1", "old text")
+            index(conn, "inbox", "https://one.example.com/1", "new text")
+
+        assert target.search("old") == []
+        hits = target.search("new")
+        assert [(h.source, h.ref) for h in hits] == [
+            ("inbox", "https://one.example.com/1")
+        ]
+
+    def test_rebuild(self, target, tmp_path, profile):
+        add_post(target, "posted text")
+        with patch("os.path.expanduser", return_value=str(tmp_path)):
+            path = store_path(profile)
+        conn = sqlite3.connect(path)
+        conn.executescript(TIMELINE_SCHEMA)
+        with conn:
+            conn.execute(
+                "INSERT INTO timeline (box, id, content, data, fetched_at) "
+                "VALUES ('outbox', 'https://one.example.com/2', "
+                "'<p>fetched text</p>', '{}', 0)"
+            )
+        conn.close()
+
+        assert target.rebuild() == 2
+        assert sorted(h.ref or "" for h in target.search("text")) == [
+            "",
+            "https://one.example.com/2",
+        ]
+        assert target.rebuild() == 2
+
+    def test_one_connection(self, target):
+        with patch("src.kt.search.connect", wraps=connect) as mock:
+            add_post(target, "release 1.0 is out")
+            target.search("release")
+            target.rebuild()
+            target.close()
+
+        mock.assert_called_once()
+
+    def test_to_text(self):
+        assert to_text("<p>a &amp; b</p>\n<p>c</p>") == "a & b c"
@@ -0,0 +1,62 @@
+import os
+from unittest.mock import patch
+
+import pytest
+from requests import Session
+
+from src.kt.profile import ProfileConfig
+from src.kt.session_cache import SessionCache
+
+
+class TestSessionCache:
+    @pytest.fixture
+    def profile_config(self):
+        return ProfileConfig(
+            server_url="https://one.example.com",
+            user_name="test_user_one",
+            password="test_passwd_one",
+        )
+
+    @pytest.fixture
+    def target(self, profile_config, tmp_path):
+        with patch("os.path.expanduser", return_value=str(tmp_path)):
+            return SessionCache(profile_config)
+
+    def test_restore_not_cached(self, target):
+        assert target.restore(Session()) is False
+
+    def test_save_and_restore(self, target):
+        session = Session()
+        session.cookies.set(
+            "AuthToken", "dummy_token", domain="one.example.com", path="/"
+        )
+        target.save(session)
+
+        restored = Session()
+        assert target.restore(restored) is True
+        assert restored.cookies.get("AuthToken") == "dummy_token"
+        assert os.stat(target._cache_path).st_mode & 0o777 == 0o600
+
+    def test_restore_broken_cache(self, target):
+        os.makedirs(target._cache_dir)
+        with open(target._cache_path, "w") as f:
+            f.write("broken")
+
+        assert target.restore(Session()) is False
+
+    def test_clear(self, target):
+        target.save(Session())
+        target.clear()
+
+        assert not os.path.exists(target._cache_path)
+
+    def test_cache_path_per_account(self, profile_config, tmp_path):
+        with patch("os.path.expanduser", return_value=str(tmp_path)):
+            other = SessionCache(
+                ProfileConfig(
+                    server_url="https://two.example.com",
+                    user_name="test_user_one",
+                    password="test_passwd_one",
+                )
+            )
+            assert SessionCache(profile_config)._cache_path != other._cache_path
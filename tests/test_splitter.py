@@ -0,0 +1,74 @@
+import io
+
+import pytest
+
+from src.kt.message_builder import MessageBuilder
+from src.kt.splitter import cut_point, iter_segments, split_message
+
+
+class TestSplitter:
+    test_cases = {
+        "whitespace": ("one two three", 9, 8),
+        "no whitespace": ("onetwothree", 5, None),
+        "before tag": ('one <b class="x">two</b>', 12, 4),
+        "before anchor": ('one <a href="http://example.com">x</a>', 30, 4),
+        "after anchor": ('<a href="x">x</a> two three', 20, 18),
+        "only anchor": ('<a href="http://example.com">x</a>', 20, None),
+    }
+
+    @pytest.mark.parametrize(
+        "text,size,expected",
+        list(test_cases.values()),
+        ids=test_cases.keys(),
+    )
+    def test_cut_point(self, text, size, expected):
+        assert cut_point(text, size) == expected
+
+    def test_iter_segments(self):
+        text = " ".join(f"http://{i}.example.com" for i in range(100))
+        segments = list(iter_segments(io.StringIO(text), 64))
+
+        assert "".join(segments) == text
+        assert all(len(s) <= 64 for s in segments)
+        # no URL is split across segments
+        assert all(
+            s.endswith(" ") or s == segments[-1] for s in segments
+        ), segments
+
+    def test_iter_segments_hard_cut(self):
+        segments = list(iter_segments(io.StringIO("x" * 10), 4))
+
+        assert segments == ["xxxx", "xxxx", "xx"]
+
+    def test_split_message(self):
+        text = "\n".join(
+            f"line {i} http://{i}.example.com/report" for i in range(200)
+        )
+        posts = list(split_message(io.StringIO(text), 500))
+
+        assert len(posts) > 1
+        assert all(len(f"<div>{p}</div>") <= 500 for p in posts)
+        assert "".join(posts) == MessageBuilder(text).build()
+
+    def test_split_message_short(self):
+        posts = list(split_message(io.StringIO("foo http://example.com"), 500))
+
+        assert posts == [
+            'foo <a href="http://example.com">http://example.com</a>'
+        ]
+
+    def test_split_message_empty(self):
+        assert list(split_message(io.StringIO(""), 500)) == []
+
+    def test_split_message_reads_lazily(self):
+        class Source(io.StringIO):
+            reads = 0
+
+            def read(self, size=-1):
+                Source.reads += 1
+                return super().read(size)
+
+        posts = split_message(Source("word " * 10000), 100)
+        next(posts)
+
+        assert Source.reads < 5
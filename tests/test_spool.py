@@ -0,0 +1,193 @@
+from unittest.mock import Mock, patch
+
+import click
+import pytest
+
+from src.kt.profile import ProfileConfig
+from src.kt.spool import DrainResult, Spool, spool_key
+
+
+class TestSpool:
+    @pytest.fixture
+    def target(self, tmp_path):
+        with patch("os.path.expanduser", return_value=str(tmp_path)):
+            yield Spool()
+
+    @pytest.fixture
+    def ctx(self):
+        return click.Context(command=click.Command("test"))
+
+    @pytest.fixture
+    def profile_load(self):
+        def load(name):
+            return ProfileConfig(
+                server_url=f"https://{name}.example.com",
+                user_name="test_user",
+                password="test_passwd",
+            )
+
+        with patch("src.kt.spool.Profile.load", side_effect=load) as m:
+            yield m
+
+    def test_put(self, target):
+        target.put("foo", "one")
+        target.put("bar", "two")
+
+        entries = target.entries()
+        assert [(e.profile_name, e.message) for e in entries] == [
+            ("foo", "one"),
+            ("bar", "two"),
+        ]
+        assert entries[0].attempts == 0
+
+    def test_drain(self, target, ctx, profile_load):
+        target.put("foo", "one")
+        target.put("bar", "two")
+        target.put("foo", "three")
+
+        handlers = {}
+
+        def handler(ctx, profile):
+            handlers[profile.server_url] = Mock()
+            return handlers[profile.server_url]
+
+        with patch("src.kt.ktistec_handler.KtistecHandler", handler):
+            res = target.drain(ctx)
+
+        assert res == DrainResult(delivered=3, failed=0)
+        assert target.entries() == []
+        foo = handlers["https://foo.example.com"]
+        assert [c.args for c in foo.post.call_args_list] == [
+            ("one",),
+            ("three",),
+        ]
+
+    def test_drain_failure_keeps_entries(self, target, ctx, profile_load):
+        target.put("foo", "one")
+        target.put("foo", "two")
+        target.put("bar", "three")
+
+        def handler(ctx, profile):
+            h = Mock()
+            if profile.server_url == "https://foo.example.com":
+                h.post.side_effect = Exception("server error")
+            return h
+
+        with patch("src.kt.ktistec_handler.KtistecHandler", handler):
+            res = target.drain(ctx)
+
+        assert res == DrainResult(delivered=1, failed=1)
+        entries = target.entries()
+        assert [(e.message, e.attempts, e.last_error) for e in entries] == [
+            ("one", 1, "server error"),
+            ("two", 0, None),
+        ]
+
+    def test_drain_bounded_attempts(self, target, ctx, profile_load):
+        target.put("foo", "one")
+
+        handler = Mock()
+        handler.return_value.post.side_effect = Exception("server error")
+
+        with patch("src.kt.ktistec_handler.KtistecHandler", handler):
+            for _ in range(3):
+                res = target.drain(ctx, max_attempts=2)
+
+        assert handler.return_value.post.call_count == 2
+        assert target.entries()[0].attempts == 2
+        assert [e.last_error for e in res.stuck] == ["server error"]
+
+    def test_drain_stuck_entry_blocks_profile(self, target, ctx, profile_load):
+        target.put("foo", "one")
+        target.put("foo", "two")
+        target.put("bar", "three")
+
+        failing = Mock()
+        failing.return_value.post.side_effect = Exception("server error")
+        with patch("src.kt.ktistec_handler.KtistecHandler", failing):
+            target.drain(ctx, max_attempts=1)
+
+        working = Mock()
+        with patch("src.kt.ktistec_handler.KtistecHandler", working):
+            res = target.drain(ctx, max_attempts=1)
+
+            # later entries of a stuck profile wait behind it
+            assert working.return_value.post.call_count == 0
+            assert res.delivered == 0
+            assert [(e.profile_name, e.message) for e in res.stuck] == [
+                ("foo", "one"),
+                ("bar", "three"),
+            ]
+
+            assert target.retry() == 2
+            res = target.drain(ctx, max_attempts=1)
+
+        assert res == DrainResult(delivered=3, failed=0)
+        assert [c.args for c in working.return_value.post.call_args_list] == [
+            ("one",),
+            ("two",),
+            ("three",),
+        ]
+
+    def test_drain_profile_not_found(self, target, ctx, profile_load, capsys):
+        target.put("gone", "one")
+        target.put("gone", "two")
+        profile_load.side_effect = Exception(
+            "Specified profile name not found in config."
+        )
+
+        assert target.drain(ctx, max_attempts=2) == DrainResult(
+            delivered=0, failed=1
+        )
+        for _ in range(2):
+            res = target.drain(ctx, max_attempts=2)
+
+        assert res == DrainResult(
+            delivered=0, failed=0, stuck=(target.entries()[0],)
+        )
+        assert [(e.attempts, e.last_error) for e in target.entries()] == [
+            (2, "Specified profile name not found in config."),
+            (0, None),
+        ]
+        assert capsys.readouterr().err == (
+            "gone: Specified profile name not found in config.\n" * 2
+        )
+
+    def test_retry_single_entry(self, target):
+        target.put("foo", "one")
+        target.put("bar", "two")
+        conn = target._connect()
+        with conn:
+            conn.execute("UPDATE outbox SET attempts = 5")
+        conn.close()
+
+        first = target.entries()[0]
+        assert target.retry(first.id) == 1
+        assert [e.attempts for e in target.entries()] == [0, 5]
+
+    def test_drain_after_crash_does_not_post_again(
+        self, target, ctx, profile_load
+    ):
+        target.put("foo", "one")
+        handler = Mock()
+
+        # the post went out, but the drain died before deleting the entry
+        with patch.object(
+            Spool, "_drain_profile", autospec=True
+        ) as drain_profile:
+
+            def crash(self, conn, handler, ledger, entries):
+                ledger.post(handler, entries[0].message, spool_key(entries[0]))
+                raise KeyboardInterrupt
+
+            drain_profile.side_effect = crash
+            with patch("src.kt.ktistec_handler.KtistecHandler", handler):
+                with pytest.raises(KeyboardInterrupt):
+                    target.drain(ctx)
+
+        with patch("src.kt.ktistec_handler.KtistecHandler", handler):
+            res = target.drain(ctx)
+
+        assert res == DrainResult(delivered=1, failed=0)
+        assert target.entries() == []
+        handler.return_value.post.assert_called_once_with("one")
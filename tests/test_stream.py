@@ -0,0 +1,139 @@
+import io
+import threading
+import time
+from dataclasses import replace
+from unittest.mock import Mock, patch
+
+import pytest
+
+from src.kt.profile import ContentConfig, ProfileConfig
+from src.kt.stream import StreamPoster, StreamResult, iter_records
+
+
+class ChunkedStream:
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+        self.reads = 0
+
+    def read1(self, size):
+        self.reads += 1
+        return self.chunks.pop(0) if self.chunks else b""
+
+
+class TestStream:
+    @pytest.fixture
+    def handler(self):
+        return Mock(
+            profile=ProfileConfig(
+                server_url="https://one.example.com",
+                user_name="test_user",
+                password="test_passwd",
+            )
+        )
+
+    test_cases = {
+        "lines": (b"one\ntwo\n", "\n", ["one", "two"]),
+        "no trailing delimiter": (b"one\ntwo", "\n", ["one", "two"]),
+        "blank records": (b"one\n\n  \ntwo\n", "\n", ["one", "two"]),
+        "null delimiter": (b"one\ntwo\x00three", "\x00", ["one\ntwo", "three"]),
+        "multi char delimiter": (b"one\n--\ntwo", "\n--\n", ["one", "two"]),
+    }
+
+    @pytest.mark.parametrize(
+        "data,delimiter,expected",
+        list(test_cases.values()),
+        ids=test_cases.keys(),
+    )
+    def test_iter_records(self, data, delimiter, expected):
+        assert list(iter_records(io.BytesIO(data), delimiter)) == expected
+
+    def test_iter_records_multibyte_across_chunks(self):
+        data = "ほげ\nふが\n".encode()
+        stream = ChunkedStream(data[i : i + 1] for i in range(len(data)))
+
+        assert list(iter_records(stream)) == ["ほげ", "ふが"]  # type: ignore
+
+    def test_iter_records_yield_before_eof(self):
+        stream = ChunkedStream([b"one\n", b"two\n", b"three\n"])
+        records = iter_records(stream)  # type: ignore
+
+        assert next(records) == "one"
+        assert stream.reads == 1
+
+    def test_run(self, handler, capsys):
+        handler.post.side_effect = lambda m: None if m != "two" else 1 / 0
+
+        with patch("src.kt.stream.build_parts") as build_parts:
+            build_parts.side_effect = lambda m, profile: iter([m])
+            res = StreamPoster(handler, 1).run(iter(["one", "two", "three"]))
+
+        assert res == StreamResult(succeeded=2, failed=1)
+        captured = capsys.readouterr()
+        assert captured.out == "record 1: ok\nrecord 3: ok\n"
+        assert captured.err == "record 2: failed: division by zero\n"
+
+    def test_run_in_order(self, handler):
+        posted = []
+
+        def post(message):
+            # later records would overtake the slower first ones if posted
+            # concurrently
+            time.sleep(0.05 - int(message) * 0.01)
+            posted.append(message)
+
+        handler.post.side_effect = post
+
+        res = StreamPoster(handler).run(iter(str(i) for i in range(5)))
+
+        assert res == StreamResult(succeeded=5, failed=0)
+        assert posted == ["0", "1", "2", "3", "4"]
+
+    def test_run_bounded_in_flight(self, handler):
+        release = threading.Event()
+        pulled = []
+        handler.post.side_effect = lambda m: release.wait()
+
+        pulled_while_blocked = []
+
+        def records():
+            for i in range(100):
+                pulled.append(i)
+                yield str(i)
+
+        def check():
+            pulled_while_blocked.append(len(pulled))
+            release.set()
+
+        timer = threading.Timer(0.2, check)
+        timer.start()
+        res = StreamPoster(handler, 2).run(records())
+        timer.join()
+
+        # 2 posting, 2 queued and 1 waiting to be queued at most
+        assert pulled_while_blocked[0] <= 5
+        assert res == StreamResult(succeeded=100, failed=0)
+
+    def test_run_flush_on_interrupt(self, handler):
+        def records():
+            yield "one"
+            yield "two"
+            raise KeyboardInterrupt
+
+        res = StreamPoster(handler, 2).run(records())
+
+        assert res == StreamResult(succeeded=2, failed=0)
+        assert handler.post.call_count == 2
+
+    def test_run_splits_long_records(self, handler):
+        handler.profile = replace(
+            handler.profile, content=ContentConfig(max_length=20)
+        )
+
+        res = StreamPoster(handler, 1).run(iter(["one two three four"]))
+
+        assert res == StreamResult(succeeded=1, failed=0)
+        assert [c.args for c in handler.post.call_args_list] == [
+            ("one two ",),
+            ("three ",),
+            ("four",),
+        ]
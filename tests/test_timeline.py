@@ -0,0 +1,136 @@
+from unittest.mock import Mock, patch
+
+import pytest
+
+from src.kt.profile import ProfileConfig
+from src.kt.timeline import Timeline, to_item
+
+OUTBOX = "https://one.example.com/actors/test_user/outbox"
+
+
+def response(status_code=200, body=None, headers=None):
+    res = Mock()
+    res.status_code = status_code
+    res.headers = headers or {}
+    res.json.return_value = body
+    return res
+
+
+def activity(i):
+    return {
+        "id": f"https://one.example.com/activities/{i}",
+        "type": "Create",
+        "actor": "https://one.example.com/actors/test_user",
+        "published": f"2026-01-01T00:00:{i:02d}Z",
+        "object": {"content": f"<p>post {i}</p>"},
+    }
+
+
+class TestTimeline:
+    @pytest.fixture
+    def target(self, tmp_path):
+        with patch("os.path.expanduser", return_value=str(tmp_path)):
+            yield Timeline(
+                ProfileConfig(
+                    server_url="https://one.example.com",
+                    user_name="test_user",
+                    password="test_passwd",
+                )
+            )
+
+    @pytest.fixture
+    def handler(self):
+        pages = {
+            OUTBOX: response(
+                body={"type": "OrderedCollection", "first": f"{OUTBOX}?page=1"},
+                headers={"ETag": '"v1"'},
+            ),
+            f"{OUTBOX}?page=1": response(
+                body={
+                    "orderedItems": [activity(3), activity(2)],
+                    "next": f"{OUTBOX}?page=2",
+                }
+            ),
+            f"{OUTBOX}?page=2": response(body={"orderedItems": [activity(1)]}),
+        }
+        handler = Mock()
+        handler.get.side_effect = lambda url, headers=None: pages[url]
+        handler.pages = pages
+        return handler
+
+    def test_sync(self, target, handler):
+        assert target.sync(handler, "outbox") == 3
+
+        items = target.items("outbox", 10)
+        assert [i.content for i in items] == [
+            "<p>post 3</p>",
+            "<p>post 2</p>",
+            "<p>post 1</p>",
+        ]
+        assert target.items("outbox", 1)[0].id.endswith("/3")
+        assert target.items("inbox", 10) == []
+
+    def test_sync_conditional(self, target, handler):
+        target.sync(handler, "outbox")
+        handler.pages[OUTBOX] = response(status_code=304)
+        handler.get.reset_mock()
+
+        assert target.sync(handler, "outbox") == 0
+        handler.get.assert_called_once_with(OUTBOX, {"If-None-Match": '"v1"'})
+
+    def test_sync_stops_at_checkpoint(self, target, handler):
+        target.sync(handler, "outbox")
+        handler.pages[OUTBOX] = response(
+            body={"first": f"{OUTBOX}?page=1"},
+            headers={"Last-Modified": "Thu, 01 Jan 2026 00:00:04 GMT"},
+        )
+        handler.pages[f"{OUTBOX}?page=1"] = response(
+            body={
+                "orderedItems": [activity(4), activity(3), activity(2)],
+                "next": f"{OUTBOX}?page=2",
+            }
+        )
+        handler.get.reset_mock()
+
+        assert target.sync(handler, "outbox") == 1
+        # the second page is older than the checkpoint and never fetched
+        assert [c.args[0] for c in handler.get.call_args_list] == [
+            OUTBOX,
+            f"{OUTBOX}?page=1",
+        ]
+        assert len(target.items("outbox", 10)) == 4
+
+        handler.get.reset_mock()
+        target.sync(handler, "outbox")
+        assert handler.get.call_args_list[0].args == (
+            OUTBOX,
+            {"If-Modified-Since": "Thu, 01 Jan 2026 00:00:04 GMT"},
+        )
+
+    def test_sync_failure_keeps_cache(self, target, handler):
+        target.sync(handler, "outbox")
+        handler.pages[OUTBOX] = response(
+            body={"first": f"{OUTBOX}?page=1"}, headers={"ETag": '"v2"'}
+        )
+        handler.pages[f"{OUTBOX}?page=1"] = response(
+            body={"orderedItems": [activity(5), activity(4)], "next": "x"}
+        )
+
+        with pytest.raises(KeyError):
+            target.sync(handler, "outbox")
+
+        assert len(target.items("outbox", 10)) == 3
+
+    def test_to_item(self):
+        assert to_item("https://one.example.com/activities/1").content == ""
+        item = to_item(
+            {
+                "id": "https://one.example.com/objects/1",
+                "type": "Note",
+                "attributedTo": "https://one.example.com/actors/test_user",
+                "content": "note",
+                "actor": {"id": "https://one.example.com/actors/test_user"},
+            }
+        )
+        assert item.content == "note"
+        assert item.actor == "https://one.example.com/actors/test_user"
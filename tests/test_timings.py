@@ -0,0 +1,169 @@
+import io
+import json
+import os
+import threading
+from unittest import mock
+
+import click
+import pytest
+import requests_mock
+
+from src.kt.ktistec_handler import KtistecHandler
+from src.kt.profile import ProfileConfig
+from src.kt.timings import NullTracer, Tracer
+
+
+class TestTracer:
+    @pytest.fixture
+    def sessions_response_body(self):
+        return open(
+            f"{os.getcwd()}/tests/resources/ktistec_handler/dummy_sessions_response_body",
+            "r",
+        ).read()
+
+    @pytest.fixture
+    def target(self):
+        return Tracer()
+
+    @pytest.fixture
+    def handler(self, target, tmp_path):
+        with mock.patch("os.path.expanduser", return_value=str(tmp_path)):
+            handler = KtistecHandler(
+                ctx=click.Context(command=click.Command("test")),
+                profile=ProfileConfig(
+                    server_url="https://one.example.com",
+                    user_name="test_user_one",
+                    password="test_passwd_one",
+                ),
+                tracer=target,
+            )
+        handler._session_cache = mock.Mock()
+        handler._session_cache.restore.return_value = False
+        return handler
+
+    @requests_mock.Mocker(kw="mock")
+    def test_post_phases(
+        self, target, handler, sessions_response_body, **kwargs
+    ):
+        kwargs["mock"].get(
+            "https://one.example.com/sessions", text=sessions_response_body
+        )
+        kwargs["mock"].post("https://one.example.com/sessions", text="")
+        kwargs["mock"].get(
+            "https://one.example.com", text=sessions_response_body
+        )
+        kwargs["mock"].post(
+            "https://one.example.com/actors/test_user_one/outbox",
+            status_code=302,
+            headers={"Location": "https://one.example.com/home"},
+        )
+        kwargs["mock"].get("https://one.example.com/home", text="x" * 100)
+
+        handler.post("test_message")
+
+        assert [p.name for p in target.phases] == [
+            "login csrf",
+            "login",
+            "csrf",
+            "post",
+        ]
+        login_csrf = target.phases[0].requests[0]
+        assert login_csrf.method == "GET"
+        assert login_csrf.status_code == 200
+        assert login_csrf.bytes_received == len(sessions_response_body)
+
+        post = target.phases[3].requests
+        assert [(r.status_code, r.redirect) for r in post] == [
+            (302, True),
+            (200, False),
+        ]
+        assert post[0].bytes_sent > len("test_message")
+        assert post[1].bytes_received == 100
+
+    def test_phases_per_thread(self, target):
+        barrier = threading.Barrier(2)
+
+        def run(name):
+            with target.phase(name):
+                barrier.wait()
+                target.hook(mock.Mock(name=name))
+                barrier.wait()
+
+        with mock.patch.object(Tracer, "_to_record", side_effect=lambda r: r):
+            threads = [
+                threading.Thread(target=run, args=(n,)) for n in ("a", "b")
+            ]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+        assert sorted(p.name for p in target.phases) == ["a", "b"]
+        for p in target.phases:
+            assert [r._mock_name for r in p.requests] == [p.name]
+
+    @requests_mock.Mocker(kw="mock")
+    def test_handler_without_tracer(self, tmp_path, **kwargs):
+        kwargs["mock"].post(
+            "https://one.example.com/actors/test_user_one/outbox",
+            status_code=200,
+        )
+        with mock.patch("os.path.expanduser", return_value=str(tmp_path)):
+            handler = KtistecHandler(
+                ctx=click.Context(command=click.Command("test")),
+                profile=ProfileConfig(
+                    server_url="https://one.example.com",
+                    user_name="test_user_one",
+                    password="test_passwd_one",
+                ),
+            )
+        handler._ensure_login = mock.Mock()
+        handler._get_csrf_token = mock.Mock(return_value="token")
+
+        for _ in range(3):
+            handler.post("test_message")
+
+        assert isinstance(handler._tracer, NullTracer)
+        assert handler._tracer.phases == []
+        assert handler._session.hooks["response"] == []
+
+    def test_phase_without_requests(self, target):
+        with target.phase("build"):
+            pass
+
+        assert target.phases[0].name == "build"
+        assert target.phases[0].requests == []
+        assert target.phases[0].elapsed >= 0
+
+    def test_dump(self, target):
+        with target.phase("build"):
+            pass
+
+        f = io.StringIO()
+        target.dump(f)
+        res = json.loads(f.getvalue())
+
+        assert res["phases"][0]["name"] == "build"
+        assert res["phases"][0]["requests"] == []
+        assert res["total"] == res["phases"][0]["elapsed"]
+
+    def test_show(self, target, capsys):
+        with target.phase("build"):
+            pass
+
+        target.show()
+
+        captured = capsys.readouterr()
+        assert captured.err.splitlines()[0].split() == [
+            "Phase",
+            "Time",
+            "(ms)",
+            "Requests",
+            "Status",
+            "Bytes",
+            "Sent",
+            "Bytes",
+            "Received",
+            "Redirects",
+        ]
+        assert captured.err.splitlines()[-1].startswith("total")
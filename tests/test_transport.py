@@ -0,0 +1,82 @@
+import time
+from unittest.mock import patch
+
+import click
+import pytest
+from requests import Session
+from urllib3.exceptions import MaxRetryError
+
+from src.kt.ktistec_handler import KtistecHandler, KtistecTimeoutException
+from src.kt.profile import HttpConfig, ProfileConfig, TimeoutConfig
+from src.kt.transport import build_retry, mount_adapter
+
+
+class TestTransport:
+    def test_build_retry(self):
+        retry = build_retry(HttpConfig(retries=5, status_forcelist=(502, 503)))
+
+        assert retry.total == 5
+        assert retry.is_retry("GET", 503)
+        assert not retry.is_retry("GET", 500)
+        # non idempotent requests are not retried on a response
+        assert not retry.is_retry("POST", 503)
+
+    def test_backoff_jitter(self):
+        retry = build_retry(HttpConfig(backoff_factor=1, backoff_jitter=0.5))
+        retry = retry.increment(method="GET", url="/").increment(
+            method="GET", url="/"
+        )
+
+        with patch("random.uniform", return_value=0.25) as m:
+            assert retry.get_backoff_time() == 2.25
+            m.assert_called_once_with(0, 0.5)
+
+    def test_no_backoff_on_first_retry(self):
+        retry = build_retry(HttpConfig(backoff_factor=1, backoff_jitter=0.5))
+
+        assert retry.get_backoff_time() == 0
+
+    def test_mount_adapter(self):
+        session = Session()
+        mount_adapter(
+            session, HttpConfig(retries=2, pool_connections=4, pool_maxsize=8)
+        )
+
+        adapter = session.get_adapter("https://one.example.com")
+        assert adapter.max_retries.total == 2
+        assert adapter._pool_connections == 4
+        assert adapter._pool_maxsize == 8
+        assert session.get_adapter("http://one.example.com") is adapter
+
+    def test_retry_within_budget(self):
+        retry = build_retry(
+            HttpConfig(retries=3, backoff_factor=1), budget=lambda: 1.5
+        )
+        # the first retry comes without backoff, the second would sleep 2s
+        retry = retry.increment(method="GET", url="/")
+
+        with pytest.raises(MaxRetryError) as e:
+            retry.increment(method="GET", url="/")
+
+        assert "Deadline reached." in str(e.value.reason)
+
+    def test_retries_stop_at_deadline(self, tmp_path):
+        # nothing listens on the discard port, every attempt is refused
+        profile = ProfileConfig(
+            server_url="http://127.0.0.1:9",
+            user_name="test_user",
+            password="test_passwd",
+            http=HttpConfig(retries=3, backoff_factor=1, backoff_jitter=0),
+            timeouts=TimeoutConfig(connect=0.5, deadline=1.5),
+        )
+        with patch("os.path.expanduser", return_value=str(tmp_path)):
+            handler = KtistecHandler(
+                click.Context(command=click.Command("test")), profile
+            )
+
+            start = time.monotonic()
+            with pytest.raises(KtistecTimeoutException) as e:
+                handler.post("test")
+
+        assert time.monotonic() - start < 1.5
+        assert str(e.value) == "Timed out during login csrf."
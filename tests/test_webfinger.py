@@ -0,0 +1,165 @@
+import time
+from unittest.mock import patch
+
+import pytest
+import requests
+
+from src.kt.profile import TimeoutConfig
+from src.kt.webfinger import (
+    NOT_FOUND_TTL,
+    MentionResolver,
+    actor_url,
+    normalize,
+)
+
+
+def jrd(href):
+    return {
+        "subject": "acct:alice@one.example.com",
+        "links": [
+            {
+                "rel": "http://webfinger.net/rel/profile-page",
+                "type": "text/html",
+                "href": "https://one.example.com/@alice",
+            },
+            {"rel": "self", "type": "application/activity+json", "href": href},
+        ],
+    }
+
+
+class TestMentionResolver:
+    @pytest.fixture
+    def now(self):
+        return [1000.0]
+
+    @pytest.fixture
+    def target(self, tmp_path, now):
+        return MentionResolver(
+            str(tmp_path / "webfinger.db"), clock=lambda: now[0]
+        )
+
+    @pytest.fixture
+    def alice(self, requests_mock):
+        return requests_mock.get(
+            "https://one.example.com/.well-known/webfinger"
+            "?resource=acct:alice@one.example.com",
+            json=jrd("https://one.example.com/actors/alice"),
+        )
+
+    def test_resolve(self, target, alice, requests_mock):
+        requests_mock.get(
+            "https://two.example.com/.well-known/webfinger", status_code=404
+        )
+        requests_mock.get(
+            "https://three.example.com/.well-known/webfinger", status_code=500
+        )
+
+        assert target.resolve(
+            [
+                "alice@One.Example.com",
+                "bob@two.example.com",
+                "c@three.example.com",
+            ]
+        ) == {"alice@One.Example.com": "https://one.example.com/actors/alice"}
+        assert alice.last_request.headers["Accept"] == "application/jrd+json"
+
+    def test_resolve_cached(self, target, alice, tmp_path, now):
+        target.resolve(["alice@one.example.com"])
+        target.resolve(["alice@one.example.com"])
+        assert alice.call_count == 1
+
+        # a new process reads the cache from disk
+        other = MentionResolver(
+            str(tmp_path / "webfinger.db"), clock=lambda: now[0]
+        )
+        assert other.resolve(["alice@one.example.com"]) == {
+            "alice@one.example.com": "https://one.example.com/actors/alice"
+        }
+        assert alice.call_count == 1
+
+        now[0] += 24 * 60 * 60 + 1
+        target.resolve(["alice@one.example.com"])
+        assert alice.call_count == 2
+
+    def test_resolve_not_found_cached(self, target, requests_mock, now):
+        bob = requests_mock.get(
+            "https://two.example.com/.well-known/webfinger", status_code=404
+        )
+
+        target.resolve(["bob@two.example.com"])
+        target.resolve(["bob@two.example.com"])
+        assert bob.call_count == 1
+
+        now[0] += NOT_FOUND_TTL + 1
+        target.resolve(["bob@two.example.com"])
+        assert bob.call_count == 2
+
+    def test_resolve_failure_not_cached(self, target, requests_mock):
+        failing = requests_mock.get(
+            "https://two.example.com/.well-known/webfinger",
+            exc=requests.exceptions.ConnectTimeout,
+        )
+
+        assert target.resolve(["bob@two.example.com"]) == {}
+        assert target.resolve(["bob@two.example.com"]) == {}
+        assert failing.call_count == 2
+
+    def test_resolve_concurrently(self, target):
+        def lookup(handle, timeout):
+            time.sleep(0.2)
+            return f"https://{handle.partition('@')[2]}/actors/alice", 60.0
+
+        with patch.object(target, "_lookup", side_effect=lookup):
+            start = time.perf_counter()
+            res = target.resolve([f"alice@{i}.example.com" for i in range(4)])
+            elapsed = time.perf_counter() - start
+
+        assert elapsed < 0.6
+        assert (
+            res["alice@3.example.com"] == "https://3.example.com/actors/alice"
+        )
+        assert len(res) == 4
+
+    def test_resolve_timeouts(self, target):
+        timeouts = TimeoutConfig(connect=1.0, read=2.0, deadline=60.0)
+        with patch.object(
+            target, "_lookup", return_value=("https://x", 60.0)
+        ) as lookup:
+            target.resolve(["alice@one.example.com"], timeouts)
+
+        lookup.assert_called_once_with("alice@one.example.com", (1.0, 2.0))
+
+    def test_resolve_deadline(self, target):
+        timeouts = TimeoutConfig(connect=1.0, read=2.0, deadline=0.0)
+        with patch.object(target, "_lookup") as lookup:
+            assert target.resolve(["alice@one.example.com"], timeouts) == {}
+
+        lookup.assert_not_called()
+
+    def test_resolve_offline(self, target, alice):
+        assert target.resolve(["alice@one.example.com"], offline=True) == {}
+        assert alice.call_count == 0
+
+        target.resolve(["alice@one.example.com"])
+        assert target.resolve(["alice@one.example.com"], offline=True) == {
+            "alice@one.example.com": "https://one.example.com/actors/alice"
+        }
+        assert alice.call_count == 1
+
+    def test_resolve_without_cache(self, tmp_path, alice):
+        (tmp_path / "webfinger.db").mkdir()
+        target = MentionResolver(str(tmp_path / "webfinger.db"))
+
+        assert target.resolve(["alice@one.example.com"]) == {
+            "alice@one.example.com": "https://one.example.com/actors/alice"
+        }
+
+    def test_actor_url(self):
+        assert actor_url(jrd("https://x")) == "https://x"
+        assert (
+            actor_url({"links": [{"rel": "self", "href": "https://x"}]}) is None
+        )
+        assert actor_url([]) is None
+
+    def test_normalize(self):
+        assert normalize("@Alice@One.Example.COM") == "Alice@one.example.com"